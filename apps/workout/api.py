@@ -0,0 +1,158 @@
+"""workout app JSON API
+
+Read only JSON versions of our pages, for the mobile client.
+
+Every response carries an ETag built from `updated_at` watermarks (plus a row count,
+so deletes change it too). Django's `condition` decorator compares it against
+`If-None-Match` before the view runs, so an unchanged resource costs one small
+aggregate query and a 304, with nothing serialized.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from . import autocomplete, charts, search
+from .decorators import api_login_required
+from .models import Workout, Exercise, UserStats
+from .pagination import keyset_page
+
+# Compact field selections (no model instances are built for these):
+WORKOUT_FIELDS = ("id", "name", "description", "completed", "created_at", "updated_at")
+EXERCISE_FIELDS = ("id", "name", "weight", "repetitions", "category", "created_at", "updated_at")
+
+def _etag(*parts):
+    """Hashes watermark values into an ETag."""
+
+    return hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+
+#-------------#
+#-- ETAGS: ---#
+#-------------#
+
+def workouts_etag(request):
+    marks = Workout.objects.filter(user__id=request.workout_user.id).aggregate(latest=Max("updated_at"), count=Count("id"))
+    return _etag("workouts", request.workout_user.id, marks["latest"], marks["count"], request.GET.get("before"), request.GET.get("after"))
+
+def workout_etag(request, id):
+    workout = Workout.objects.filter(id=id, user__id=request.workout_user.id).values_list("updated_at", flat=True).first()
+    if workout is None:
+        # Let the view answer with a 404:
+        return None
+    marks = Exercise.objects.filter(workout__id=id).aggregate(latest=Max("updated_at"), count=Count("id"))
+    return _etag("workout", id, workout, marks["latest"], marks["count"])
+
+def profile_etag(request):
+    user = request.workout_user
+    stats = UserStats.objects.for_user(user)
+    return _etag("profile", user.id, user.updated_at, *[getattr(stats, field) for field in UserStats.COUNTERS])
+
+def progress_etag(request):
+    # Every workout / exercise write bumps the stats version, so it stands in for the whole history:
+    stats = UserStats.objects.for_user(request.workout_user)
+    return _etag("progress", request.workout_user.id, stats.version, request.GET.get("exercise"), request.GET.get("points"))
+
+#-------------#
+#-- VIEWS: ---#
+#-------------#
+
+@require_GET
+@api_login_required
+@condition(etag_func=workouts_etag)
+def workouts(request):
+    """Lists the logged in user's workouts, newest first, 12 at a time (page with `?before=<id>` / `?after=<id>`)."""
+
+    workout_list = Workout.objects.filter(user__id=request.workout_user.id).values(*WORKOUT_FIELDS)
+    page = keyset_page(workout_list, before=request.GET.get("before"), after=request.GET.get("after"), per_page=12)
+
+    return JsonResponse({
+        "workouts": page.object_list,
+        "next": page.next_cursor if page.has_next else None,
+        "previous": page.previous_cursor if page.has_previous else None,
+    })
+
+@require_GET
+@api_login_required
+@condition(etag_func=workout_etag)
+def workout(request, id):
+    """A single workout with its exercises (most recently updated first)."""
+
+    workout = Workout.objects.filter(id=id, user__id=request.workout_user.id).values(*WORKOUT_FIELDS).first()
+    if workout is None:
+        return JsonResponse({"errors": ["Workout not found."]}, status=404)
+
+    workout["exercises"] = list(Exercise.objects.filter(workout__id=id).order_by("-updated_at").values(*EXERCISE_FIELDS))
+    return JsonResponse({"workout": workout})
+
+@require_GET
+@api_login_required
+@condition(etag_func=profile_etag)
+def profile(request):
+    """The logged in user's profile and lifetime stats."""
+
+    user = request.workout_user
+    stats = UserStats.objects.for_user(user)
+
+    return JsonResponse({
+        "user": {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "level": user.level,
+            "level_name": user.level_name,
+            "created_at": user.created_at,
+            "stats": {field: getattr(stats, field) for field in UserStats.COUNTERS},
+        },
+    })
+
+@require_GET
+@api_login_required
+@condition(etag_func=progress_etag)
+def progress(request):
+    """
+    Progress chart data for one exercise: `?exercise=<name>` (required) and `?points=<n>` (most points to return,
+    default `charts.DEFAULT_POINTS`). See `charts.exercise_progress()`.
+    """
+
+    name = request.GET.get("exercise", "").strip()
+    if not name:
+        return JsonResponse({"errors": ["Choose an exercise."]}, status=400)
+    try:
+        points = int(request.GET.get("points", charts.DEFAULT_POINTS))
+    except ValueError:
+        points = charts.DEFAULT_POINTS
+    # LTTB needs at least 3 points (first, last and one per bucket):
+    points = min(max(points, 3), charts.MAX_POINTS)
+
+    return JsonResponse({"exercise": name, "progress": charts.exercise_progress(request.workout_user.id, name, points)})
+
+@require_GET
+@api_login_required
+def exercise_names(request):
+    """
+    Autocomplete: the logged in user's most used exercise names starting with `?prefix=` (up to `?limit=`, default 8).
+
+    Answered from the in memory `autocomplete.name_index`, so typing doesn't query exercises.
+    """
+
+    try:
+        limit = min(max(int(request.GET.get("limit", autocomplete.DEFAULT_LIMIT)), 1), 50)
+    except ValueError:
+        limit = autocomplete.DEFAULT_LIMIT
+
+    names = autocomplete.name_index.search(request.workout_user.id, request.GET.get("prefix", ""), limit)
+    return JsonResponse({"names": names})
+
+@require_GET
+@api_login_required
+def search_workouts(request):
+    """Searches the logged in user's workouts (names, descriptions and exercise names) for `?q=`, best match first (up to `?limit=`, default 20)."""
+
+    try:
+        limit = min(max(int(request.GET.get("limit", search.DEFAULT_LIMIT)), 1), 100)
+    except ValueError:
+        limit = search.DEFAULT_LIMIT
+
+    workouts = search.search_workouts(request.workout_user.id, request.GET.get("q", ""), limit)
+    return JsonResponse({"workouts": [{field: getattr(workout, field) for field in WORKOUT_FIELDS} for workout in workouts]})
@@ -2,4 +2,9 @@ from django.apps import AppConfig
 
 
 class WorkoutConfig(AppConfig):
-    name = 'workout'
+    name = 'apps.workout'
+
+    def ready(self):
+        from . import signals # noqa: F401 (connects receivers)
+        from . import metrics
+        metrics.install() # times queries and template rendering
@@ -0,0 +1,211 @@
+"""Static asset pipeline.
+
+`collectstatic` (with `STATICFILES_STORAGE` set to `CompressedManifestStorage`)
+copies every static file to `STATIC_ROOT` under a content hashed name
+(`bootstrap.min.css` -> `bootstrap.min.5a1c3e0f9b2d.css`), records the mapping
+in `staticfiles.json` for `{% static %}`, and writes `.gz` (and, if the `brotli`
+package is installed, `.br`) copies of every compressible file ahead of time.
+
+`StaticFilesApplication` wraps the WSGI application and answers `STATIC_URL`
+requests straight from `STATIC_ROOT`, before Django's request handling runs:
+it picks the precompressed copy the browser accepts and, for hashed names,
+sends a far-future `immutable` `Cache-Control`, since a changed file always
+gets a new name.
+"""
+import gzip
+import mimetypes
+import os
+from email.utils import formatdate
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None # Optional: without it we only write (and serve) gzip copies.
+
+# Extensions worth compressing (images and woff fonts are already compressed):
+COMPRESSIBLE = (".css", ".js", ".map", ".svg", ".eot", ".ttf", ".otf", ".json", ".txt", ".html", ".xml", ".ico")
+MIN_SAVING = 0.05 # Only keep a compressed copy if it is at least 5% smaller
+
+IMMUTABLE = "public, max-age=31536000, immutable" # Hashed names: the content behind a name never changes
+REVALIDATE = "public, max-age=0, must-revalidate" # Unhashed names: check the ETag every time
+
+#-------------#
+#-- BUILD: ---#
+#-------------#
+
+def compress(path):
+    """
+    Writes `path.gz` (and `path.br` if brotli is installed) next to `path`.
+
+    Returns the list of files written (compressed copies that don't save at least `MIN_SAVING` are skipped).
+    """
+
+    with open(path, "rb") as source:
+        data = source.read()
+
+    encoders = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.append((".br", lambda data: brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, encode in encoders:
+        compressed = encode(data)
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, "wb") as target:
+                target.write(compressed)
+            written.append(path + suffix)
+    return written
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """`ManifestStaticFilesStorage` that also precompresses the collected files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        # Compress the originals (still served, without far-future caching) and their hashed copies:
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.lower().endswith(COMPRESSIBLE) and self.exists(name):
+                compress(self.path(name))
+
+    def hashed_name(self, name, content=None, filename=None):
+        # A stylesheet may point at a file we don't ship (font-awesome.min.css references the IE only `.eot` font);
+        # leave such references as they are instead of failing the whole build:
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            return name
+
+    def stored_name(self, name):
+        # Fall back to the plain name when there's no manifest entry (e.g. `collectstatic` hasn't been run yet, as in
+        # tests), rather than raising in the middle of rendering a page:
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+#-------------#
+#-- SERVE: ---#
+#-------------#
+
+class StaticFile(object):
+    """A file under `STATIC_ROOT` and its precompressed copies, with the response headers for each."""
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        content_type, _ = mimetypes.guess_type(path)
+        if content_type is None:
+            content_type = "application/octet-stream"
+        elif content_type.startswith("text/") or content_type in ("application/javascript", "image/svg+xml"):
+            content_type += "; charset=utf-8"
+
+        common = [
+            ("Content-Type", content_type),
+            ("Cache-Control", IMMUTABLE if immutable else REVALIDATE),
+            ("Last-Modified", formatdate(stat.st_mtime, usegmt=True)),
+            ("Vary", "Accept-Encoding"),
+        ]
+        self.etag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+        # Encoding -> (path, headers), best first:
+        self.variants = []
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if os.path.isfile(path + suffix):
+                size = os.path.getsize(path + suffix)
+                self.variants.append((encoding, path + suffix, common + [
+                    ("Content-Encoding", encoding),
+                    ("Content-Length", str(size)),
+                    ("ETag", self.etag[:-1] + "-" + encoding + '"'),
+                ]))
+        self.variants.append((None, path, common + [("Content-Length", str(stat.st_size)), ("ETag", self.etag)]))
+
+    def choose(self, accept_encoding):
+        """Returns `(path, headers)` of the best variant for an `Accept-Encoding` header."""
+
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding, path, headers in self.variants:
+            if encoding is None or encoding in accepted:
+                return path, headers
+
+def _accepted_encodings(header):
+    """Returns the set of content codings in an `Accept-Encoding` header (ignoring any with `q=0`)."""
+
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+class StaticFilesApplication(object):
+    """
+    WSGI application that serves `STATIC_URL` from `STATIC_ROOT` and hands every other request to `application`.
+
+    Parameters:
+    - `application` - The Django WSGI application.
+    - `root` - Directory of collected static files (default: `STATIC_ROOT`).
+    - `prefix` - URL path they're served under (default: `STATIC_URL`).
+
+    The directory is scanned once at startup, so a request costs a dictionary lookup and an `open()`; run
+    `collectstatic` before (re)starting the server. Unknown paths fall through to Django.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = root or getattr(settings, "STATIC_ROOT", None)
+        self.prefix = prefix or settings.STATIC_URL
+        self.files = self._scan() if self.root and os.path.isdir(self.root) else {}
+
+    def _scan(self):
+        hashed = set()
+        storage = CompressedManifestStorage(location=self.root)
+        if storage.exists(storage.manifest_name):
+            hashed = set(storage.load_manifest().values())
+
+        files = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith((".gz", ".br")) and os.path.isfile(os.path.join(directory, filename[:-3])):
+                    # A precompressed copy; it's picked up by the file it belongs to:
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                files[self.prefix + name] = StaticFile(path, immutable=name in hashed)
+        return files
+
+    def __call__(self, environ, start_response):
+        static_file = self.files.get(environ.get("PATH_INFO", ""))
+        if static_file is None:
+            return self.application(environ, start_response)
+
+        if environ["REQUEST_METHOD"] not in ("GET", "HEAD"):
+            start_response("405 Method Not Allowed", [("Allow", "GET, HEAD"), ("Content-Length", "0")])
+            return []
+
+        path, headers = static_file.choose(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        etag = dict(headers)["ETag"]
+        if environ.get("HTTP_IF_NONE_MATCH") in (etag, "W/" + etag):
+            start_response("304 Not Modified", [header for header in headers if header[0] in ("Cache-Control", "ETag", "Vary")])
+            return []
+
+        start_response("200 OK", headers)
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return []
+        source = open(path, "rb")
+        if "wsgi.file_wrapper" in environ:
+            # Lets the server use sendfile():
+            return environ["wsgi.file_wrapper"](source, 64 * 1024)
+        return _read_blocks(source)
+
+def _read_blocks(source, block_size=64 * 1024):
+    with source:
+        for block in iter(lambda: source.read(block_size), b""):
+            yield block
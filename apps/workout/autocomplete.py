@@ -0,0 +1,137 @@
+"""Exercise name autocomplete.
+
+Each user's exercise names are kept in memory as a `NameIndex`: their distinct
+names (compared without case), sorted, with how many sets each was used for.
+A lookup is a binary search for the prefix plus picking the most used names in
+that range, so typing never touches the database.
+
+Indexes are built on first use with one grouped query, kept up to date by
+`ExerciseManager` as sets are added and removed, and kept for at most
+`AUTOCOMPLETE_CACHE_SIZE` users (least recently used are dropped) for
+`AUTOCOMPLETE_CACHE_TTL` seconds, so other processes' writes are picked up.
+"""
+import bisect
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULT_LIMIT = 8
+
+def _key(name):
+    return " ".join(name.split()).lower()
+
+class NameIndex(object):
+    """
+    One user's exercise names, sorted by lowercase name, with use counts.
+
+    Spelling variants that only differ by case or spacing share one entry, shown as their most used spelling.
+    """
+
+    def __init__(self, counts=()):
+        # Lowercase name -> {spelling: uses}:
+        self._spellings = {}
+        for name, uses in counts:
+            key = _key(name)
+            if key:
+                spellings = self._spellings.setdefault(key, {})
+                spellings[name.strip()] = spellings.get(name.strip(), 0) + uses
+        self._keys = sorted(self._spellings)
+
+    def add(self, name, uses=1):
+        """Counts `uses` more sets of `name` (negative to take them away)."""
+
+        key = _key(name)
+        if not key:
+            return
+        spellings = self._spellings.get(key)
+        if spellings is None:
+            if uses <= 0:
+                return
+            spellings = self._spellings[key] = {}
+            bisect.insort(self._keys, key)
+
+        spelling = name.strip()
+        count = spellings.get(spelling, 0) + uses
+        if count > 0:
+            spellings[spelling] = count
+        else:
+            spellings.pop(spelling, None)
+        if not spellings:
+            del self._spellings[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def search(self, prefix, limit=DEFAULT_LIMIT):
+        """Returns up to `limit` names starting with `prefix` (ignoring case), most used first."""
+
+        prefix = _key(prefix)
+        start = bisect.bisect_left(self._keys, prefix)
+        # Every key starting with `prefix` sorts before `prefix` + the highest code point:
+        end = bisect.bisect_left(self._keys, prefix + "\U0010ffff", start)
+
+        candidates = []
+        for key in self._keys[start:end]:
+            spellings = self._spellings[key]
+            spelling = max(spellings, key=spellings.get)
+            candidates.append((sum(spellings.values()), spelling))
+        return [name for uses, name in heapq.nlargest(limit, candidates, key=lambda candidate: (candidate[0], candidate[1].lower()))]
+
+def load_names(user_id):
+    """Returns `[(name, uses), ...]` for every exercise name a user has logged (one grouped query)."""
+
+    # Imported here as `models` imports this module:
+    from django.db.models import Count
+    from .models import Exercise
+
+    return list(Exercise.objects.filter(workout__user__id=user_id).values_list("name").annotate(uses=Count("id")).order_by())
+
+class NameIndexCache(object):
+    """Thread safe LRU cache of `NameIndex`es, keyed by user id."""
+
+    def __init__(self, maxsize=512, ttl=300, loader=load_names):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(self, user_id, prefix, limit=DEFAULT_LIMIT):
+        """Returns a user's most used exercise names starting with `prefix` (building their index on a miss)."""
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0].search(prefix, limit)
+
+        index = NameIndex(self.loader(user_id))
+        with self._lock:
+            self._entries[user_id] = (index, now + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return index.search(prefix, limit)
+
+    def add(self, user_id, name, uses=1):
+        """Counts new (or, with negative `uses`, removed) sets in a user's index, if it is loaded."""
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[0].add(name, uses)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+name_index = NameIndexCache(
+    maxsize=getattr(settings, "AUTOCOMPLETE_CACHE_SIZE", 512),
+    ttl=getattr(settings, "AUTOCOMPLETE_CACHE_TTL", 300),
+)
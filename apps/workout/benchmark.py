@@ -0,0 +1,379 @@
+"""End to end benchmark harness (see `manage.py benchmark`).
+
+Every URL in `urls.py` has one or more `Scenario`s: a request (plus any untimed
+set up it needs, like a fresh workout to delete) sent through Django's test
+client as a logged in user. Each scenario is run a number of times and we
+record wall clock latency percentiles and the number of database queries.
+
+Results are plain JSON so a run can be saved as a baseline and later runs
+compared against it with `compare()`.
+
+`wsgi_throughput()` and `asgi_throughput()` instead measure requests per
+second with many concurrent clients, calling Django's WSGI or ASGI
+application directly (see `manage.py benchmark_concurrency`).
+"""
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import Exercise, ImportJob, User, UserStats, Workout
+
+class Scenario(object):
+    """
+    One benchmarked request.
+
+    Parameters:
+    - `name` - Label used in results.
+    - `view` - The view function this exercises (used to check every URL is covered).
+    - `request` - Function of `(run, iteration)` returning `(method, path, data, extra)`; anything it does before
+      returning (e.g. creating a workout to delete) is not timed.
+    - `login` - Whether the request is made as the benchmark user.
+    """
+
+    def __init__(self, name, view, request, login=True):
+        self.name = name
+        self.view = view
+        self.request = request
+        self.login = login
+
+def _get(path):
+    return lambda run, iteration: ("get", path(run) if callable(path) else path, None, {})
+
+def _scratch_workout(run, iteration):
+    """A new, untimed workout for requests that change or delete one."""
+
+    return Workout.objects.new(name="Scratch", description="Benchmark", user=run.user)["workout"]
+
+def scenarios():
+    """Returns every `Scenario`, in the order they run."""
+
+    from . import api, views
+
+    return [
+        Scenario("login page", views.login, _get("/"), login=False),
+        Scenario("register page", views.register, _get("/user/register"), login=False),
+        Scenario("register", views.register, lambda run, i: ("post", "/user/register", {
+            "username": "bench%dx%d" % (run.stamp % 100000, i), "email": "bench%dx%d@example.com" % (run.stamp, i),
+            "password": "password123", "password_confirmation": "password123", "tos_accept": "on",
+        }, {}), login=False),
+        Scenario("login", views.login, lambda run, i: ("post", "/user/login", {"username": run.user.username, "password": run.password}, {}), login=False),
+        Scenario("logout", views.logout, _get("/user/logout")),
+        Scenario("dashboard", views.dashboard, _get("/dashboard")),
+        Scenario("new workout page", views.new_workout, _get("/workout")),
+        Scenario("new workout", views.new_workout, lambda run, i: ("post", "/workout", {"name": "Bench Day", "description": "Benchmark"}, {})),
+        Scenario("workout", views.workout, _get(lambda run: "/workout/%d" % run.workout.id)),
+        Scenario("add exercise", views.exercise, lambda run, i: ("post", "/workout/%d/exercise" % run.workout.id, {"name": "Bench Press", "weight": "135", "repetitions": "8"}, {})),
+        Scenario("delete exercise", views.exercise, lambda run, i: (
+            "get", "/workout/%d/exercise" % run.workout.id,
+            {"exercise_id": Exercise.objects.new(name="Curl", weight="30", repetitions="10", workout=run.workout)["exercise"].id}, {},
+        )),
+        Scenario("add exercises (batch of 10)", views.exercises, lambda run, i: (
+            "post", "/workout/%d/exercises" % run.workout.id,
+            json.dumps({"sets": [{"name": "Squat", "weight": 225, "repetitions": 5}] * 10}), {"content_type": "application/json"},
+        )),
+        Scenario("complete workout", views.complete_workout, lambda run, i: ("post", "/workout/%d/complete" % _scratch_workout(run, i).id, {}, {})),
+        Scenario("edit workout page", views.edit_workout, _get(lambda run: "/workout/%d/edit" % run.workout.id)),
+        Scenario("edit workout", views.edit_workout, lambda run, i: ("post", "/workout/%d/edit" % run.workout.id, {"name": run.workout.name, "description": "Edited"}, {})),
+        Scenario("repeat workout", views.repeat_workout, lambda run, i: ("post", "/workout/%d/repeat" % run.workout.id, {"overload": "2.5"}, {})),
+        Scenario("delete workout", views.delete_workout, lambda run, i: ("get", "/workout/%d/delete" % _scratch_workout(run, i).id, None, {})),
+        Scenario("all workouts", views.all_workouts, _get("/workouts")),
+        Scenario("all workouts (deep page)", views.all_workouts, _get(lambda run: "/workouts?before=%d" % run.oldest_workout_id)),
+        Scenario("export csv", views.export_history, _get("/workouts/export")),
+        Scenario("import csv", views.import_history, lambda run, i: ("post", "/workouts/import", {"file": run.import_file(i)}, {})),
+        Scenario("search page", views.search_workouts, _get("/workouts/search?search=bench")),
+        Scenario("terms of service", views.tos, _get("/legal/tos"), login=False),
+        Scenario("metrics", views.metrics_endpoint, _get("/metrics"), login=False),
+        Scenario("api workouts", api.workouts, _get("/api/workouts")),
+        Scenario("api workout", api.workout, _get(lambda run: "/api/workouts/%d" % run.workout.id)),
+        Scenario("api user", api.profile, _get("/api/user")),
+        Scenario("api progress", api.progress, _get("/api/progress?exercise=Bench%20Press")),
+        Scenario("api exercise names", api.exercise_names, _get("/api/exercise-names?prefix=b")),
+        Scenario("api search", api.search_workouts, _get("/api/search?q=bench")),
+    ]
+
+def uncovered_views(scenario_list):
+    """Returns the `urls.py` views no scenario exercises."""
+
+    from . import urls
+
+    covered = {scenario.view for scenario in scenario_list}
+    return [pattern.callback for pattern in urls.urlpatterns if pattern.callback not in covered]
+
+def percentile(ordered, fraction):
+    """Nearest rank percentile of an ascending list (`fraction` from 0 to 1)."""
+
+    if not ordered:
+        return None
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+class BenchmarkRun(object):
+    """
+    Runs scenarios as one user. Requests commit as they would on a running server (so `retry_on_lock`, `on_commit`
+    hooks, the session write-behind and replica routing all take part); what they add or change is cleaned up
+    afterwards (see `_clean_up()`).
+
+    Parameters:
+    - `user` - `User` to run as (should have some history, e.g. from `manage.py generate_data`).
+    - `password` - Their password (for the login scenario).
+    - `iterations` - Timed requests per scenario.
+    - `warmup` - Untimed requests per scenario first (fills caches the way a running server would have).
+    """
+
+    def __init__(self, user, password, iterations=50, warmup=3):
+        self.user = user
+        self.password = password
+        self.iterations = iterations
+        self.warmup = warmup
+        self.stamp = int(time.time())
+        self.client = Client()
+        self.session_keys = set() # Every session the client has held (see `_clean_up()`)
+
+    def import_file(self, iteration):
+        # Every upload differs, so none is skipped as already imported:
+        upload = BytesIO(("workout_name,workout_description,exercise_name,exercise_weight,exercise_repetitions\n"
+                          "Imported %d-%d,Benchmark,Bench Press,135,8\n" % (self.stamp, iteration)).encode())
+        upload.name = "history.csv"
+        return upload
+
+    def _login(self):
+        # Note: `client.session` starts (and sets the cookie for) a new session if there isn't one:
+        session = self.client.session
+        if session.get("user_id") != self.user.id:
+            session["user_id"] = self.user.id
+            session.save()
+            self.session_keys.add(session.session_key)
+
+    def _request(self, scenario, iteration):
+        if scenario.login:
+            self._login()
+        else:
+            self.client.cookies.pop(settings.SESSION_COOKIE_NAME, None)
+        method, path, data, extra = scenario.request(self, iteration)
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, data, **extra) if data is not None else getattr(self.client, method)(path, **extra)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - started
+        cookie = self.client.cookies.get(settings.SESSION_COOKIE_NAME)
+        if cookie and cookie.value:
+            self.session_keys.add(cookie.value)
+        return elapsed, len(queries), response.status_code
+
+    def run(self, scenario_list, on_result=None):
+        """Returns `{scenario name: result}`; `on_result(name, result)` is called as each scenario finishes."""
+
+        before = self._before()
+        results = {}
+        try:
+            self.workout = Workout.objects.filter(user__id=self.user.id).order_by("-id").first() or _scratch_workout(self, 0)
+            self.oldest_workout_id = Workout.objects.filter(user__id=self.user.id).order_by("id").values_list("id", flat=True).first()
+
+            for scenario in scenario_list:
+                # Warm up iterations are numbered after the timed ones (so e.g. registered usernames never repeat):
+                for iteration in range(self.warmup):
+                    self._request(scenario, self.iterations + iteration)
+                timings = []
+                query_counts = []
+                statuses = set()
+                for iteration in range(self.iterations):
+                    elapsed, queries, status = self._request(scenario, iteration)
+                    timings.append(elapsed * 1000)
+                    query_counts.append(queries)
+                    statuses.add(status)
+
+                timings.sort()
+                query_counts.sort()
+                results[scenario.name] = {
+                    "p50_ms": round(percentile(timings, 0.50), 3),
+                    "p95_ms": round(percentile(timings, 0.95), 3),
+                    "p99_ms": round(percentile(timings, 0.99), 3),
+                    "queries": percentile(query_counts, 0.50),
+                    "max_queries": query_counts[-1],
+                    "status": sorted(statuses),
+                }
+                if on_result:
+                    on_result(scenario.name, results[scenario.name])
+        finally:
+            # Leave the database as we found it:
+            self._clean_up(before)
+        return results
+
+    def _before(self):
+        """Notes what `_clean_up()` needs: the last id of each table scenarios add to, and the rows they change in place."""
+
+        def last_id(manager):
+            return manager.order_by("-id").values_list("id", flat=True).first() or 0
+
+        return {
+            "user": last_id(User.all_objects),
+            "workout": last_id(Workout.all_objects),
+            "exercise": last_id(Exercise.all_objects),
+            "import_job": last_id(ImportJob.objects),
+            "level": User.all_objects.values("level", "level_name").get(id=self.user.id),
+            "stats": UserStats.objects.filter(user__id=self.user.id).values(*UserStats.COUNTERS + UserStats.STREAK).first(),
+            # The workout `run()` picks (the edit workout scenario changes it):
+            "workout_row": Workout.objects.filter(user__id=self.user.id).order_by("-id").values("id", "name", "description", "updated_at").first(),
+        }
+
+    def _clean_up(self, before):
+        """Deletes what the run added (sessions, accounts, workouts, sets, import jobs) and puts back what it changed."""
+
+        # Imported here as `reaper` imports `models`, which this module's importers may still be loading:
+        from . import reaper
+        from .middleware import user_cache
+        from .sessions import SessionStore
+
+        # Logins, registrations and logged out scenarios each leave a session behind (already deleted ones are skipped):
+        for session_key in self.session_keys:
+            SessionStore().delete(session_key)
+
+        # Sets added to workouts that were already there (the run's own workouts take theirs with them):
+        Exercise.all_objects.filter(id__gt=before["exercise"], workout__id__lte=before["workout"]).delete()
+        ImportJob.objects.filter(id__gt=before["import_job"]).delete()
+        # New workouts and registered accounts go the way deleted ones do (search index rows, sets and all):
+        now = timezone.now()
+        Workout.all_objects.filter(id__gt=before["workout"], deleted_at__isnull=True).update(deleted_at=now)
+        User.all_objects.filter(id__gt=before["user"], deleted_at__isnull=True).update(deleted_at=now)
+        reaper.reap(pause=0)
+
+        # Changed in place: put the values back, bumping versions past any fragment cached during the run:
+        row = before["workout_row"]
+        if row is not None:
+            Workout.all_objects.filter(id=row.pop("id")).update(version=F("version") + 1, **row)
+        stats = UserStats.objects.filter(user__id=self.user.id)
+        if before["stats"] is None:
+            stats.delete()
+        else:
+            stats.update(version=F("version") + 1, **before["stats"])
+        User.all_objects.filter(id=self.user.id).update(**before["level"])
+        # (`update()` skips `post_save`; the test client shares this process's cache.)
+        user_cache.invalidate(self.user.id)
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Compares results against a baseline (both as returned by `BenchmarkRun.run()`).
+
+    Returns a list of regression messages: p95 latency more than `tolerance` (a fraction) slower, or more queries.
+    Scenarios missing from either side are skipped.
+    """
+
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append("%s: p95 %.2fms -> %.2fms" % (name, before["p95_ms"], result["p95_ms"]))
+        if result["queries"] > before["queries"]:
+            regressions.append("%s: queries %d -> %d" % (name, before["queries"], result["queries"]))
+    return regressions
+
+#-------------------#
+#-- CONCURRENCY: ---#
+#-------------------#
+
+def _summary(latencies, errors, elapsed):
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+
+def wsgi_throughput(application, path, cookie, clients, requests):
+    """
+    Sends `requests` GETs for `path` to a WSGI application from `clients` threads at once.
+
+    Parameters:
+    - `application` - WSGI callable (e.g. `get_wsgi_application()`).
+    - `path` - Path to request (may include a query string).
+    - `cookie` - `Cookie` header value (e.g. the session cookie).
+    - `clients` - Concurrent clients (threads, like a threaded WSGI server's workers).
+    - `requests` - Total requests.
+
+    Returns requests per second and latency percentiles (ms); `errors` counts non 200 responses.
+    """
+
+    path, _, query = path.partition("?")
+
+    def one():
+        environ = {
+            "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query, "SCRIPT_NAME": "",
+            "SERVER_NAME": "testserver", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "HTTP_HOST": "testserver",
+            "HTTP_COOKIE": cookie, "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.input": BytesIO(), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http", "wsgi.version": (1, 0),
+            "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+        }
+        status = []
+        started = time.perf_counter()
+        body = application(environ, lambda code, headers, exc_info=None: status.append(code))
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+        return (time.perf_counter() - started) * 1000, status[0].startswith("200")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda _: one(), range(requests)))
+    elapsed = time.perf_counter() - started
+    return _summary([latency for latency, ok in results], sum(1 for latency, ok in results if not ok), elapsed)
+
+def asgi_throughput(application, path, cookie, clients, requests):
+    """Like `wsgi_throughput()`, for an ASGI application (e.g. `get_asgi_application()`), with `clients` concurrent tasks."""
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+
+    async def one():
+        status = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        started = time.perf_counter()
+        await application(dict(scope), receive, send)
+        return (time.perf_counter() - started) * 1000, status[0] == 200
+
+    async def client(count, results):
+        for _ in range(count):
+            results.append(await one())
+
+    async def main():
+        results = []
+        await asyncio.gather(*[client(requests // clients + (number < requests % clients), results) for number in range(clients)])
+        return results
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    return _summary([latency for latency, ok in results], sum(1 for latency, ok in results if not ok), elapsed)
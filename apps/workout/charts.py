@@ -0,0 +1,117 @@
+"""Progress chart data.
+
+`exercise_progress()` turns every session (workout) in which a user did an
+exercise into one point: the top weight lifted, the session's volume (sum of
+weight x repetitions) and the best estimated one rep max. All three come from a
+single grouped query over `Exercise` joined to `Workout`.
+
+A chart can't draw more points than it is pixels wide, so long histories are
+downsampled with Largest-Triangle-Three-Buckets (LTTB), which keeps the points
+that matter to the line's shape (peaks, dips, plateaus) rather than every Nth
+one.
+"""
+from django.db.models import Count, FloatField, Max, Min, Sum
+from django.db.models.functions import Cast
+
+from .models import Exercise
+
+DEFAULT_POINTS = 200 # Roughly a chart's width in pixels
+MAX_POINTS = 1000
+
+# Estimated one rep max (Epley): weight x (1 + repetitions / 30).
+ESTIMATED_1RM = Cast("weight", FloatField()) * (1 + Cast("repetitions", FloatField()) / 30.0)
+VOLUME = Cast("weight", FloatField()) * Cast("repetitions", FloatField())
+
+SERIES = ("top_weight", "volume", "estimated_1rm")
+
+def lttb(xs, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Parameters:
+    - `xs`, `ys` - Point coordinates, `xs` ascending.
+    - `threshold` - Number of points to keep (at least 3).
+
+    Returns the indexes of the points to keep, in order. The first and last points are always kept; every other
+    point is the one, in its bucket, that forms the largest triangle with the previously kept point and the average
+    of the next bucket.
+    """
+
+    length = len(xs)
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+
+    kept = [0]
+    bucket_size = (length - 2) / (threshold - 2)
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average point of the next bucket (the last point, for the last bucket):
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+        if next_start >= next_end:
+            next_start, next_end = length - 1, length
+        count = next_end - next_start
+        average_x = sum(xs[next_start:next_end]) / count
+        average_y = sum(ys[next_start:next_end]) / count
+
+        previous_x = xs[previous]
+        previous_y = ys[previous]
+        best = start
+        best_area = -1.0
+        for index in range(start, end):
+            # Twice the triangle's area (the factor doesn't change which is largest):
+            area = abs((previous_x - average_x) * (ys[index] - previous_y) - (previous_x - xs[index]) * (average_y - previous_y))
+            if area > best_area:
+                best_area = area
+                best = index
+        kept.append(best)
+        previous = best
+
+    kept.append(length - 1)
+    return kept
+
+def exercise_progress(user_id, name, points=DEFAULT_POINTS):
+    """
+    Returns a user's per-session progress for one exercise (matched by name, ignoring case).
+
+    Parameters:
+    - `user_id` - Id of the `User`.
+    - `name` - Exercise name.
+    - `points` - Most points to return; longer histories are downsampled with `lttb()` (by estimated one rep max).
+
+    Returns a dictionary of columns: `workout_id`, `date`, `sets` and one list per `SERIES`, oldest session first,
+    plus `sessions` (the number of sessions before downsampling).
+    """
+
+    sessions = list(
+        Exercise.objects.filter(workout__user__id=user_id, name__iexact=name.strip())
+        .values("workout_id")
+        .annotate(
+            date=Min("workout__created_at"),
+            top_weight=Max(Cast("weight", FloatField())),
+            volume=Sum(VOLUME),
+            estimated_1rm=Max(ESTIMATED_1RM),
+            sets=Count("id"),
+        )
+        .order_by("date", "workout_id")
+    )
+
+    total = len(sessions)
+    if total > points:
+        xs = [session["date"].timestamp() for session in sessions]
+        ys = [session["estimated_1rm"] for session in sessions]
+        sessions = [sessions[index] for index in lttb(xs, ys, points)]
+
+    progress = {
+        "workout_id": [session["workout_id"] for session in sessions],
+        "date": [session["date"] for session in sessions],
+        "sets": [session["sets"] for session in sessions],
+        "sessions": total,
+    }
+    for series in SERIES:
+        progress[series] = [round(session[series], 1) for session in sessions]
+    return progress
@@ -0,0 +1,76 @@
+"""SQLite tuning and lock contention handling.
+
+Every new SQLite connection gets `SQLITE_PRAGMAS` (WAL journaling so readers
+never wait for a writer, `synchronous=NORMAL`, a bigger page cache, memory
+mapped reads, in-memory temp tables and a busy timeout) from
+`configure_connection()`.
+
+WAL still allows only one writer at a time. A write that can't get the lock
+within the busy timeout (or that started as a reader and can't be upgraded)
+fails with "database is locked"; `retry_on_lock` reruns such writes, as a
+whole transaction, a few times with exponential backoff before giving up.
+"""
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+from . import logs
+
+# Applied in this order (`journal_mode` first); override with `SQLITE_PRAGMAS`:
+DEFAULT_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,
+    "cache_size": -65536,
+    "mmap_size": 268435456,
+    "temp_store": "memory",
+}
+
+def configure_connection(connection):
+    """Applies `SQLITE_PRAGMAS` to a new SQLite connection (on `connection_created`, see `signals.py`)."""
+
+    if connection.vendor != "sqlite":
+        return
+    for name, value in getattr(settings, "SQLITE_PRAGMAS", DEFAULT_PRAGMAS).items():
+        # Straight to the sqlite3 connection (these aren't app queries, so skip Django's cursor wrappers):
+        connection.connection.execute("PRAGMA %s = %s" % (name, value))
+
+def is_lock_error(error):
+    """Whether an `OperationalError` is SQLite lock contention (worth retrying) rather than a real failure."""
+
+    message = str(error).lower()
+    return "database is locked" in message or "database table is locked" in message or "database is busy" in message
+
+def retry_on_lock(function):
+    """
+    Reruns `function` in a transaction of its own when it fails on SQLite lock contention: up to
+    `SQLITE_WRITE_RETRIES` more times, waiting `SQLITE_RETRY_BACKOFF` seconds (doubling each time, with jitter).
+
+    Called inside someone else's transaction it just runs once; only whoever owns the transaction can retry it.
+    """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if transaction.get_connection().in_atomic_block:
+            return function(*args, **kwargs)
+
+        retries = getattr(settings, "SQLITE_WRITE_RETRIES", 4)
+        backoff = getattr(settings, "SQLITE_RETRY_BACKOFF", 0.05)
+        attempt = 0
+        while True:
+            try:
+                # One transaction per attempt, so a failed attempt leaves nothing behind:
+                with transaction.atomic():
+                    return function(*args, **kwargs)
+            except OperationalError as error:
+                if attempt >= retries or not is_lock_error(error):
+                    raise
+                attempt += 1
+                logs.event("database.locked", level=logging.WARNING, function=function.__qualname__, attempt=attempt)
+                time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+    return wrapper
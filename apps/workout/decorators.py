@@ -0,0 +1,52 @@
+"""workout app view decorators"""
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.contrib import messages # access django's `messages` module.
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+def login_required(view):
+    """
+    Redirects to the login page unless `request.workout_user` is a valid `User`.
+
+    Requires `WorkoutUserMiddleware`. Works on async views too (the user is looked up off the event loop, after
+    which `request.workout_user` is safe to use in the view).
+    """
+
+    def logged_out(request):
+        # Check for valid session:
+        if not request.workout_user:
+            # If existing session not found:
+            messages.info(request, "You must be logged in to view this page.", extra_tags="invalid_session")
+            return redirect("/")
+        return None
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            return await sync_to_async(logged_out)(request) or await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return logged_out(request) or view(request, *args, **kwargs)
+
+    return wrapper
+
+def api_login_required(view):
+    """
+    Like `login_required`, but answers with a 401 JSON error instead of a redirect (for API clients).
+
+    Requires `WorkoutUserMiddleware`.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.workout_user:
+            return JsonResponse({"errors": ["You must be logged in."]}, status=401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
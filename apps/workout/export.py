@@ -0,0 +1,95 @@
+"""Training history export.
+
+Streams a user's workouts and exercises as CSV or JSON lines, one row per exercise
+(a workout with no exercises gets a single row with empty exercise columns).
+Rows come from one `LEFT JOIN` of `Workout` to `Exercise`, read with
+`.iterator(chunk_size=...)`, so memory use stays flat no matter how long the
+history is.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Workout
+
+FORMATS = ("csv", "jsonl")
+
+# Output column -> ORM lookup (relative to `Workout`):
+COLUMNS = (
+    ("username", "user__username"),
+    ("workout_id", "id"),
+    ("workout_name", "name"),
+    ("workout_description", "description"),
+    ("workout_completed", "completed"),
+    ("workout_created_at", "created_at"),
+    ("exercise_name", "exercise__name"),
+    ("exercise_weight", "exercise__weight"),
+    ("exercise_repetitions", "exercise__repetitions"),
+    ("exercise_category", "exercise__category"),
+    ("exercise_created_at", "exercise__created_at"),
+)
+HEADER = [column for column, _ in COLUMNS]
+
+CHUNK_SIZE = 2000 # Rows fetched from the database at a time
+ROWS_PER_WRITE = 200 # Rows joined into each chunk of output
+
+class _Echo(object):
+    """File-like object whose `write()` just returns the value, so `csv.writer` can format single rows for us."""
+
+    def write(self, value):
+        return value
+
+def history_rows(user_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields export rows (tuples in `HEADER` order).
+
+    Parameters:
+    - `user_id` - Export only this user's history (default: every user).
+    - `chunk_size` - Rows fetched per database round trip.
+    """
+
+    workouts = Workout.objects.all()
+    if user_id is not None:
+        workouts = workouts.filter(user__id=user_id)
+    rows = workouts.order_by("user__id", "id", "exercise__id").values_list(*[lookup for _, lookup in COLUMNS])
+    return rows.iterator(chunk_size=chunk_size)
+
+def _batched(lines):
+    """Joins lines into larger strings so we don't hand the server thousands of tiny writes."""
+
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= ROWS_PER_WRITE:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(["" if value is None else value for value in row])
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(HEADER, row)), cls=DjangoJSONEncoder) + "\n"
+
+def stream_history(format, user_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields the formatted export in chunks of text.
+
+    Parameters:
+    - `format` - One of `FORMATS`.
+    - `user_id` - Export only this user's history (default: every user).
+    - `chunk_size` - Rows fetched per database round trip.
+    """
+
+    if format not in FORMATS:
+        raise ValueError("Unknown export format: %s" % format)
+
+    rows = history_rows(user_id, chunk_size)
+    lines = _csv_lines(rows) if format == "csv" else _jsonl_lines(rows)
+    return _batched(lines)
@@ -0,0 +1,166 @@
+"""Password hashing service.
+
+bcrypt is deliberately slow, so hashing and verifying passwords inline ties up a
+request worker for the full duration of the hash. This module hands that work to
+a small, bounded process pool instead:
+
+- At most `HASHING_POOL_WORKERS` hashes run at once.
+- At most `HASHING_MAX_PENDING` hashes may be queued or running; beyond that we
+  fail fast with `HashingBusy` rather than let requests pile up behind bcrypt.
+- A caller never waits longer than `HASHING_TIMEOUT` seconds for a result.
+
+The bcrypt work factor is read from `BCRYPT_ROUNDS`, and `needs_rehash()` lets the
+login path upgrade (or downgrade) stored hashes whenever that setting changes.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt # bcrypt for password encryption/decryption
+from django.conf import settings
+
+from . import metrics
+
+# Defaults used when a setting is not present in `settings.py`:
+DEFAULT_ROUNDS = 14
+DEFAULT_POOL_WORKERS = 2
+DEFAULT_MAX_PENDING = 16
+DEFAULT_TIMEOUT = 10.0
+
+class HashingUnavailable(Exception):
+    """Raised when a password could not be hashed or verified in time."""
+
+class HashingBusy(HashingUnavailable):
+    """Raised when too many hashes are already queued."""
+
+class HashingTimeout(HashingUnavailable):
+    """Raised when a hash did not finish within `HASHING_TIMEOUT`."""
+
+#--------------------#
+#-- WORKER TASKS: ---#
+#--------------------#
+# Note: These run inside the pool's child processes, so they must be top level (picklable) functions:
+
+def _hash(password, rounds):
+    """Hashes `password` (bytes) with a fresh salt at the given cost."""
+
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _verify(password, hashed):
+    """Checks `password` (bytes) against `hashed` (bytes)."""
+
+    return bcrypt.checkpw(password, hashed)
+
+#-------------#
+#-- POOL: ----#
+#-------------#
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def rounds():
+    """Returns the target bcrypt work factor."""
+
+    return int(_setting("BCRYPT_ROUNDS", DEFAULT_ROUNDS))
+
+def _pool():
+    """Returns the process pool and its pending-slot semaphore, creating both on first use."""
+
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = int(_setting("HASHING_POOL_WORKERS", DEFAULT_POOL_WORKERS))
+                _slots = threading.BoundedSemaphore(int(_setting("HASHING_MAX_PENDING", DEFAULT_MAX_PENDING)))
+                # A worker count of 0 runs hashes inline (handy for tests and the dev server):
+                _executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else False
+    return _executor, _slots
+
+def shutdown():
+    """Stops the pool. The next hash will start a new one (with current settings)."""
+
+    global _executor, _slots
+    with _lock:
+        if _executor:
+            _executor.shutdown(wait=True)
+        _executor = None
+        _slots = None
+
+def _run(fn, *args):
+    """
+    Runs `fn(*args)` on the pool and waits for the result.
+
+    Raises:
+    - `HashingBusy` - If `HASHING_MAX_PENDING` hashes are already queued or running.
+    - `HashingTimeout` - If the result is not ready within `HASHING_TIMEOUT` seconds.
+    """
+
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy("Too many password hashes are pending.")
+
+    if executor is False:
+        try:
+            return fn(*args)
+        finally:
+            slots.release()
+
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    # Free our slot once the worker is done, even if the caller has stopped waiting:
+    future.add_done_callback(lambda f: slots.release())
+
+    try:
+        return future.result(timeout=float(_setting("HASHING_TIMEOUT", DEFAULT_TIMEOUT)))
+    except FutureTimeoutError:
+        future.cancel()
+        raise HashingTimeout("Password hash did not complete in time.")
+
+#-------------#
+#-- PUBLIC: --#
+#-------------#
+
+def hash_password(password):
+    """
+    Hashes a plain text password at the configured work factor.
+
+    Parameters:
+    - `password` - Plain text password (str).
+
+    Returns the bcrypt hash as a str, ready to be stored on `User.password`.
+    """
+
+    with metrics.measure("hash"):
+        return _run(_hash, password.encode(), rounds()).decode()
+
+def check_password(password, hashed):
+    """
+    Checks a plain text password against a stored bcrypt hash.
+
+    Parameters:
+    - `password` - Plain text password (str).
+    - `hashed` - Stored bcrypt hash (str).
+
+    Raises `ValueError` if `hashed` is not a usable bcrypt hash.
+    """
+
+    with metrics.measure("hash"):
+        return _run(_verify, password.encode(), hashed.encode())
+
+def hash_rounds(hashed):
+    """Returns the work factor a bcrypt hash was created with (`$2b$<rounds>$...`)."""
+
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        raise ValueError("Not a bcrypt hash.")
+
+def needs_rehash(hashed):
+    """Returns True if `hashed` was created with a different work factor than `BCRYPT_ROUNDS`."""
+
+    return hash_rounds(hashed) != rounds()
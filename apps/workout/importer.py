@@ -0,0 +1,305 @@
+"""Training history import.
+
+Reads the same CSV / JSON lines layout that `export.py` writes (one row per
+exercise; rows sharing a `workout_id` belong to the same workout) and inserts it
+for one user:
+
+- Rows are read as a stream, so memory use doesn't depend on the file size.
+- Workouts and exercises are checked with the same rules as `WorkoutManager.new`
+  and `ExerciseManager.new`. Bad rows are reported and skipped; they never stop
+  the import.
+- Rows are inserted with `bulk_create`, one transaction per chunk of about
+  `chunk_size` rows (a workout is never split across chunks).
+- Each chunk's transaction also records how far we got in an `ImportJob`, so
+  importing the same file again picks up after the last committed chunk.
+"""
+import csv
+import hashlib
+import io
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .export import FORMATS
+from .models import Workout, Exercise, UserStats, ImportJob, set_volume
+
+CHUNK_SIZE = 1000 # Rows per transaction
+BATCH_SIZE = 500 # Rows per INSERT statement
+
+class ImportConflict(Exception):
+    """Raised when rows written by someone else got mixed into a chunk we were inserting (the chunk is rolled back)."""
+
+#-------------#
+#-- READING: -#
+#-------------#
+
+def file_hash(source):
+    """Returns the sha256 of a binary file object (read in 1MB blocks), leaving it rewound."""
+
+    digest = hashlib.sha256()
+    for block in iter(lambda: source.read(1024 * 1024), b""):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+def read_rows(source, format):
+    """
+    Yields `(line_number, row)` for every data row in a binary file object.
+
+    `row` is a dictionary keyed by the export column names, or None if the line couldn't be read.
+    """
+
+    text = io.TextIOWrapper(source, encoding="utf-8", newline="")
+    try:
+        if format == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(text, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else None
+    finally:
+        # Don't let the wrapper close the caller's file:
+        text.detach()
+
+def _text(row, column):
+    value = row.get(column)
+    return "" if value is None else str(value)
+
+def _datetime(row, column):
+    """Parses an ISO date/time column; returns None if blank, raises ValueError if unreadable."""
+
+    value = _text(row, column).strip()
+    if not value:
+        return None
+    parsed = parse_datetime(value.replace(" ", "T", 1))
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+def _group_key(row):
+    """Rows with the same key belong to the same workout."""
+
+    return _text(row, "workout_id") or (_text(row, "workout_name"), _text(row, "workout_description"), _text(row, "workout_created_at"))
+
+#---------------#
+#-- IMPORTING: -#
+#---------------#
+
+class HistoryImporter(object):
+    """
+    Imports one file for one user.
+
+    Parameters:
+    - `user` - `User` to import into.
+    - `source` - Binary, seekable file object.
+    - `format` - One of `export.FORMATS`.
+    - `chunk_size` - Rows committed per transaction.
+    - `on_progress` - Optional callback, called with the `ImportJob` after each committed chunk.
+    - `on_reject` - Optional callback, called with `(line_number, errors)` for every skipped row.
+    - `restart` - Ignore any earlier progress for this file and import it from the top.
+    """
+
+    def __init__(self, user, source, format, chunk_size=CHUNK_SIZE, on_progress=None, on_reject=None, restart=False):
+        if format not in FORMATS:
+            raise ValueError("Unknown import format: %s" % format)
+        self.user = user
+        self.source = source
+        self.format = format
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.on_reject = on_reject
+        self.restart = restart
+
+    def run(self):
+        """Imports the file (or the rest of it) and returns the finished `ImportJob`."""
+
+        job, _ = ImportJob.objects.get_or_create(user=self.user, source_hash=file_hash(self.source), defaults={"format": self.format})
+        if self.restart:
+            job.rows_committed = job.workouts_created = job.exercises_created = job.rows_rejected = 0
+            job.finished = False
+            job.save()
+        if job.finished:
+            return job
+
+        rows = islice(read_rows(self.source, self.format), job.rows_committed, None)
+        position = job.rows_committed # Rows read so far
+        chunk = [] # Complete workout groups waiting to be committed
+        chunk_rows = 0
+        group = []
+        group_key = None
+        rejected = [] # `(line_number, errors)` waiting to be committed with the chunk
+        unreadable = 0 # Unreadable rows since the last commit
+
+        for line_number, row in rows:
+            if row is None:
+                # Report unreadable rows straight away rather than holding on to them:
+                self._reject(line_number, ["Row could not be read."])
+                unreadable += 1
+                position += 1
+                continue
+
+            key = _group_key(row)
+            if group and key != group_key:
+                # The previous workout is complete:
+                chunk.append(group)
+                chunk_rows += len(group)
+                group = []
+                if chunk_rows >= self.chunk_size:
+                    self._commit(job, chunk, rejected, unreadable, position)
+                    chunk, chunk_rows, rejected, unreadable = [], 0, [], 0
+            group.append((line_number, row))
+            group_key = key
+            position += 1
+
+        if group:
+            chunk.append(group)
+        self._commit(job, chunk, rejected, unreadable, position, finished=True)
+        return job
+
+    def _build(self, group, rejected):
+        """Validates one workout's rows; returns `(workout, [exercise, ...])` (unsaved), or None if the workout is invalid."""
+
+        first_line, first = group[0]
+        values = {"name": _text(first, "workout_name"), "description": _text(first, "workout_description")}
+        errors = Workout.objects.validate(**values)
+        try:
+            created_at = _datetime(first, "workout_created_at")
+        except ValueError:
+            errors.append("Workout created at must be an ISO date and time.")
+        if errors:
+            # Without a valid workout, none of its exercises can be imported:
+            rejected.extend((line_number, errors) for line_number, _ in group)
+            return None
+
+        workout = Workout(
+            name=values["name"],
+            description=values["description"],
+            completed=_text(first, "workout_completed").strip().lower() in ("true", "1", "yes"),
+            user=self.user,
+        )
+        workout.imported_created_at = created_at
+
+        exercises = []
+        for line_number, row in group:
+            values = {"name": _text(row, "exercise_name"), "weight": _text(row, "exercise_weight"), "repetitions": _text(row, "exercise_repetitions")}
+            if not any(values.values()):
+                # A workout with no exercises:
+                continue
+            errors, values = Exercise.objects.validate(**values)
+            try:
+                exercise_created_at = _datetime(row, "exercise_created_at") or created_at
+            except ValueError:
+                errors.append("Exercise created at must be an ISO date and time.")
+            if errors:
+                rejected.append((line_number, errors))
+                continue
+            exercise = Exercise(name=values["name"], weight=values["weight"], repetitions=values["repetitions"], workout=workout)
+            if _text(row, "exercise_category"):
+                exercise.category = _text(row, "exercise_category")
+            exercise.imported_created_at = exercise_created_at
+            exercises.append(exercise)
+        return workout, exercises
+
+    def _reject(self, line_number, errors):
+        if self.on_reject:
+            self.on_reject(line_number, errors)
+
+    def _commit(self, job, chunk, rejected, unreadable, position, finished=False):
+        """Validates and inserts a chunk of workout groups, and records progress, in one transaction."""
+
+        workouts = []
+        exercises = []
+        for group in chunk:
+            built = self._build(group, rejected)
+            if built is not None:
+                workouts.append(built[0])
+                exercises.extend(built[1])
+
+        with transaction.atomic():
+            # Update stats first: on SQLite this takes the write lock, so nobody else can insert between our inserts and id lookups below:
+            UserStats.objects.apply(
+                self.user.id,
+                workouts=len(workouts),
+                completed=sum(1 for workout in workouts if workout.completed),
+                sets=len(exercises),
+                volume=sum((set_volume(exercise.weight, exercise.repetitions) for exercise in exercises), 0),
+            )
+            bulk_insert(Workout, workouts)
+            bulk_insert(Exercise, exercises)
+            # Imported history counts towards levels like any other (streaks need `manage.py backfill_levels`):
+            UserStats.objects.advance(self.user.id)
+
+            job.rows_committed = position
+            job.workouts_created += len(workouts)
+            job.exercises_created += len(exercises)
+            job.rows_rejected += len(rejected) + unreadable
+            job.finished = finished
+            job.save()
+
+        for line_number, errors in rejected:
+            self._reject(line_number, errors)
+        if self.on_progress:
+            self.on_progress(job)
+
+def bulk_insert(model, objs):
+    """
+    Inserts `objs` with `bulk_create`, then backdates `created_at` from `imported_created_at` (where set).
+
+    Django doesn't return primary keys from a SQLite `bulk_create`, so we read them back: every id above the
+    previous maximum is ours, since our transaction holds the write lock.
+
+    Parameters:
+    - `model` - `Workout` or `Exercise`.
+    - `objs` - Unsaved instances, each with an `imported_created_at` attribute (a datetime, or None to keep "now");
+      their `pk` is set on return.
+
+    Call inside `transaction.atomic()`, after a write (e.g. to the user's `UserStats`) has taken the write lock.
+    Raises `ImportConflict` if the ids read back don't add up.
+    """
+
+    if not objs:
+        return
+    previous_max = model.objects.aggregate(id=Max("id"))["id"] or 0
+    model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+
+    if objs[0].pk is None:
+        ids = list(model.objects.filter(id__gt=previous_max).order_by("id").values_list("id", flat=True))
+        if len(ids) != len(objs):
+            raise ImportConflict("Expected %d new %s rows, found %d." % (len(objs), model.__name__, len(ids)))
+        for obj, pk in zip(objs, ids):
+            obj.pk = pk
+
+    # `auto_now_add` always stamps "now", so restore the original dates afterwards. Neighbouring rows usually share
+    # a date (a workout's exercises inherit its date), so we update runs of consecutive ids in one statement each:
+    runs = []
+    for obj in objs:
+        if obj.imported_created_at is None:
+            continue
+        if runs and runs[-1][0] == obj.imported_created_at and runs[-1][2] == obj.pk - 1:
+            runs[-1][2] = obj.pk
+        else:
+            runs.append([obj.imported_created_at, obj.pk, obj.pk])
+        obj.created_at = obj.imported_created_at
+    if runs:
+        column = connection.ops.quote_name(model._meta.get_field("created_at").column)
+        sql = "UPDATE %s SET %s = %%s WHERE id BETWEEN %%s AND %%s" % (connection.ops.quote_name(model._meta.db_table), column)
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [(connection.ops.adapt_datetimefield_value(value), first, last) for value, first, last in runs])
+
+def import_history(user, source, format, **kwargs):
+    """Shortcut for `HistoryImporter(user, source, format, **kwargs).run()`."""
+
+    return HistoryImporter(user, source, format, **kwargs).run()
@@ -0,0 +1,142 @@
+"""Structured, non-blocking logging.
+
+Code logs named events with `logs.event("workout.completed", workout_id=...)`
+rather than printing. Each event becomes one JSON line:
+
+    {"time": "...", "level": "INFO", "event": "workout.completed", "workout_id": 12}
+
+The `apps.workout` logger (see `LOGGING` in settings.py) sends records to a
+`BackgroundHandler`: the request thread only puts the record on a bounded
+queue and a background thread does the formatting and writing. If the queue is
+full (e.g. stdout is backed up) records are dropped, never waited on, and the
+next record written says how many were lost.
+
+Busy, low value events can be sampled with `LOG_SAMPLING` (event name -> the
+fraction kept); warnings and errors are always kept.
+"""
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger("apps.workout")
+
+def sample_rate(name):
+    """Fraction of `name` events kept (from `LOG_SAMPLING`, default all of them)."""
+
+    return getattr(settings, "LOG_SAMPLING", {}).get(name, 1.0)
+
+def event(name, level=logging.INFO, **fields):
+    """
+    Logs a structured event.
+
+    Parameters:
+    - `name` - Event type, dotted (e.g. `workout.created`); also what `LOG_SAMPLING` is keyed by.
+    - `level` - `logging` level (default INFO); WARNING and above are never sampled out.
+    - `**fields` - Values written alongside (anything JSON can't encode is written as `str()`); not `name` or `level`.
+    """
+
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING:
+        rate = sample_rate(name)
+        if rate < 1 and random.random() >= rate:
+            return
+    logger.log(level, name, extra={"event": name, "fields": fields})
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one line of JSON (events' fields included)."""
+
+    def format(self, record):
+        line = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if getattr(record, "event", None):
+            line["event"] = record.event
+            line.update(getattr(record, "fields", {}))
+        else:
+            line["message"] = record.getMessage()
+        if getattr(record, "dropped", 0):
+            line["dropped"] = record.dropped
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            line["exception"] = record.exc_text
+        return json.dumps(line, default=str)
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Queues records for a background thread that writes them to a stream (stdout by default).
+
+    Parameters:
+    - `maxsize` - Records that may wait on the queue; more are dropped (and counted) rather than blocking.
+    - `stream` - Where lines are written.
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, formatter):
+        # Formatting happens on the background thread, in the target:
+        self.target.setFormatter(formatter)
+
+    def _start(self):
+        with self._start_lock:
+            # (Re)start after a fork too: threads don't survive into the child process:
+            if self._pid != os.getpid():
+                self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Resolve what can't safely wait for another thread (message arguments, tracebacks), leave formatting:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            if getattr(record, "dropped", 0):
+                self.dropped -= record.dropped
+
+    def flush(self):
+        """
+        Waits for queued records to be written (stops the background thread; the next record restarts it).
+
+        Note: `logging.shutdown()` calls this at exit, so nothing queued is lost on a clean shutdown.
+        """
+
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+                self._pid = None
+        self.target.flush()
+
+    def close(self):
+        self.flush()
+        super().close()
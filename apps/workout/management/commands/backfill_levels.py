@@ -0,0 +1,59 @@
+"""Works out streaks and levels for existing users from their workout history (see `apps/workout/progression.py`)."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Coalesce, TruncDate
+
+from apps.workout import progression
+from apps.workout.models import User, Workout, UserStats
+
+BATCH_SIZE = 500
+
+class Command(BaseCommand):
+    help = "Replays completed workouts to set every user's streaks, then levels them up from their stats. Run `rebuild_stats` first if stats may be off."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="Limit to this user id (repeatable).")
+
+    def handle(self, *args, **options):
+        user_ids = options["user_ids"]
+
+        stats = UserStats.objects.select_related("user")
+        if user_ids is not None:
+            stats = stats.filter(user__id__in=user_ids)
+        stats = {row.user_id: row for row in stats}
+
+        # One pass over every completed workout's (distinct) completion date, grouped by user. Workouts completed
+        # before `completed_at` existed fall back to their last update:
+        workouts = Workout.objects.filter(completed=True)
+        if user_ids is not None:
+            workouts = workouts.filter(user__id__in=user_ids)
+        dates = (
+            workouts
+            .annotate(completed_on=TruncDate(Coalesce("completed_at", "updated_at")))
+            .values_list("user_id", "completed_on")
+            .order_by("user_id", "completed_on")
+            .distinct()
+        )
+        history = {}
+        for user_id, completed_on in dates.iterator(chunk_size=2000):
+            history.setdefault(user_id, []).append(completed_on)
+
+        users = []
+        for user_id, user_stats in stats.items():
+            current, best, last = progression.streaks(history.get(user_id, []))
+            user_stats.current_streak, user_stats.best_streak, user_stats.last_completed_on = current, best, last
+
+            level = progression.level_for(user_stats.total_completed, user_stats.total_volume, best)
+            user = user_stats.user
+            if level.level > user.level:
+                user.level = level.level
+                user.level_name = level.name
+                users.append(user)
+
+        with transaction.atomic():
+            UserStats.objects.bulk_update(stats.values(), UserStats.STREAK, batch_size=BATCH_SIZE)
+            User.objects.bulk_update(users, ["level", "level_name"], batch_size=BATCH_SIZE)
+        # (`bulk_update()` skips `post_save`, and the site's per-process user caches aren't ours to clear anyway:
+        # running servers show the new levels once their cached copies expire, after `WORKOUT_USER_CACHE_TTL`.)
+
+        self.stdout.write(self.style.SUCCESS("Backfilled streaks for %d user(s); %d leveled up." % (len(stats), len(users))))
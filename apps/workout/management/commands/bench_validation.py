@@ -0,0 +1,70 @@
+"""Micro-benchmark: per-record cost of exercise validation."""
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.workout import validation
+
+def legacy_validate(**kwargs):
+    """
+    The checks `ExerciseManager.new` made before `validation.py` existed, for comparison: called with `**record` and
+    converting numbers into its own `kwargs`, as it did (with the pattern compiled on every call).
+    """
+
+    errors = []
+    if not kwargs['name'] or not kwargs['weight'] or not kwargs['repetitions']:
+        errors.append('All fields are required.')
+    if len(kwargs["name"]) < 2:
+        errors.append('Name is required and must be at least 2 characters long.')
+    EXERCISE_REGEX = re.compile(r'^\s*[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+(?:\s+[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+)*\s*$')
+    if not EXERCISE_REGEX.match(kwargs["name"]):
+        errors.append('Name must contain letters, numbers and basic characters only.')
+    try:
+        kwargs["weight"] = round(float(kwargs["weight"]), 1)
+        kwargs["repetitions"] = round(float(kwargs["repetitions"]), 1)
+        if kwargs["weight"] < 0 or kwargs["repetitions"] < 0:
+            errors.append('Weight and repetitions must be a positive number.')
+    except ValueError:
+        errors.append('Weight and repetitions must be a positive number only, containing at most one decimal place.')
+    return errors, kwargs
+
+class Command(BaseCommand):
+    help = "Times exercise validation per record: the old inline checks, validate() per record, and validate_many()."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per approach (the best is reported).")
+        parser.add_argument("--check", action="store_true", help="Fail if validate() or validate_many() is slower than the inline checks.")
+
+    def handle(self, *args, **options):
+        count = options["records"]
+        # Mostly valid sets, with a few bad ones mixed in:
+        records = [
+            {"name": "Bench Press %d" % (i % 50), "weight": "%d.5" % (100 + i % 200), "repetitions": "heavy" if i % 20 == 0 else str(i % 12 + 1)}
+            for i in range(count)
+        ]
+
+        approaches = [
+            ("inline re.compile (before)", lambda: [legacy_validate(**record) for record in records]),
+            ("validation.validate", lambda: [validation.validate(validation.EXERCISE, record) for record in records]),
+            ("validation.validate_many", lambda: validation.validate_many(validation.EXERCISE, records)),
+        ]
+        # Round robin, so a noisy spell on the machine doesn't land on one approach only:
+        best = {label: float("inf") for label, _ in approaches}
+        for _ in range(options["repeat"]):
+            for label, run in approaches:
+                best[label] = min(best[label], self._time(run))
+        baseline = best["inline re.compile (before)"]
+        for label, _ in approaches:
+            self.stdout.write("%-28s %8.3f us/record  (%.2fx the inline checks)" % (label, best[label] / count * 1e6, best[label] / baseline))
+
+        if options["check"]:
+            slower = [label for label, _ in approaches[1:] if best[label] > baseline]
+            if slower:
+                raise CommandError("Slower than the inline checks: %s" % ", ".join(slower))
+
+    def _time(self, run):
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
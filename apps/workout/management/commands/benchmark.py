@@ -0,0 +1,71 @@
+"""Benchmarks every URL end to end and compares the results against a saved baseline (see `apps/workout/benchmark.py`)."""
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.workout import benchmark
+from apps.workout.management.commands.generate_data import PASSWORD
+from apps.workout.models import User
+
+class Command(BaseCommand):
+    help = "Times every view through the test client (p50/p95/p99 latency, query counts) as a generated user; changes are cleaned up afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", default="bench_0", help="Username to run as (default: the first `generate_data` user).")
+        parser.add_argument("--password", default=PASSWORD, help="Their password (for the login scenario).")
+        parser.add_argument("--iterations", type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=3, help="Untimed requests per scenario first.")
+        parser.add_argument("--only", action="append", help="Only run scenarios whose name contains this (repeatable).")
+        parser.add_argument("--output", help="Write results to this JSON file.")
+        parser.add_argument("--baseline", help="Compare against results saved earlier with --output.")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 slowdown against the baseline, as a fraction.")
+        parser.add_argument("--bcrypt-rounds", type=int, help="Override BCRYPT_ROUNDS (login and register are otherwise dominated by bcrypt).")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError("No user named %s; run `manage.py generate_data` first." % options["user"])
+
+        scenarios = benchmark.scenarios()
+        for view in benchmark.uncovered_views(scenarios):
+            self.stderr.write("Warning: no scenario for %s.%s" % (view.__module__, view.__name__))
+        if options["only"]:
+            scenarios = [scenario for scenario in scenarios if any(part in scenario.name for part in options["only"])]
+
+        def on_result(name, result):
+            self.stdout.write("%-28s p50 %8.2fms  p95 %8.2fms  p99 %8.2fms  %3d queries  %s" % (
+                name, result["p50_ms"], result["p95_ms"], result["p99_ms"], result["queries"], "/".join(str(status) for status in result["status"])))
+
+        run = benchmark.BenchmarkRun(user, options["password"], iterations=options["iterations"], warmup=options["warmup"])
+        overrides = {"BCRYPT_ROUNDS": options["bcrypt_rounds"]} if options["bcrypt_rounds"] else {}
+        # The test client needs `testserver` to be an allowed host:
+        with override_settings(ALLOWED_HOSTS=["testserver"], **overrides):
+            results = run.run(scenarios, on_result=on_result)
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({
+                    "meta": {
+                        "created_at": timezone.now().isoformat(),
+                        "user": user.username,
+                        "iterations": options["iterations"],
+                        "python": platform.python_version(),
+                        "django": django.get_version(),
+                    },
+                    "results": results,
+                }, output, indent=2, sort_keys=True)
+            self.stdout.write("Results written to %s." % options["output"])
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                regressions = benchmark.compare(results, json.load(baseline)["results"], options["tolerance"])
+            for regression in regressions:
+                self.stderr.write("Regression: " + regression)
+            if regressions:
+                raise CommandError("%d regression(s) against %s." % (len(regressions), options["baseline"]))
+            self.stdout.write(self.style.SUCCESS("No regressions against %s." % options["baseline"]))
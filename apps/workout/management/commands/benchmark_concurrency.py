@@ -0,0 +1,57 @@
+"""Compares throughput under many concurrent clients when served through WSGI and through ASGI (see `apps/workout/benchmark.py`)."""
+import json
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from apps.workout import benchmark
+from apps.workout.models import User
+from apps.workout.sessions import SessionStore
+
+DEFAULT_PATHS = ["/dashboard", "/workouts", "/legal/tos"]
+
+class Command(BaseCommand):
+    help = "Sends concurrent GETs through Django's WSGI and ASGI applications in process and compares requests per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", default="bench_0", help="Username the requests are logged in as (default: the first `generate_data` user).")
+        parser.add_argument("--path", action="append", dest="paths", help="Path to request (repeatable; default: %s)." % ", ".join(DEFAULT_PATHS))
+        parser.add_argument("--clients", type=int, default=16, help="Concurrent clients.")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per path and server.")
+        parser.add_argument("--output", help="Write results to this JSON file.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError("No user named %s; run `manage.py generate_data` first." % options["user"])
+
+        session = SessionStore()
+        session["user_id"] = user.id
+        session.create()
+        cookie = "%s=%s" % (settings.SESSION_COOKIE_NAME, session.session_key)
+
+        servers = (
+            ("wsgi", get_wsgi_application(), benchmark.wsgi_throughput),
+            ("asgi", get_asgi_application(), benchmark.asgi_throughput),
+        )
+        results = {}
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                for path in options["paths"] or DEFAULT_PATHS:
+                    for name, application, throughput in servers:
+                        # One untimed request first (connections, template loading):
+                        throughput(application, path, cookie, 1, 1)
+                        result = results.setdefault(path, {})[name] = throughput(application, path, cookie, options["clients"], options["requests"])
+                        self.stdout.write("%-20s %s  %8.1f req/s  p50 %8.2fms  p95 %8.2fms  p99 %8.2fms  %d errors" % (
+                            path, name, result["requests_per_second"], result["p50_ms"], result["p95_ms"], result["p99_ms"], result["errors"]))
+        finally:
+            session.delete()
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"clients": options["clients"], "results": results}, output, indent=2, sort_keys=True)
+            self.stdout.write("Results written to %s." % options["output"])
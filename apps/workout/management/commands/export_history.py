@@ -0,0 +1,36 @@
+"""Exports training history (one user or everyone) to a CSV or JSON lines file."""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.workout import export
+from apps.workout.models import User
+
+class Command(BaseCommand):
+    help = "Writes workouts and exercises to a CSV or JSON lines file, streaming rows from the database."
+
+    def add_arguments(self, parser):
+        who = parser.add_mutually_exclusive_group(required=True)
+        who.add_argument("--user", help="Username to export.")
+        who.add_argument("--all", action="store_true", help="Export every user.")
+        parser.add_argument("--format", choices=export.FORMATS, default="csv")
+        parser.add_argument("--output", default="-", help="File to write (default: stdout).")
+        parser.add_argument("--chunk-size", type=int, default=export.CHUNK_SIZE, help="Rows fetched per database round trip.")
+
+    def handle(self, *args, **options):
+        user_id = None
+        if options["user"]:
+            try:
+                user_id = User.objects.get(username=options["user"]).id
+            except User.DoesNotExist:
+                raise CommandError("No user named %s." % options["user"])
+
+        chunks = export.stream_history(options["format"], user_id=user_id, chunk_size=options["chunk_size"])
+
+        if options["output"] == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+
+        with open(options["output"], "w", newline="", encoding="utf-8") as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write("Exported to %s" % options["output"])
@@ -0,0 +1,94 @@
+"""Fills the database with realistic looking synthetic users, workouts and exercises (for benchmarks)."""
+import random
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from apps.workout import hashing
+from apps.workout.importer import bulk_insert
+from apps.workout.models import User, Workout, Exercise, UserStats
+
+PASSWORD = "password123" # Every generated user's password
+
+# Workout templates: (name, description, [(exercise, typical top weight in lbs), ...]).
+PROGRAMS = [
+    ("Push Day", "Chest, shoulders and triceps", [("Bench Press", 185), ("Overhead Press", 115), ("Incline Dumbbell Press", 60), ("Dips", 0), ("Tricep Pushdown", 50)]),
+    ("Pull Day", "Back and biceps", [("Deadlift", 275), ("Barbell Row", 155), ("Pull Ups", 0), ("Lat Pulldown", 130), ("Bicep Curl", 35)]),
+    ("Leg Day", "Quads, hamstrings and calves", [("Squat", 225), ("Romanian Deadlift", 185), ("Leg Press", 360), ("Lunges", 40), ("Calf Raise", 135)]),
+    ("Upper Body", "Heavy upper", [("Bench Press", 185), ("Barbell Row", 155), ("Overhead Press", 115), ("Pull Ups", 0)]),
+    ("Lower Body", "Heavy lower", [("Squat", 225), ("Deadlift", 275), ("Leg Curl", 90), ("Calf Raise", 135)]),
+    ("Full Body", "A bit of everything", [("Squat", 225), ("Bench Press", 185), ("Barbell Row", 155), ("Plank", 0)]),
+]
+
+class Command(BaseCommand):
+    help = "Generates N users x M workouts x K exercises of synthetic training history (users are named <prefix>_<n>, password %s)." % PASSWORD
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Users to create.")
+        parser.add_argument("--workouts", type=int, default=100, help="Workouts per user.")
+        parser.add_argument("--exercises", type=int, default=8, help="Exercises (sets) per workout.")
+        parser.add_argument("--prefix", default="bench", help="Username prefix.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (the same seed gives the same data).")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=prefix + "_").exists():
+            raise CommandError("Users named %s_* already exist; pick another --prefix." % prefix)
+
+        rng = random.Random(options["seed"])
+        # One bcrypt hash shared by every user (hashing each would take longer than everything else put together):
+        password = hashing.hash_password(PASSWORD)
+
+        for number in range(options["users"]):
+            with transaction.atomic():
+                user = User.objects.create(
+                    username="%s_%d" % (prefix, number),
+                    email="%s_%d@example.com" % (prefix, number),
+                    password=password,
+                    tos_accept=True,
+                )
+                # Take SQLite's write lock first (see `importer.bulk_insert()`):
+                UserStats.objects.create(user=user)
+                workouts, exercises = self._history(rng, user, options["workouts"], options["exercises"])
+                bulk_insert(Workout, workouts)
+                bulk_insert(Exercise, exercises)
+            self.stdout.write("Created %s: %d workouts, %d exercises." % (user.username, len(workouts), len(exercises)))
+
+        # Derive stats, streaks and levels the same way as for real users:
+        user_ids = list(User.objects.filter(username__startswith=prefix + "_").values_list("id", flat=True))
+        UserStats.objects.rebuild(user_ids)
+        call_command("backfill_levels", *["--user=%d" % user_id for user_id in user_ids], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Generated %d user(s)." % len(user_ids)))
+
+    def _history(self, rng, user, workout_count, exercise_count):
+        """Returns unsaved `(workouts, exercises)` for one user: a few sessions a week, getting a little stronger over time."""
+
+        workouts = []
+        exercises = []
+        strength = rng.uniform(0.6, 1.3) # This user's strength relative to the typical weights
+        gaps = [timedelta(days=rng.choice((1, 2, 2, 3, 4)), minutes=rng.randint(-90, 90)) for _ in range(workout_count)]
+        day = timezone.now() - timedelta(hours=2) - sum(gaps, timedelta()) # So the last workout was earlier today
+
+        for number, gap in enumerate(gaps):
+            day += gap
+            name, description, lifts = rng.choice(PROGRAMS)
+            workout = Workout(name=name, description=description, user=user, completed=number < workout_count - 1 or rng.random() < 0.5)
+            workout.completed_at = day + timedelta(hours=1) if workout.completed else None
+            workout.imported_created_at = day
+            workouts.append(workout)
+
+            progress = 1 + 0.25 * number / max(workout_count, 1) # Up to 25% stronger by the end
+            for set_number in range(exercise_count):
+                lift, weight = lifts[set_number * len(lifts) // exercise_count]
+                exercise = Exercise(
+                    name=lift,
+                    weight=round(weight * strength * progress * rng.uniform(0.85, 1.0) / 5) * 5,
+                    repetitions=rng.choice((3, 5, 5, 8, 8, 10, 12)),
+                    workout=workout,
+                )
+                exercise.imported_created_at = day + timedelta(minutes=3 * set_number)
+                exercises.append(exercise)
+        return workouts, exercises
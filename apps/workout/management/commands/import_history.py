@@ -0,0 +1,54 @@
+"""Imports a CSV or JSON lines training history file (as written by `export_history`) for one user."""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.workout import export, importer
+from apps.workout.models import User
+
+class Command(BaseCommand):
+    help = "Streams workouts and exercises from a file into the database in chunks. Re-run to resume an interrupted import."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON lines file to import.")
+        parser.add_argument("--user", required=True, help="Username to import into.")
+        parser.add_argument("--format", choices=export.FORMATS, help="File format (default: from the file extension).")
+        parser.add_argument("--chunk-size", type=int, default=importer.CHUNK_SIZE, help="Rows committed per transaction.")
+        parser.add_argument("--rejects", help="Write rejected rows (line number and errors) to this file.")
+        parser.add_argument("--restart", action="store_true", help="Ignore earlier progress and import the whole file again.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError("No user named %s." % options["user"])
+
+        format = options["format"] or os.path.splitext(options["path"])[1].lstrip(".").lower()
+        if format not in export.FORMATS:
+            raise CommandError("Can't tell the file format; pass --format.")
+
+        rejects = open(options["rejects"], "w", encoding="utf-8") if options["rejects"] else None
+
+        def on_reject(line_number, errors):
+            if rejects:
+                rejects.write("%d: %s\n" % (line_number, " ".join(errors)))
+
+        def on_progress(job):
+            self.stdout.write("%d rows read: %d workouts, %d exercises created, %d rows rejected" % (
+                job.rows_committed, job.workouts_created, job.exercises_created, job.rows_rejected))
+
+        try:
+            with open(options["path"], "rb") as source:
+                job = importer.import_history(
+                    user, source, format,
+                    chunk_size=options["chunk_size"],
+                    on_progress=on_progress,
+                    on_reject=on_reject,
+                    restart=options["restart"],
+                )
+        finally:
+            if rejects:
+                rejects.close()
+
+        self.stdout.write(self.style.SUCCESS("Import finished (%d workouts, %d exercises, %d rows rejected)." % (
+            job.workouts_created, job.exercises_created, job.rows_rejected)))
@@ -0,0 +1,22 @@
+"""Deletes soft deleted workouts and accounts in small batches (see `apps/workout/reaper.py`)."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.workout import reaper
+
+class Command(BaseCommand):
+    help = "Deletes hidden (soft deleted) workouts, their sets and deleted accounts in small batches, once or every --interval seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows deleted per transaction (default: REAPER_BATCH_SIZE).")
+        parser.add_argument("--pause", type=float, default=None, help="Seconds between batches (default: REAPER_PAUSE).")
+        parser.add_argument("--interval", type=float, default=0, help="Keep reaping, this many seconds apart (default: reap once).")
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = reaper.reap(batch_size=options["batch_size"], pause=options["pause"])
+            if not options["interval"]:
+                self.stdout.write(self.style.SUCCESS("Deleted %(users)d users, %(workouts)d workouts and %(exercises)d exercises." % deleted))
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,25 @@
+"""Rebuilds (and/or verifies) the per-user `UserStats` table from `Workout` and `Exercise`."""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.workout.models import UserStats
+
+class Command(BaseCommand):
+    help = "Recomputes every user's lifetime stats from scratch and checks them against the workout history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="Limit to this user id (repeatable).")
+        parser.add_argument("--verify-only", action="store_true", help="Report mismatches without rewriting anything.")
+
+    def handle(self, *args, **options):
+        user_ids = options["user_ids"]
+
+        if not options["verify_only"]:
+            written = UserStats.objects.rebuild(user_ids)
+            self.stdout.write("Rebuilt stats for %d user(s)." % written)
+
+        mismatches = UserStats.objects.verify(user_ids)
+        for user_id, field, stored, expected in mismatches:
+            self.stderr.write("User %s: %s is %s, expected %s" % (user_id, field, stored, expected))
+        if mismatches:
+            raise CommandError("%d stat(s) do not match the workout history." % len(mismatches))
+        self.stdout.write(self.style.SUCCESS("Stats verified."))
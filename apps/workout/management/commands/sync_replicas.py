@@ -0,0 +1,37 @@
+"""Copies the primary SQLite database to its local read replicas (see `apps/workout/replicas.py`)."""
+import logging
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.workout import logs, replicas
+
+class Command(BaseCommand):
+    help = "Copies the primary database to each replica in DATABASE_REPLICAS, once or every --interval seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--alias", action="append", dest="aliases", help="Replica alias to sync (repeatable; default: DATABASE_REPLICAS).")
+        parser.add_argument("--interval", type=float, default=0, help="Keep syncing, this many seconds apart (default: sync once).")
+
+    def handle(self, *args, **options):
+        aliases = options["aliases"] or getattr(settings, "DATABASE_REPLICAS", [])
+        if not aliases:
+            raise CommandError("No replicas configured (DATABASE_REPLICAS is empty).")
+
+        while True:
+            for alias in aliases:
+                try:
+                    seconds = replicas.sync(alias)
+                except sqlite3.Error as error:
+                    # E.g. a long read on the replica held its lock; try again next round:
+                    logs.event("replicas.sync_failed", level=logging.WARNING, alias=alias, error=str(error))
+                    if not options["interval"]:
+                        raise CommandError("Could not sync %s: %s" % (alias, error))
+                    continue
+                if not options["interval"]:
+                    self.stdout.write(self.style.SUCCESS("Synced %s in %.3fs." % (alias, seconds)))
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,223 @@
+"""Per request performance metrics.
+
+`ServerTimingMiddleware` (see `middleware.py`) starts a `RequestTimings` for
+each request. While the request runs, database queries (through an execute
+wrapper on every connection), template rendering and password hashing add
+their time to it. When the response is ready the timings are:
+
+- sent back as a `Server-Timing` header (shown in the browser's dev tools), and
+- added to in-process `Histogram`s, labelled by view, which `/metrics` serves
+  in Prometheus' text format.
+
+Recording is a few `perf_counter()` calls and one lock per histogram per
+request, so it can stay on in production. Every process keeps its own
+histograms; Prometheus adds up the processes it scrapes.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Upper bounds of histogram buckets (Prometheus' `le`):
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# The request being timed in this thread (or task):
+_current = ContextVar("workout_request_timings", default=None)
+
+class RequestTimings(object):
+    """Time spent by one request, by phase (`db`, `tpl`, `hash`)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = {}
+        self.counts = {}
+        self.rendering = 0 # Templates being rendered right now (so included templates aren't counted twice)
+
+    def add(self, phase, seconds):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def server_timing(self, total):
+        """Returns the `Server-Timing` header value, with `total` (seconds) for the whole request."""
+
+        parts = []
+        for phase, description in (("db", "queries"), ("tpl", "templates"), ("hash", "password hashes")):
+            if phase in self.seconds:
+                parts.append('%s;dur=%.2f;desc="%d %s"' % (phase, self.seconds[phase] * 1000, self.counts[phase], description))
+        parts.append("total;dur=%.2f" % (total * 1000))
+        return ", ".join(parts)
+
+def start():
+    """Starts timing a request; returns `(timings, token)`, pass the token to `finish()`."""
+
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+def finish(token):
+    _current.reset(token)
+
+@contextmanager
+def measure(phase):
+    """Adds the time spent inside the block to the current request's `phase` (does nothing outside a request)."""
+
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+def query_wrapper(execute, sql, params, many, context):
+    """Execute wrapper timing every query as `db` (installed on every connection by `install()`)."""
+
+    with measure("db"):
+        return execute(sql, params, many, context)
+
+#------------------#
+#-- INSTALLING: ---#
+#------------------#
+
+_installed = False
+
+def _wrap_connection(sender, connection, **kwargs):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, query_wrapper)
+
+def install():
+    """
+    Times queries as `db` and template rendering as `tpl` (called once from `WorkoutConfig.ready()`).
+
+    The query wrapper goes on every connection as it is opened (rather than around each request), as under ASGI the
+    queries run on another thread's connection.
+    """
+
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.db.backends.signals import connection_created
+    from django.template.base import Template
+
+    connection_created.connect(_wrap_connection)
+
+    render = Template.render
+
+    def timed_render(self, context):
+        timings = _current.get()
+        # Only the outermost template is timed; `{% include %}`d ones are part of it:
+        if timings is None or timings.rendering:
+            return render(self, context)
+        timings.rendering += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timings.rendering -= 1
+            timings.add("tpl", time.perf_counter() - started)
+
+    Template.render = timed_render
+
+#------------------#
+#-- HISTOGRAMS: ---#
+#------------------#
+
+class Histogram(object):
+    """
+    Thread safe Prometheus style histogram, one series per label value.
+
+    Parameters:
+    - `name` - Metric name (e.g. `workout_request_duration_seconds`).
+    - `description` - Prometheus `# HELP` text.
+    - `buckets` - Ascending bucket upper bounds (`+Inf` is added).
+    - `label` - Name of the one label series are split by.
+    """
+
+    def __init__(self, name, description, buckets, label="view"):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series = {} # label value -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def samples(self):
+        """Returns `(label, cumulative bucket counts, count, sum)` for every series."""
+
+        with self._lock:
+            series = [(label, list(values)) for label, values in self._series.items()]
+        samples = []
+        for label, values in sorted(series):
+            cumulative = []
+            running = 0
+            for count in values[:-1]:
+                running += count
+                cumulative.append(running)
+            samples.append((label, cumulative, running, values[-1]))
+        return samples
+
+    def exposition(self):
+        """Returns this histogram in Prometheus' text format."""
+
+        lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s histogram" % self.name]
+        bounds = ["%g" % bound for bound in self.buckets] + ["+Inf"]
+        for label, cumulative, count, total in self.samples():
+            label = '%s="%s"' % (self.label, label.replace("\\", "\\\\").replace('"', '\\"'))
+            for bound, running in zip(bounds, cumulative):
+                lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, label, bound, running))
+            lines.append("%s_sum{%s} %r" % (self.name, label, total))
+            lines.append("%s_count{%s} %d" % (self.name, label, count))
+        return "\n".join(lines)
+
+request_seconds = Histogram("workout_request_duration_seconds", "Time to produce a response.", SECONDS_BUCKETS)
+db_seconds = Histogram("workout_db_duration_seconds", "Time spent in database queries per request.", SECONDS_BUCKETS)
+db_queries = Histogram("workout_db_queries", "Database queries per request.", QUERY_BUCKETS)
+template_seconds = Histogram("workout_template_duration_seconds", "Time spent rendering templates per request.", SECONDS_BUCKETS)
+hash_seconds = Histogram("workout_password_hash_duration_seconds", "Time spent hashing passwords per request (only requests that hash).", SECONDS_BUCKETS)
+
+HISTOGRAMS = (request_seconds, db_seconds, db_queries, template_seconds, hash_seconds)
+
+def record(view, timings, total):
+    """Adds a finished request's timings to the histograms."""
+
+    request_seconds.observe(view, total)
+    db_seconds.observe(view, timings.seconds.get("db", 0.0))
+    db_queries.observe(view, timings.counts.get("db", 0))
+    template_seconds.observe(view, timings.seconds.get("tpl", 0.0))
+    if "hash" in timings.seconds:
+        hash_seconds.observe(view, timings.seconds["hash"])
+
+def exposition():
+    """Returns every histogram in Prometheus' text format."""
+
+    return "\n".join(histogram.exposition() for histogram in HISTOGRAMS) + "\n"
+
+def clear():
+    for histogram in HISTOGRAMS:
+        histogram.clear()
+
+def allowed(request):
+    """Whether `request` may read `/metrics` (from `METRICS_ALLOWED_IPS`; None lets anyone)."""
+
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", ("127.0.0.1", "::1"))
+    return allowed_ips is None or request.META.get("REMOTE_ADDR") in allowed_ips
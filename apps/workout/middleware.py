@@ -0,0 +1,184 @@
+"""workout app middleware
+
+- `ServerTimingMiddleware` times every request (see `metrics.py`).
+- `ReplicaRoutingMiddleware` lets GET requests read from replicas (see `routers.py`).
+- `WorkoutUserMiddleware` resolves the logged in `User` once per request, as `request.workout_user`.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics, routers
+from .models import User
+
+class UserCache(object):
+    """
+    Small thread safe LRU cache of `User` rows, keyed by id.
+
+    Entries are dropped when the `User` is saved or deleted (see `signals.py`), and
+    expire after `ttl` seconds so other processes' writes are picked up eventually.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Returns a copy of the cached `User`, loading it from the database on a miss (None if not found)."""
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                # Hand out a copy so one request can't mutate another's user:
+                return copy.copy(entry[0])
+
+        try:
+            user = User.objects.get(id=user_id)
+        except User.DoesNotExist:
+            return None
+
+        with self._lock:
+            self._entries[user_id] = (user, now + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return copy.copy(user)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache(
+    maxsize=getattr(settings, "WORKOUT_USER_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "WORKOUT_USER_CACHE_TTL", 60),
+)
+
+def get_workout_user(request):
+    """Returns the logged in `User` for this request's session, or None."""
+
+    try:
+        user_id = request.session["user_id"]
+    except KeyError:
+        return None
+    return user_cache.get(user_id)
+
+class WorkoutUserMiddleware(object):
+    """Sets `request.workout_user` (lazily, so pages that don't need it skip the lookup). Works under WSGI and ASGI."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Note: Async views must resolve the user off the event loop (see `decorators.login_required`):
+        request.workout_user = SimpleLazyObject(lambda: get_workout_user(request))
+        return self.get_response(request)
+
+class ServerTimingMiddleware(object):
+    """
+    Times each request's database queries, template rendering and password hashing, sends them back as a
+    `Server-Timing` header (unless `SERVER_TIMING` is off) and adds them to the `/metrics` histograms.
+
+    Goes first in `MIDDLEWARE` so the total includes every other middleware. Works under WSGI and ASGI (the timings
+    live in a context variable, which follows the request into `sync_to_async()` threads).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timings, token = metrics.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = metrics.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish(token)
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+
+        # Label by view (not path) so there is one series per view, and one for everything that didn't resolve:
+        view = request.resolver_match.view_name if getattr(request, "resolver_match", None) else "unresolved"
+        metrics.record(view, timings, total)
+        if getattr(settings, "SERVER_TIMING", True):
+            response["Server-Timing"] = timings.server_timing(total)
+        return response
+
+class ReplicaRoutingMiddleware(object):
+    """
+    Lets GET and HEAD requests read from database replicas, unless the user wrote something in the last
+    `REPLICA_PIN_SECONDS` (remembered in a cookie set after any request that writes). See `routers.py`.
+
+    Goes before any middleware that reads the database (sessions), so those reads are routed too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        try:
+            pinned = float(request.COOKIES.get(routers.PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return routers.start(use_replicas=request.method in ("GET", "HEAD") and not pinned)
+
+    def _finish(self, state, response):
+        if state.wrote:
+            seconds = getattr(settings, "REPLICA_PIN_SECONDS", 10)
+            response.set_cookie(routers.PIN_COOKIE, "%d" % (time.time() + seconds), max_age=seconds, httponly=True, samesite="Lax")
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.finish(token)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.finish(token)
+        return self._finish(state, response)
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0008_auto_20171106_0219'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='password',
+            field=models.CharField(max_length=60),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:07
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_users(apps, schema_editor):
+    """Fails with a readable message (rather than an IntegrityError) if usernames or emails are already duplicated."""
+
+    User = apps.get_model('workout', 'User')
+    for field in ('username', 'email'):
+        duplicates = User.objects.values(field).annotate(n=Count('id')).filter(n__gt=1).values_list(field, flat=True)
+        if duplicates:
+            raise RuntimeError(
+                'Cannot add a unique index on User.%s; these values are used more than once: %s. '
+                'Merge or rename those users and migrate again.' % (field, ', '.join(duplicates))
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0009_user_password_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_users, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='username',
+            field=models.CharField(max_length=20, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['workout', 'updated_at'], name='exercise_workout_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['user', 'id'], name='workout_user_id_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_stats(apps, schema_editor):
+    """Seeds stats for existing users (same totals as `manage.py rebuild_stats`)."""
+
+    from django.db.models import Count, F, Q, Sum
+
+    Workout = apps.get_model('workout', 'Workout')
+    Exercise = apps.get_model('workout', 'Exercise')
+    UserStats = apps.get_model('workout', 'UserStats')
+
+    stats = {}
+    for row in Workout.objects.values('user').annotate(total=Count('id'), done=Count('id', filter=Q(completed=True))).order_by():
+        stats[row['user']] = UserStats(user_id=row['user'], total_workouts=row['total'], total_completed=row['done'])
+    volume = models.ExpressionWrapper(F('weight') * F('repetitions'), output_field=models.DecimalField(max_digits=20, decimal_places=2))
+    for row in Exercise.objects.values('workout__user').annotate(sets=Count('id'), volume=Sum(volume)).order_by():
+        user_stats = stats.setdefault(row['workout__user'], UserStats(user_id=row['workout__user']))
+        user_stats.total_sets = row['sets']
+        user_stats.total_volume = row['volume'] or 0
+    UserStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_workouts', models.IntegerField(default=0)),
+                ('total_completed', models.IntegerField(default=0)),
+                ('total_sets', models.IntegerField(default=0)),
+                ('total_volume', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='workout.user')),
+            ],
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0011_user_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(max_length=64)),
+                ('format', models.CharField(max_length=10)),
+                ('rows_committed', models.IntegerField(default=0)),
+                ('workouts_created', models.IntegerField(default=0)),
+                ('exercises_created', models.IntegerField(default=0)),
+                ('rows_rejected', models.IntegerField(default=0)),
+                ('finished', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='workout.user')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='importjob',
+            constraint=models.UniqueConstraint(fields=('user', 'source_hash'), name='importjob_user_source_unique'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0012_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
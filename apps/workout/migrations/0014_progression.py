@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0013_fragment_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='best_streak',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='current_streak',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='last_completed_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+# Note: Django runs statements one at a time, so each is its own string.
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE workout_search USING fts5(name, description, exercises, tokenize='unicode61 remove_diacritics 2')",
+    # Workouts:
+    """CREATE TRIGGER workout_search_insert AFTER INSERT ON workout_workout BEGIN
+        INSERT INTO workout_search (rowid, name, description, exercises) VALUES (new.id, new.name, new.description, '');
+    END""",
+    """CREATE TRIGGER workout_search_update AFTER UPDATE OF name, description ON workout_workout BEGIN
+        UPDATE workout_search SET name = new.name, description = new.description WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER workout_search_delete AFTER DELETE ON workout_workout BEGIN
+        DELETE FROM workout_search WHERE rowid = old.id;
+    END""",
+    # Exercises (inserts append; anything else rebuilds the workout's list of names):
+    """CREATE TRIGGER exercise_search_insert AFTER INSERT ON workout_exercise BEGIN
+        UPDATE workout_search SET exercises = exercises || ' ' || new.name WHERE rowid = new.workout_id;
+    END""",
+    """CREATE TRIGGER exercise_search_update AFTER UPDATE OF name, workout_id ON workout_exercise BEGIN
+        UPDATE workout_search SET exercises = coalesce((SELECT group_concat(name, ' ') FROM workout_exercise WHERE workout_id = old.workout_id), '') WHERE rowid = old.workout_id;
+        UPDATE workout_search SET exercises = coalesce((SELECT group_concat(name, ' ') FROM workout_exercise WHERE workout_id = new.workout_id), '') WHERE rowid = new.workout_id;
+    END""",
+    """CREATE TRIGGER exercise_search_delete AFTER DELETE ON workout_exercise BEGIN
+        UPDATE workout_search SET exercises = coalesce((SELECT group_concat(name, ' ') FROM workout_exercise WHERE workout_id = old.workout_id), '') WHERE rowid = old.workout_id;
+    END""",
+    # Index what's already there:
+    """INSERT INTO workout_search (rowid, name, description, exercises)
+        SELECT w.id, w.name, w.description, coalesce((SELECT group_concat(e.name, ' ') FROM workout_exercise e WHERE e.workout_id = w.id), '')
+        FROM workout_workout w""",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS exercise_search_delete",
+    "DROP TRIGGER IF EXISTS exercise_search_update",
+    "DROP TRIGGER IF EXISTS exercise_search_insert",
+    "DROP TRIGGER IF EXISTS workout_search_delete",
+    "DROP TRIGGER IF EXISTS workout_search_update",
+    "DROP TRIGGER IF EXISTS workout_search_insert",
+    "DROP TABLE IF EXISTS workout_search",
+]
+
+def fts5_supported(connection):
+    """Whether `connection` is SQLite with the FTS5 extension compiled in."""
+
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return "ENABLE_FTS5" in {row[0] for row in cursor.fetchall()}
+
+
+def create_search_index(apps, schema_editor):
+    """Creates the FTS5 index (see apps/workout/search.py) and its triggers, on SQLite builds that have FTS5; elsewhere search falls back to LIKE."""
+
+    if not fts5_supported(schema_editor.connection):
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0014_progression'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:43
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# SQLite adds a column by rebuilding the table, which drops the table's triggers, so the
+# `workout_search` triggers on `workout_workout` (see 0015_workout_search) are created again:
+search = import_module("apps.workout.migrations.0015_workout_search")
+WORKOUT_TRIGGERS = [statement for statement in search.CREATE_SQL if statement.startswith("CREATE TRIGGER workout_search_")]
+
+def recreate_workout_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite" or "workout_search" not in schema_editor.connection.introspection.table_names():
+        return
+    for name in ("workout_search_insert", "workout_search_update", "workout_search_delete"):
+        schema_editor.execute("DROP TRIGGER IF EXISTS %s" % name)
+    for statement in WORKOUT_TRIGGERS:
+        schema_editor.execute(statement)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0015_workout_search'),
+    ]
+
+    operations = [
+        # (Undoing the column rebuilds the table again:)
+        migrations.RunPython(migrations.RunPython.noop, recreate_workout_triggers),
+        migrations.AddField(
+            model_name='user',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='user_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='workout_deleted_idx'),
+        ),
+        migrations.RunPython(recreate_workout_triggers, migrations.RunPython.noop),
+    ]
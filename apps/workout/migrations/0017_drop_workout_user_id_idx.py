@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Drops `workout_user_id_idx` (added in 0010): the `user` foreign key's index already serves
+    `filter(user__id=...).order_by('-id')` (on SQLite every index ends in the row id).
+    """
+
+    dependencies = [
+        ('workout', '0016_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='workout',
+            name='workout_user_id_idx',
+        ),
+    ]
@@ -1,11 +1,24 @@
-from django.db import models
-import re # regex for email validation
-import bcrypt # bcrypt for password encryption/decryption
+import logging
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
 from decimal import * # for decimal number purposes
+from . import hashing # bcrypt password hashing, run off the request worker
+from . import validation # shared, precompiled validation rules
+from . import progression # level thresholds and streak rules
+from . import autocomplete # in memory exercise name index
+from . import logs # structured, non-blocking logging
+from . import reaper # deletes hidden (soft deleted) rows in the background, in small batches
+from .database import retry_on_lock # reruns writes that hit SQLite lock contention
 
 class UserManager(models.Manager):
     """Additional instance method functions for `User`"""
 
+    def get_queryset(self):
+        # Deleted accounts are hidden until the reaper gets to them (see `remove()`; `User.all_objects` still has them):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
     def register(self, **kwargs):
         """
         Validates and registers a new user.
@@ -20,87 +33,48 @@ class UserManager(models.Manager):
         - Password - Required; Min 8 char, Matches Password Confirmation
         """
 
-        # Create empty errors list, which we'll return to generate django messages back in our controller:
-        errors = []
-
-        #---------------#
-        #-- USERNAME: --#
-        #---------------#
-        # Check if username is less than 2 characters:
-        if len(kwargs["username"][0]) < 2:
-            errors.append('Username is required and must be at least 2 characters long.')
+        # Unpack the first value of each field (request.POST gives us lists):
+        record = {field: (kwargs.get(field) or [""])[0] for field in validation.REGISTRATION.fields}
 
-        # Check if username contains letters, numbers and basic characters only:
-        USERNAME_REGEX = re.compile(r'^[a-zA-Z0-9!@#$%^&*()?]*$') # Create regex object
-        # Test username against regex object:
-        if not USERNAME_REGEX.match(kwargs["username"][0]):
-            errors.append('Username must contain letters, numbers and basic characters only.')
+        # Check format rules (see `validation.REGISTRATION`):
+        errors, record = validation.validate(validation.REGISTRATION, record)
 
         #---------------#
         #-- EXISTING: --#
         #---------------#
-        # Check for existing User via username:
-        if len(User.objects.filter(username=kwargs["username"][0])) > 0:
+        # Check for existing User via username and email (only worth a query if the value is well formed):
+        # Note: A deleted account keeps its username and email until the reaper has removed it.
+        if validation.USERNAME_PATTERN.match(record["username"]) and User.all_objects.filter(username=record["username"]).exists():
             errors.append('Username is already registered to another user.')
-
-        #------------#
-        #-- EMAIL: --#
-        #------------#
-        # Check if email field is empty:
-        if len(kwargs["email"][0]) < 5:
-            errors.append('Email field must be at least 5 characters.')
-
-        # Else if email is greater than 5 characters:
-        else:
-            # Check if email is in valid format (using regex):
-            EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9\.\+_-]+@[a-zA-Z0-9\._-]+\.[a-zA-Z]*$')
-            if not EMAIL_REGEX.match(kwargs["email"][0]):
-                errors.append('Email field is not a valid email format.')
-            else:
-                #---------------#
-                #-- EXISTING: --#
-                #---------------#
-                # Check for existing User via email:
-                if len(User.objects.filter(email=kwargs["email"][0])) > 0:
-                    errors.append('Email address is already registered to another user.')
-
-        #---------------#
-        #-- PASSWORD: --#
-        #---------------#
-        # Check if password is less than 8 characters:
-        if len(kwargs["password"][0]) < 8 or len(kwargs["password_confirmation"][0]) < 8:
-            errors.append('Password fields are required and must be at least 8 characters.')
-        else:
-            # Check if password matches confirmation password:
-            if kwargs["password"][0] != kwargs["password_confirmation"][0]:
-                errors.append('Password and confirmation must match.')
-
-        #-----------------#
-        #-- TOS ACCEPT: --#
-        #-----------------#
-        # Check if TOS box is accepted:
-        # Note: HTML5 required attribute is set, but just in case:
-        if kwargs["tos_accept"][0] == "on":
-            kwargs["tos_accept"][0] = True
-        else:
-            errors.append("Terms of service must be accepted.")
+        if len(record["email"]) >= 5 and validation.EMAIL_PATTERN.match(record["email"]) and User.all_objects.filter(email=record["email"]).exists():
+            errors.append('Email address is already registered to another user.')
 
         # Check for validation errors:
         # If none, hash password, create user and send new user back:
         if len(errors) == 0:
-            kwargs["password"][0] = bcrypt.hashpw((kwargs["password"][0]).encode(), bcrypt.gensalt(14))
+            try:
+                record["password"] = hashing.hash_password(record["password"])
+            except hashing.HashingUnavailable:
+                errors.append('The server is busy. Please try again in a moment.')
+
+        if len(errors) == 0:
             # Create new validated User:
             validated_user = {
-                "logged_in_user": User(username=kwargs["username"][0], email=kwargs["email"][0], password=kwargs["password"][0], tos_accept=kwargs["tos_accept"][0]),
+                "logged_in_user": User(username=record["username"], email=record["email"], password=record["password"], tos_accept=True),
             }
             # Save new User:
-            validated_user["logged_in_user"].save()
-            # Return created User:
-            return validated_user
-        else:
-            # Else, if validation fails, print errors to console and return errors object:
-            for error in errors:
-                print("Validation Error: ", error)
+            # Note: The checks above can race with a concurrent registration, so the unique indexes have the final say:
+            try:
+                with transaction.atomic():
+                    validated_user["logged_in_user"].save()
+                # Return created User:
+                return validated_user
+            except IntegrityError:
+                errors.append('Username or email address is already registered to another user.')
+
+        if len(errors) > 0:
+            # Else, if validation fails, log errors and return errors object:
+            logs.event("validation.failed", model="user", errors=errors)
             # Prepare data for controller:
             errors = {
                 "errors": errors,
@@ -145,21 +119,34 @@ class UserManager(models.Manager):
                 # Note: We must encode both prior to testing
                 try:
 
-                    password = kwargs["password"][0].encode()
-                    hashed = logged_in_user.password.encode()
+                    password = kwargs["password"][0]
+                    hashed = logged_in_user.password
 
-                    if not (bcrypt.checkpw(password, hashed)):
-                        print("ERROR: PASSWORD IS INCORRECT")
+                    if not (hashing.check_password(password, hashed)):
+                        logs.event("login.failed", level=logging.WARNING, reason="password", user_id=logged_in_user.id)
                         # Note: We send back a general error that does not specify what credential is invalid: this is for security purposes and is admittedly a slight inconvenience to our user, but makes it harder to gather information from the server during brute for attempts
                         errors.append("Username or password is incorrect.")
 
+                    # If password is correct but was hashed at an old work factor, rehash it at the current one:
+                    elif hashing.needs_rehash(hashed):
+                        try:
+                            logged_in_user.password = hashing.hash_password(password)
+                            logged_in_user.save(update_fields=["password", "updated_at"])
+                        except hashing.HashingUnavailable:
+                            # Not fatal, we'll try again on their next login:
+                            pass
+
                 except ValueError:
                     # If user's stored password is unable to be used by bcrypt (likely b/c password is not hashed):
                     errors.append('This user is corrupt. Please contact the administrator.')
 
+                except hashing.HashingUnavailable:
+                    # If the hashing pool is saturated or timed out:
+                    errors.append('The server is busy. Please try again in a moment.')
+
             # If existing User is not found:
             except User.DoesNotExist:
-                print("ERROR: USERNAME IS INVALID")
+                logs.event("login.failed", level=logging.WARNING, reason="username")
                 # Note: See password validation note above:
                 errors.append('Username or password is incorrect.')
 
@@ -171,63 +158,72 @@ class UserManager(models.Manager):
             }
             # Send back validated logged in User:
             return validated_user
-        # Else, if validation fails print errors and return errors to controller:
+        # Else, if validation fails log errors and return errors to controller:
         else:
-            for error in errors:
-                print("Validation Error: ", error)
+            logs.event("validation.failed", model="user", errors=errors)
             # Prepare data for controller:
             errors = {
                 "errors": errors,
             }
             return errors
 
+    @retry_on_lock
+    def remove(self, **kwargs):
+        """
+        Deletes an account: hides the user and their workouts right away, and leaves the actual deleting (every
+        workout, set and stats row) to the reaper, a small batch at a time (see `reaper.py`).
+
+        Parameters:
+        - `self` - Instance to whom this method belongs.
+        - `**kwargs` - `user_id` of the user to delete.
+        """
+
+        with transaction.atomic():
+            user = User.objects.get(id=kwargs["user_id"])
+            user.deleted_at = timezone.now()
+            # Note: `save()` (rather than `update()`) so the logged in user cache drops its copy:
+            user.save(update_fields=["deleted_at", "updated_at"])
+            # One UPDATE through the `user` index, however many workouts they have:
+            Workout.objects.filter(user__id=user.id).update(deleted_at=user.deleted_at)
+            transaction.on_commit(reaper.wake)
+        logs.event("user.deleted", user_id=user.id)
+
 class WorkoutManager(models.Manager):
     """Additional instance method functions for `Workout`"""
 
-    def new(self, **kwargs):
+    def get_queryset(self):
+        # Deleted workouts are hidden until the reaper gets to them (see `remove()`; `Workout.all_objects` still has them):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+    def validate(self, **kwargs):
         """
-        Validates and registers a new workout.
+        Validates workout values (shared by `new()`, `update()` and the history importer).
 
         Parameters:
         - `self` - Instance to whom this method belongs.
         - `**kwargs` - Dictionary object of workout values from controller to be validated.
 
-        Validations:
+        Validations (see `validation.WORKOUT`):
         - Name - Required; No fewer than 2 characters; letters, basic characters, numbers only
         - Description - Required; letters, basic characters, numbers only
-        """
 
-        # Create empty errors list, which we'll return to generate django messages back in our controller:
-        errors = []
-
-        #-----------#
-        #-- NAME: --#
-        #-----------#
-        # Check if name is less than 2 characters:
-        if len(kwargs["name"]) < 2:
-            errors.append('Name is required and must be at least 2 characters long.')
+        Returns a list of errors (empty if valid).
+        """
 
-        # Check if name contains letters, numbers and basic characters only:
-        '''
-        Note: The following regex pattern matches for strings which start or do not start with spaces, whom contain letters, numbers and some basic character sequences, followed by either more spaces or more characters. This prevents empty string submissions.
-        '''
-        WORKOUT_REGEX = re.compile(r'^\s*[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+(?:\s+[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+)*\s*$')
+        errors, _ = validation.validate(validation.WORKOUT, kwargs)
+        return errors
 
-        # Test name against regex object:
-        if not WORKOUT_REGEX.match(kwargs["name"]):
-            errors.append('Name must contain letters, numbers and basic characters only.')
+    @retry_on_lock
+    def new(self, **kwargs):
+        """
+        Validates and registers a new workout.
 
-        #------------------#
-        #-- DESCRIPTION: --#
-        #------------------#
-        # Check if description is less than 2 characters:
-        if len(kwargs["description"]) < 2:
-            errors.append('Description is required and must be at least 2 characters long.')
+        Parameters:
+        - `self` - Instance to whom this method belongs.
+        - `**kwargs` - Dictionary object of workout values from controller to be validated (see `validate()`).
+        """
 
-        # Check if description contains letters, numbers and basic characters only:
-        # Test description against regex object (we'll just use WORKOUT_REGEX again since the pattern has not changed):
-        if not WORKOUT_REGEX.match(kwargs["description"]):
-            errors.append('Description must contain letters, numbers and basic characters only.')
+        errors = self.validate(**kwargs)
 
         # Check for validation errors:
         # If none, create workout and return new workout:
@@ -236,74 +232,42 @@ class WorkoutManager(models.Manager):
             validated_workout = {
                 "workout": Workout(name=kwargs["name"], description=kwargs["description"], user=kwargs["user"]),
             }
-            # Save new Workout:
-            validated_workout["workout"].save()
+            # Save new Workout and count it in the user's stats:
+            with transaction.atomic():
+                validated_workout["workout"].save()
+                UserStats.objects.apply(kwargs["user"].id, workouts=1)
             # Return created Workout:
             return validated_workout
         else:
-            # Else, if validation fails, print errors to console and return errors object:
-            for error in errors:
-                print("Validation Error: ", error)
+            # Else, if validation fails, log errors and return errors object:
+            logs.event("validation.failed", model="workout", errors=errors)
             # Prepare data for controller:
             errors = {
                 "errors": errors,
             }
             return errors
 
+    @retry_on_lock
     def update(self, **kwargs):
         """
         Validates and updates a workout.
 
         Parameters:
         - `self` - Instance to whom this method belongs.
-        - `**kwargs` - Dictionary object of workout values from controller to be validated.
-
-        Validations:
-        - Name - Required; No fewer than 2 characters; letters, basic characters, numbers only
-        - Description - Required; letters, basic characters, numbers only
-
-        Developer Note:
-        - This section utilizes essentially the exact same validations as the `new()` method above (in this same WorkoutManager class). However, in this particular case, we're updating a record rather than creating one. At a later point, it might be good to refactor this section/these validations.
+        - `**kwargs` - Dictionary object of workout values from controller to be validated (see `validate()`), and the `workout_id` to update.
         """
 
-        # Create empty errors list, which we'll return to generate django messages back in our controller:
-        errors = []
-
-        #-----------#
-        #-- NAME: --#
-        #-----------#
-        # Check if name is less than 2 characters:
-        if len(kwargs["name"]) < 2:
-            errors.append('Name is required and must be at least 2 characters long.')
-
-        # Check if name contains letters, numbers and basic characters only:
-        '''
-        Note: The following regex pattern matches for strings which start or do not start with spaces, whom contain letters, numbers and some basic character sequences, followed by either more spaces or more characters. This prevents empty string submissions.
-        '''
-        WORKOUT_REGEX = re.compile(r'^\s*[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+(?:\s+[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+)*\s*$')
-
-        # Test name against regex object:
-        if not WORKOUT_REGEX.match(kwargs["name"]):
-            errors.append('Name must contain letters, numbers and basic characters only.')
-
-        #------------------#
-        #-- DESCRIPTION: --#
-        #------------------#
-        # Check if description is less than 2 characters:
-        if len(kwargs["description"]) < 2:
-            errors.append('Description is required and must be at least 2 characters long.')
-
-        # Check if description contains letters, numbers and basic characters only:
-        # Test description against regex object (we'll just use WORKOUT_REGEX again since the pattern has not changed):
-        if not WORKOUT_REGEX.match(kwargs["description"]):
-            errors.append('Description must contain letters, numbers and basic characters only.')
+        errors = self.validate(**kwargs)
 
         # Check for validation errors:
         # If none, create workout and return new workout:
         if len(errors) == 0:
 
             # Update workout:
-            workout = Workout.objects.filter(id=kwargs['workout_id']).update(name=kwargs['name'], description=kwargs["description"])
+            # Note: `update()` skips `auto_now`, so we bump `updated_at` ourselves, and the fragment cache versions (see `version`):
+            with transaction.atomic():
+                workout = Workout.objects.filter(id=kwargs['workout_id']).update(name=kwargs['name'], description=kwargs["description"], updated_at=timezone.now(), version=F("version") + 1)
+                UserStats.objects.filter(user__workout__id=kwargs['workout_id']).update(version=F("version") + 1)
 
             # Return updated Workout:
             updated_workout = {
@@ -311,79 +275,172 @@ class WorkoutManager(models.Manager):
             }
             return updated_workout
         else:
-            # Else, if validation fails, print errors to console and return errors object:
-            for error in errors:
-                print("Validation Error: ", error)
+            # Else, if validation fails, log errors and return errors object:
+            logs.event("validation.failed", model="workout", errors=errors)
             # Prepare data for controller:
             errors = {
                 "errors": errors,
             }
             return errors
 
+    def touch(self, workout_id):
+        """
+        Bumps a workout's `version` so its cached exercise table is re-rendered. Call inside the same transaction as
+        the exercise write it accounts for.
+        """
+
+        Workout.objects.filter(id=workout_id).update(version=F("version") + 1)
+
+    @retry_on_lock
+    def complete(self, **kwargs):
+        """
+        Marks a workout as completed.
+
+        Parameters:
+        - `self` - Instance to whom this method belongs.
+        - `**kwargs` - `workout_id` of the workout to complete.
+
+        Returns True if the workout was completed by this call (False if it already was).
+        """
+
+        with transaction.atomic():
+            workout = Workout.objects.select_for_update().get(id=kwargs["workout_id"])
+            if workout.completed:
+                return False
+            workout.completed = True
+            workout.completed_at = timezone.now()
+            workout.version = F("version") + 1
+            workout.save()
+            UserStats.objects.apply(workout.user_id, completed=1)
+            UserStats.objects.advance(workout.user_id, completed_on=timezone.localdate(workout.completed_at))
+        return True
+
+    @retry_on_lock
+    def repeat(self, **kwargs):
+        """
+        Starts a new workout copying one of a user's workouts and all of its exercises (sets), optionally with
+        progressive overload.
+
+        Parameters:
+        - `self` - Instance to whom this method belongs.
+        - `**kwargs` - `workout_id` of the workout to copy, the `user` it must belong to, and `overload`, a percentage
+          (0 to `MAX_OVERLOAD`) every weight goes up by, rounded up to the next `OVERLOAD_INCREMENT` lbs
+          (so an overload never lowers a weight).
+
+        The copy is one transaction: the workout, a single `bulk_create` of every set (one query no matter how many) and
+        one stats update.
+
+        Returns `{"workout": new workout}`, or `{"errors": [...]}`.
+        """
+
+        errors = []
+        try:
+            overload = Decimal(str(kwargs.get("overload") or 0))
+            if not overload.is_finite() or overload < 0 or overload > MAX_OVERLOAD:
+                raise InvalidOperation
+        except InvalidOperation:
+            errors.append('Overload must be a percentage from 0 to %s.' % MAX_OVERLOAD)
+            overload = None
+
+        source = Workout.objects.filter(id=kwargs["workout_id"], user__id=kwargs["user"].id).first()
+        if source is None:
+            errors.append('Workout not found.')
+
+        if len(errors) > 0:
+            logs.event("validation.failed", model="workout", errors=errors)
+            return {
+                "errors": errors,
+            }
+
+        factor = 1 + overload / 100
+        workout = Workout(name=source.name, description=source.description, user=kwargs["user"])
+        exercises = []
+        volume = Decimal(0)
+        # One read of the sets, in the order they were logged:
+        for name, weight, repetitions, category in Exercise.objects.filter(workout__id=source.id).order_by("created_at", "id").values_list("name", "weight", "repetitions", "category"):
+            if overload:
+                weight = (weight * factor / OVERLOAD_INCREMENT).quantize(Decimal(1), rounding=ROUND_CEILING) * OVERLOAD_INCREMENT
+            exercises.append(Exercise(name=name, weight=weight, repetitions=repetitions, category=category, workout=workout))
+            volume += set_volume(weight, repetitions)
+
+        with transaction.atomic():
+            workout.save()
+            Exercise.objects.bulk_create(exercises)
+            UserStats.objects.apply(workout.user_id, workouts=1, sets=len(exercises), volume=volume)
+            UserStats.objects.advance(workout.user_id)
+
+            def count_names():
+                for exercise in exercises:
+                    autocomplete.name_index.add(workout.user_id, exercise.name)
+            transaction.on_commit(count_names)
+
+        return {
+            "workout": workout,
+        }
+
+    @retry_on_lock
+    def remove(self, **kwargs):
+        """
+        Deletes a workout, taking it (and its exercises) back out of the user's stats.
+
+        The workout is only hidden here (a single row UPDATE); its exercises and then the workout itself are deleted
+        later by the reaper, a small batch at a time, so a big workout never holds the write lock for long (see
+        `reaper.py`).
+
+        Parameters:
+        - `self` - Instance to whom this method belongs.
+        - `**kwargs` - `workout_id` of the workout to delete.
+        """
+
+        with transaction.atomic():
+            workout = Workout.objects.get(id=kwargs["workout_id"])
+            totals = Exercise.objects.filter(workout__id=workout.id).aggregate(sets=Count("id"), volume=Sum(VOLUME))
+            Workout.objects.filter(id=workout.id).update(deleted_at=timezone.now(), version=F("version") + 1)
+            UserStats.objects.apply(
+                workout.user_id,
+                workouts=-1,
+                completed=-1 if workout.completed else 0,
+                sets=-totals["sets"],
+                volume=-(totals["volume"] or 0),
+            )
+            transaction.on_commit(reaper.wake)
+
 class ExerciseManager(models.Manager):
     """Additional instance method functions for `Exercise`"""
 
-    def new(self, **kwargs):
+    def get_queryset(self):
+        # Sets of deleted workouts are hidden with them (`Exercise.all_objects` still has them):
+        return super().get_queryset().filter(workout__deleted_at__isnull=True)
+
+    def validate(self, **kwargs):
         """
-        Validates and registers a new exercise.
+        Validates exercise values (shared by `new()` and `new_many()`).
 
         Parameters:
         - `self` - Instance to whom this method belongs.
         - `**kwargs` - Dictionary object of exercise values from controller to be validated.
 
-        Validations:
+        Validations (see `validation.EXERCISE`):
         - Name - Required; No fewer than 2 characters; letters, basic characters, numbers only
         - Weight (lbs) - Required; Numbers only, Decimals allowed.
         - Repetitions - Required; Numbers only, no Decimals.
-        """
-
-        # Create empty errors list, which we'll return to generate django messages back in our controller:
-        errors = []
 
-        #---------------#
-        #-- REQUIRED: --#
-        #---------------#
-        # Check if all fields are present:
-        if not kwargs['name'] or not kwargs['weight'] or not kwargs['repetitions']:
-            errors.append('All fields are required.')
-
-        #-----------#
-        #-- NAME: --#
-        #-----------#
-        # Check if name is less than 2 characters:
-        if len(kwargs["name"]) < 2:
-            errors.append('Name is required and must be at least 2 characters long.')
-
-        # Check if name contains letters, numbers and basic characters only:
-        '''
-        Note: The following regex pattern matches for strings which start or do not start with spaces, whom contain letters, numbers and some basic character sequences, followed by either more spaces or more characters. This prevents empty string submissions.
-        '''
-        EXERCISE_REGEX = re.compile(r'^\s*[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+(?:\s+[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+)*\s*$')
-
-        # Test name against regex object:
-        if not EXERCISE_REGEX.match(kwargs["name"]):
-            errors.append('Name must contain letters, numbers and basic characters only.')
-
-        #---------------------------#
-        #-- WEIGHT & REPETITIONS: --#
-        #---------------------------#
-        # Try converting weight and repetitions to floating numbers, rounded to tenth place:
-        try:
-            kwargs["weight"] = round(float(kwargs["weight"]), 1)
-            kwargs["repetitions"] = round(float(kwargs["repetitions"]), 1)
+        Returns a tuple of `(errors, kwargs)`, where `kwargs` has weight and repetitions converted to numbers.
+        """
 
-            # Ensure weight and repetitions is a positive number:
-            if (kwargs["weight"] < 0) or (kwargs["repetitions"] < 0):
-                errors.append('Weight and repetitions must be a positive number.')
+        return validation.validate(validation.EXERCISE, kwargs)
 
-            # Ensure repetitions is a positive number:
-            # if (kwargs["repetitions"] < 0):
-            #     errors.append('Weight cannot be a negative number.')
+    @retry_on_lock
+    def new(self, **kwargs):
+        """
+        Validates and registers a new exercise.
 
-        except ValueError:
-            # If value error, send error:
-            errors.append('Weight and repetitions must be a positive number only, containing at most one decimal place.')
+        Parameters:
+        - `self` - Instance to whom this method belongs.
+        - `**kwargs` - Dictionary object of exercise values from controller to be validated (see `validate()`).
+        """
 
+        errors, kwargs = self.validate(**kwargs)
 
         # Check for validation errors:
         # If none, create exercise and return created exercise:
@@ -392,32 +449,247 @@ class ExerciseManager(models.Manager):
             validated_exercise = {
                 "exercise": Exercise(name=kwargs["name"], weight=kwargs["weight"], repetitions=kwargs["repetitions"], workout=kwargs["workout"]),
             }
-            # Save new Workout:
-            validated_exercise["exercise"].save()
-            # Return created Workout:
+            # Save new Exercise and add it to the user's stats:
+            with transaction.atomic():
+                validated_exercise["exercise"].save()
+                Workout.objects.touch(kwargs["workout"].id)
+                UserStats.objects.apply(kwargs["workout"].user_id, sets=1, volume=set_volume(kwargs["weight"], kwargs["repetitions"]))
+                UserStats.objects.advance(kwargs["workout"].user_id)
+                # Only count the name in the autocomplete index once the set is really saved:
+                transaction.on_commit(lambda: autocomplete.name_index.add(kwargs["workout"].user_id, kwargs["name"]))
+            # Return created Exercise:
             return validated_exercise
         else:
-            # Else, if validation fails, print errors to console and return errors object:
-            for error in errors:
-                print("Validation Error: ", error)
+            # Else, if validation fails, log errors and return errors object:
+            logs.event("validation.failed", model="exercise", errors=errors)
             # Prepare data for controller:
             errors = {
                 "errors": errors,
             }
             return errors
 
+    @retry_on_lock
+    def new_many(self, **kwargs):
+        """
+        Validates and registers a batch of exercises (sets) for one workout.
+
+        Parameters:
+        - `self` - Instance to whom this method belongs.
+        - `**kwargs` - `workout` the sets belong to, and `sets`, a list of dictionaries of exercise values (see `validate()`).
+
+        Valid sets are inserted with a single `bulk_create` (and one stats update) in one transaction; invalid sets are skipped.
+
+        Returns a dictionary with `created` (list of the indexes of created sets) and `errors` (dictionary of set index to errors list).
+        """
+
+        workout = kwargs["workout"]
+        created = []
+        exercises = []
+        volume = Decimal(0)
+
+        # Validate every set in one pass; each set passes or fails by itself, so one bad row doesn't reject the rest:
+        result = validation.validate_many(validation.EXERCISE, kwargs["sets"])
+        for index, values in result.valid:
+            created.append(index)
+            exercises.append(Exercise(name=values["name"], weight=values["weight"], repetitions=values["repetitions"], workout=workout))
+            volume += set_volume(values["weight"], values["repetitions"])
+
+        if len(exercises) > 0:
+            with transaction.atomic():
+                Exercise.objects.bulk_create(exercises)
+                Workout.objects.touch(workout.id)
+                UserStats.objects.apply(workout.user_id, sets=len(exercises), volume=volume)
+                UserStats.objects.advance(workout.user_id)
+
+                def count_names():
+                    for exercise in exercises:
+                        autocomplete.name_index.add(workout.user_id, exercise.name)
+                transaction.on_commit(count_names)
+
+        return {
+            "created": created,
+            "errors": result.errors,
+        }
+
+    @retry_on_lock
+    def remove(self, **kwargs):
+        """
+        Deletes an exercise, taking it back out of the user's stats.
+
+        Parameters:
+        - `self` - Instance to whom this method belongs.
+        - `**kwargs` - `exercise_id` of the exercise to delete.
+        """
+
+        with transaction.atomic():
+            exercise = Exercise.objects.select_related("workout").get(id=kwargs["exercise_id"])
+            exercise.delete()
+            Workout.objects.touch(exercise.workout_id)
+            UserStats.objects.apply(exercise.workout.user_id, sets=-1, volume=-set_volume(exercise.weight, exercise.repetitions))
+            transaction.on_commit(lambda: autocomplete.name_index.add(exercise.workout.user_id, exercise.name, uses=-1))
+
+# Progressive overload for `WorkoutManager.repeat()`: the most a repeat may add (percent), and what weights round up to (lbs):
+MAX_OVERLOAD = Decimal(25)
+OVERLOAD_INCREMENT = Decimal("2.5")
+
+# Volume of a set (weight x repetitions), as an expression for aggregating over `Exercise`:
+VOLUME = models.ExpressionWrapper(F("weight") * F("repetitions"), output_field=models.DecimalField(max_digits=20, decimal_places=2))
+
+def set_volume(weight, repetitions):
+    """Returns weight x repetitions as a Decimal (accepts floats, Decimals or strings)."""
+
+    return Decimal(str(weight)) * Decimal(str(repetitions))
+
+class UserStatsManager(models.Manager):
+    """Additional instance method functions for `UserStats`"""
+
+    def for_user(self, user):
+        """Returns the stats row for `user` (an unsaved, all zero row if they have none yet)."""
+
+        return self.filter(user__id=user.id).first() or UserStats(user=user)
+
+    def apply(self, user_id, workouts=0, completed=0, sets=0, volume=0):
+        """
+        Adds deltas to a user's stats in a single UPDATE (creating their row if needed), and bumps their `version`
+        so cached dashboard fragments are re-rendered.
+
+        Call this inside the same transaction as the write it accounts for.
+
+        Parameters:
+        - `user_id` - Id of the `User` whose stats change.
+        - `workouts`, `completed`, `sets` - Change in count (may be negative).
+        - `volume` - Change in total volume, weight x repetitions (may be negative).
+        """
+
+        deltas = {
+            "total_workouts": workouts,
+            "total_completed": completed,
+            "total_sets": sets,
+            "total_volume": Decimal(volume),
+        }
+        # Only touch the counters that actually change:
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        changes["version"] = F("version") + 1
+        if UserStats.objects.filter(user__id=user_id).update(**changes) == 0:
+            UserStats.objects.get_or_create(user_id=user_id)
+            UserStats.objects.filter(user__id=user_id).update(**changes)
+
+    def advance(self, user_id, completed_on=None):
+        """
+        Moves a user's streak and level forward from their (just updated) stats; call after `apply()`, in the same
+        transaction. One read, plus a write only when something changed.
+
+        Parameters:
+        - `user_id` - Id of the `User`.
+        - `completed_on` - Date a workout was just completed on, if one was (extends or restarts the streak).
+
+        Returns the user's `progression.Level` if they just went up a level, otherwise None.
+        """
+
+        stats = UserStats.objects.select_related("user").filter(user__id=user_id).first()
+        if stats is None:
+            return None
+
+        if completed_on is not None:
+            stats.current_streak = progression.next_streak(stats.current_streak, stats.last_completed_on, completed_on)
+            stats.best_streak = max(stats.best_streak, stats.current_streak)
+            stats.last_completed_on = max(stats.last_completed_on or completed_on, completed_on)
+            stats.save(update_fields=["current_streak", "best_streak", "last_completed_on"])
+
+        level = progression.level_for(stats.total_completed, stats.total_volume, stats.best_streak)
+        user = stats.user
+        if level.level <= user.level:
+            # Levels are only ever gained:
+            return None
+        user.level = level.level
+        user.level_name = level.name
+        # Note: `save()` (rather than `update()`) so the logged in user cache drops its copy:
+        user.save(update_fields=["level", "level_name", "updated_at"])
+        logs.event("user.leveled_up", user_id=user.id, new_level=level.level, level_name=level.name)
+        return level
+
+    def compute(self, user_ids=None):
+        """
+        Computes stats from scratch from `Workout` and `Exercise`.
+
+        Parameters:
+        - `user_ids` - Optional list of user ids to limit to (default: every user).
+
+        Returns a dict of `{user_id: UserStats(...)}` (unsaved) for every user with at least one workout.
+        """
+
+        workouts = Workout.objects.all()
+        exercises = Exercise.objects.all()
+        if user_ids is not None:
+            workouts = workouts.filter(user__id__in=user_ids)
+            exercises = exercises.filter(workout__user__id__in=user_ids)
+
+        stats = {}
+        for row in workouts.values("user").annotate(total=Count("id"), done=Count("id", filter=Q(completed=True))).order_by():
+            stats[row["user"]] = UserStats(user_id=row["user"], total_workouts=row["total"], total_completed=row["done"])
+        for row in exercises.values("workout__user").annotate(sets=Count("id"), volume=Sum(VOLUME)).order_by():
+            user_stats = stats.setdefault(row["workout__user"], UserStats(user_id=row["workout__user"]))
+            user_stats.total_sets = row["sets"]
+            user_stats.total_volume = row["volume"] or Decimal(0)
+        return stats
+
+    def rebuild(self, user_ids=None):
+        """Replaces stored stats with freshly computed ones (for `user_ids`, or everyone). Returns the number of rows written."""
+
+        stats = self.compute(user_ids)
+        with transaction.atomic():
+            existing = UserStats.objects.all()
+            if user_ids is not None:
+                existing = existing.filter(user__id__in=user_ids)
+            # Carry every version forward (plus one), so fragments cached before the rebuild are never served again,
+            # and keep streaks (they aren't counters we can recompute here; see `manage.py backfill_levels`):
+            for row in existing.values("user", "version", *UserStats.STREAK):
+                user_stats = stats.setdefault(row["user"], UserStats(user_id=row["user"]))
+                user_stats.version = row["version"] + 1
+                for field in UserStats.STREAK:
+                    setattr(user_stats, field, row[field])
+            existing.delete()
+            UserStats.objects.bulk_create(stats.values(), batch_size=500)
+        return len(stats)
+
+    def verify(self, user_ids=None):
+        """Returns a list of `(user_id, field, stored, expected)` for every stored stat that disagrees with a fresh computation."""
+
+        expected = self.compute(user_ids)
+        stored = UserStats.objects.all()
+        if user_ids is not None:
+            stored = stored.filter(user__id__in=user_ids)
+        stored = {row.user_id: row for row in stored}
+
+        mismatches = []
+        for user_id in set(expected) | set(stored):
+            want = expected.get(user_id) or UserStats(user_id=user_id)
+            have = stored.get(user_id) or UserStats(user_id=user_id)
+            for field in UserStats.COUNTERS:
+                if Decimal(getattr(have, field)) != Decimal(getattr(want, field)):
+                    mismatches.append((user_id, field, getattr(have, field), getattr(want, field)))
+        return mismatches
+
 class User(models.Model):
     """Creates instances of `User`."""
 
-    username = models.CharField(max_length=20)
-    email = models.CharField(max_length=50)
-    password = models.CharField(max_length=22)
+    username = models.CharField(max_length=20, unique=True)
+    email = models.CharField(max_length=50, unique=True)
+    password = models.CharField(max_length=60)
     tos_accept = models.BooleanField(default=False)
     level = models.IntegerField(default=1)
     level_name = models.CharField(max_length=15, default="Newbie")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    objects = UserManager() # Adds additional instance methods to `User`
+    deleted_at = models.DateTimeField(null=True, blank=True) # Set by `UserManager.remove()`; the reaper deletes the row later
+    objects = UserManager() # Adds additional instance methods to `User` (and hides deleted users)
+    all_objects = models.Manager() # Deleted users too (for the reaper and uniqueness checks)
+
+    class Meta:
+        indexes = [
+            # Reaper: `filter(deleted_at__isnull=False)` (only deleted rows are indexed, so it costs nothing otherwise)
+            models.Index(fields=["deleted_at"], condition=Q(deleted_at__isnull=False), name="user_deleted_idx"),
+        ]
 
 class Workout(models.Model):
     """Creates instances of `Workout`."""
@@ -425,10 +697,22 @@ class Workout(models.Model):
     name = models.CharField(max_length=50)
     description = models.CharField(max_length=150)
     completed = models.BooleanField(default=False)
+    completed_at = models.DateTimeField(null=True, blank=True) # Set by `WorkoutManager.complete()`
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=None)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    objects = WorkoutManager()
+    version = models.IntegerField(default=0) # Bumped by every write to the workout or its exercises (keys its cached exercise table)
+    deleted_at = models.DateTimeField(null=True, blank=True) # Set by `WorkoutManager.remove()`; the reaper deletes the row later
+    objects = WorkoutManager() # Hides deleted workouts
+    all_objects = models.Manager() # Deleted workouts too (for the reaper)
+
+    class Meta:
+        # Note: Dashboard / all workouts (`filter(user__id=...).order_by('-id')`) use the `user` foreign key's own index,
+        # which on SQLite already ends in the row id.
+        indexes = [
+            # Reaper: `filter(deleted_at__isnull=False)` (only deleted rows are indexed)
+            models.Index(fields=["deleted_at"], condition=Q(deleted_at__isnull=False), name="workout_deleted_idx"),
+        ]
 
 class Exercise(models.Model):
     """Creates instances of `Exercise`."""
@@ -440,4 +724,47 @@ class Exercise(models.Model):
     workout = models.ForeignKey(Workout, on_delete=models.CASCADE, default=None)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    objects = ExerciseManager()
+    objects = ExerciseManager() # Hides sets of deleted workouts
+    all_objects = models.Manager() # Sets of deleted workouts too (for the reaper)
+
+    class Meta:
+        indexes = [
+            # Workout page: `filter(workout__id=...).order_by('-updated_at')`
+            models.Index(fields=["workout", "updated_at"], name="exercise_workout_updated_idx"),
+        ]
+
+class UserStats(models.Model):
+    """Lifetime training totals for a `User`, kept up to date by the manager write paths."""
+
+    COUNTERS = ("total_workouts", "total_completed", "total_sets", "total_volume")
+    STREAK = ("current_streak", "best_streak", "last_completed_on")
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="stats")
+    total_workouts = models.IntegerField(default=0)
+    total_completed = models.IntegerField(default=0)
+    total_sets = models.IntegerField(default=0)
+    total_volume = models.DecimalField(max_digits=20, decimal_places=2, default=0) # Sum of weight x repetitions
+    current_streak = models.IntegerField(default=0) # See `progression.next_streak()`
+    best_streak = models.IntegerField(default=0)
+    last_completed_on = models.DateField(null=True, blank=True)
+    version = models.IntegerField(default=0) # Bumped by every write to the user's workouts (keys their cached dashboard fragments)
+    objects = UserStatsManager()
+
+class ImportJob(models.Model):
+    """Progress of a history import, so an interrupted import can resume from its last committed chunk."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    source_hash = models.CharField(max_length=64) # sha256 of the imported file
+    format = models.CharField(max_length=10)
+    rows_committed = models.IntegerField(default=0) # Data rows read, up to the end of the last committed chunk
+    workouts_created = models.IntegerField(default=0)
+    exercises_created = models.IntegerField(default=0)
+    rows_rejected = models.IntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "source_hash"], name="importjob_user_source_unique"),
+        ]
@@ -0,0 +1,96 @@
+"""Keyset (cursor) pagination.
+
+Django's `Paginator` runs a `COUNT(*)` and an `OFFSET` scan on every page, both of
+which get slower the more rows a user has. Keyset pagination instead remembers the
+id at the edge of the current page and asks for rows "before id X" (next page) or
+"after id X" (previous page), so every page is a single index range read.
+
+Only querysets ordered by `-id` are supported (newest first), which is how all of
+our workout lists are ordered. Querysets of model instances and `values()`
+querysets (which must include `id`) both work.
+"""
+
+def _row_id(row):
+    """Returns the id of a model instance or a `values()` dictionary."""
+
+    return row["id"] if isinstance(row, dict) else row.id
+
+class KeysetPage(object):
+    """One page of results plus the cursors needed to move to its neighbours."""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return len(self.object_list) > 0
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        """Pass as `?before=` to load the next (older) page."""
+
+        return _row_id(self.object_list[-1]) if self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        """Pass as `?after=` to load the previous (newer) page."""
+
+        return _row_id(self.object_list[0]) if self.object_list else None
+
+def _cursor(value):
+    """Parses a cursor from the query string; returns None if missing or invalid."""
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def keyset_page(queryset, before=None, after=None, per_page=12):
+    """
+    Returns a `KeysetPage` of `queryset` (ordered by `-id`).
+
+    Parameters:
+    - `queryset` - Unordered or `-id` ordered queryset to page through.
+    - `before` - Cursor; load the page of rows with ids lower than this (next page).
+    - `after` - Cursor; load the page of rows with ids higher than this (previous page).
+    - `per_page` - Rows per page.
+
+    With no valid cursor the first (newest) page is returned. Each page costs one
+    indexed range read of `per_page + 1` rows plus, at most, one indexed `EXISTS`.
+    """
+
+    before = _cursor(before)
+    after = _cursor(after)
+
+    if after is not None:
+        # Walk forwards (ascending) from the cursor, then flip back to newest first:
+        rows = list(queryset.filter(id__gt=after).order_by('id')[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        if not rows:
+            # Cursor is past the newest row (e.g. rows were deleted), start over:
+            return keyset_page(queryset, per_page=per_page)
+        has_next = queryset.filter(id__lte=after).exists()
+        return KeysetPage(rows, has_next=has_next, has_previous=has_previous)
+
+    ordered = queryset.order_by('-id')
+    if before is not None:
+        ordered = ordered.filter(id__lt=before)
+    rows = list(ordered[:per_page + 1])
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None and not rows:
+        # Cursor is past the oldest row, start over:
+        return keyset_page(queryset, per_page=per_page)
+    has_previous = before is not None and queryset.filter(id__gte=before).exists()
+    return KeysetPage(rows, has_next=has_next, has_previous=has_previous)
@@ -0,0 +1,95 @@
+"""Level and badge progression.
+
+A user's level is the highest entry in `levels()` whose thresholds they meet:
+completed workouts, lifetime volume (weight x repetitions) and best streak.
+Levels are worked out from the counters kept in `UserStats` as workouts are
+completed and sets logged (see `UserStatsManager.advance()`), never by reading
+back through the user's history; `manage.py backfill_levels` does that once
+for existing users.
+
+A streak is a run of completed workouts with no more than `streak_gap_days()`
+days between one and the next. Levels (and badges, `badge_<level>.png`) are
+only ever gained, never taken away.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+
+Level = namedtuple("Level", ["level", "name", "completed", "volume", "streak"])
+
+# Defaults used when `PROGRESSION_LEVELS` / `PROGRESSION_STREAK_GAP_DAYS` are not in `settings.py`.
+# One entry per badge image: (name, completed workouts, lifetime volume in lbs, best streak).
+DEFAULT_LEVELS = (
+    ("Newbie", 0, 0, 0),
+    ("Novice", 1, 0, 0),
+    ("Beginner", 5, 10000, 0),
+    ("Regular", 10, 25000, 2),
+    ("Committed", 25, 75000, 3),
+    ("Dedicated", 50, 150000, 5),
+    ("Athlete", 75, 300000, 7),
+    ("Strong", 100, 500000, 10),
+    ("Advanced", 150, 1000000, 14),
+    ("Elite", 250, 2000000, 21),
+    ("Champion", 400, 4000000, 30),
+    ("Legend", 600, 7500000, 45),
+)
+DEFAULT_STREAK_GAP_DAYS = 2
+
+def levels():
+    """Returns the configured levels, lowest first, numbered from 1."""
+
+    return [
+        Level(number, name, completed, Decimal(volume), streak)
+        for number, (name, completed, volume, streak) in enumerate(getattr(settings, "PROGRESSION_LEVELS", DEFAULT_LEVELS), 1)
+    ]
+
+def streak_gap_days():
+    """Most days allowed between two completed workouts of the same streak."""
+
+    return getattr(settings, "PROGRESSION_STREAK_GAP_DAYS", DEFAULT_STREAK_GAP_DAYS)
+
+def level_for(completed, volume, best_streak):
+    """Returns the highest `Level` whose every threshold is met."""
+
+    all_levels = levels()
+    reached = all_levels[0] # Everyone starts at the first level
+    for level in all_levels[1:]:
+        if completed < level.completed or Decimal(volume) < level.volume or best_streak < level.streak:
+            break
+        reached = level
+    return reached
+
+def next_streak(current, last_completed_on, completed_on):
+    """
+    Returns the current streak after a workout is completed on `completed_on` (a date).
+
+    Parameters:
+    - `current` - Current streak.
+    - `last_completed_on` - Date of the previous completed workout (None if there was none).
+    - `completed_on` - Date of this one.
+    """
+
+    if last_completed_on is None or current == 0:
+        return 1
+    if completed_on <= last_completed_on:
+        # Same day (or a clock that went backwards) doesn't extend or break the streak:
+        return current
+    if (completed_on - last_completed_on).days <= streak_gap_days():
+        return current + 1
+    return 1
+
+def streaks(dates):
+    """
+    Replays a history of completion dates (ascending) and returns `(current, best, last_completed_on)`.
+
+    Used by the backfill, which has the history in hand; live updates go through `next_streak()`.
+    """
+
+    current = best = 0
+    last = None
+    for completed_on in dates:
+        current = next_streak(current, last, completed_on)
+        best = max(best, current)
+        last = max(last, completed_on) if last else completed_on
+    return current, best, last
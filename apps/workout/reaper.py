@@ -0,0 +1,143 @@
+"""Background deletion of soft deleted workouts and accounts.
+
+Deleting a workout (or an account) used to delete every row under it in the
+request: Django collects and deletes each related `Exercise` (and, for an
+account, every workout) in one transaction, holding SQLite's only write lock
+for as long as that takes. Now `WorkoutManager.remove()` and
+`UserManager.remove()` just set `deleted_at` (the default managers hide those
+rows straight away) and wake the reaper.
+
+The reaper (`reap()`) deletes what's hidden, children first, `REAPER_BATCH_SIZE`
+rows per short transaction, sleeping `REAPER_PAUSE` seconds between batches so
+other writers get the database in between:
+
+1. workouts of deleted accounts that aren't hidden yet (e.g. created by a
+   request that was still running) are hidden,
+2. hidden workouts are dropped from the search index, then their sets are
+   deleted, then the workouts themselves,
+3. deleted accounts with no workouts left are deleted (with their stats and
+   import jobs, a row or two each).
+
+It runs on a background thread `REAPER_DELAY` seconds after a delete commits
+(set `REAPER_DELAY = None` to leave it to `manage.py reap_deleted --interval`
+instead), and is safe to run from several processes at once: every batch only
+deletes what is still there.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from . import logs
+from .database import retry_on_lock
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+@retry_on_lock
+def _hide(queryset):
+    return queryset.update(deleted_at=timezone.now())
+
+@retry_on_lock
+def _delete(queryset):
+    """Deletes a (small) queryset in a transaction of its own; returns how many rows went."""
+
+    return queryset.delete()[1].get(queryset.model._meta.label, 0)
+
+def reap(batch_size=None, pause=None):
+    """
+    Deletes hidden workouts (sets first) and accounts, `REAPER_BATCH_SIZE` rows per transaction.
+
+    Returns a dict of how many `users`, `workouts` and `exercises` were deleted.
+    """
+
+    # Imported here as `models` imports this module:
+    from . import search
+    from .models import Exercise, User, Workout
+
+    batch_size = batch_size or _setting("REAPER_BATCH_SIZE", 500)
+    pause = _setting("REAPER_PAUSE", 0.05) if pause is None else pause
+    deleted = {"users": 0, "workouts": 0, "exercises": 0}
+
+    def rest():
+        if pause:
+            time.sleep(pause)
+
+    # 1. Workouts that a deleted user's last requests added after `UserManager.remove()`:
+    _hide(Workout.all_objects.filter(user__deleted_at__isnull=False, deleted_at__isnull=True))
+
+    # 2. Hidden workouts, a batch at a time (through the `deleted_at` index):
+    while True:
+        workout_ids = list(Workout.all_objects.filter(deleted_at__isnull=False).order_by("id").values_list("id", flat=True)[:batch_size])
+        if not workout_ids:
+            break
+        # Out of the search index first, so deleting their sets doesn't rebuild each one's list of names per set:
+        retry_on_lock(search.forget)(workout_ids)
+        while True:
+            exercise_ids = list(Exercise.all_objects.filter(workout__id__in=workout_ids).values_list("id", flat=True)[:batch_size])
+            if not exercise_ids:
+                break
+            deleted["exercises"] += _delete(Exercise.all_objects.filter(id__in=exercise_ids))
+            rest()
+        # (Any set added since is deleted along with its workout.)
+        deleted["workouts"] += _delete(Workout.all_objects.filter(id__in=workout_ids, deleted_at__isnull=False))
+        rest()
+
+    # 3. Deleted accounts, once nothing of theirs is left:
+    while True:
+        user_ids = list(User.all_objects.filter(deleted_at__isnull=False, workout__isnull=True).values_list("id", flat=True)[:batch_size])
+        if not user_ids:
+            break
+        deleted["users"] += _delete(User.all_objects.filter(id__in=user_ids))
+        if len(user_ids) < batch_size:
+            break
+        rest()
+
+    if any(deleted.values()):
+        logs.event("reaper.reaped", **deleted)
+    return deleted
+
+class Reaper(object):
+    """The background thread running `reap()`, started on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def wake(self):
+        """Has the thread reap in `REAPER_DELAY` seconds (does nothing with `REAPER_DELAY = None`)."""
+
+        if _setting("REAPER_DELAY", 1.0) is None:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Started on first use (and again after a fork: threads don't survive into the child):
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="reaper", daemon=True).start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # Let a burst of deletes gather into the same pass:
+            time.sleep(_setting("REAPER_DELAY", 1.0) or 0)
+            self._wake.clear()
+            try:
+                reap()
+            except DatabaseError as error:
+                # Whatever is left is still hidden; the next delete (or `manage.py reap_deleted`) picks it up:
+                logs.event("reaper.failed", level=logging.ERROR, error=str(error))
+            finally:
+                connection.close()
+
+reaper = Reaper()
+
+def wake():
+    """Wakes the background reaper (on commit of `WorkoutManager.remove()` / `UserManager.remove()`)."""
+
+    reaper.wake()
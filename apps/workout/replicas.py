@@ -0,0 +1,40 @@
+"""Local SQLite read replicas.
+
+A replica is a copy of the primary's database file, refreshed with SQLite's
+online backup API (`manage.py sync_replicas --interval N` keeps them fresh).
+The backup copies a consistent snapshot while the primary stays in use; readers
+of the replica wait (up to their busy timeout) while it is being replaced.
+
+Replicas lag the primary by up to the sync interval, which is why
+`REPLICA_PIN_SECONDS` should be longer than it (see `routers.py`).
+"""
+import sqlite3
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PAGES_PER_STEP = 1024 # Pages copied between pauses (so the primary's writers aren't held up for a whole copy)
+
+def copy(source, destination, pages=PAGES_PER_STEP, timeout=5.0):
+    """
+    Copies the SQLite database at path `source` to path `destination` (created if missing) as a consistent snapshot.
+
+    Returns the seconds the copy took.
+    """
+
+    started = time.perf_counter()
+    primary = sqlite3.connect(source, timeout=timeout)
+    try:
+        replica = sqlite3.connect(destination, timeout=timeout)
+        try:
+            primary.backup(replica, pages=pages)
+        finally:
+            replica.close()
+    finally:
+        primary.close()
+    return time.perf_counter() - started
+
+def sync(alias):
+    """Refreshes replica `alias` from the primary (`default`); returns the seconds it took."""
+
+    return copy(str(connections.settings[DEFAULT_DB_ALIAS]["NAME"]), str(connections.settings[alias]["NAME"]))
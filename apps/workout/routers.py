@@ -0,0 +1,80 @@
+"""Primary / replica database routing.
+
+Writes always go to `default` (the primary). Reads go to one of
+`DATABASE_REPLICAS` (picked at random), but only:
+
+- during a GET or HEAD request (`ReplicaRoutingMiddleware` turns routing on;
+  management commands and other code that reads before it writes keep using
+  the primary),
+- when the request hasn't written anything yet, and isn't in a transaction,
+- when the user hasn't written anything in the last `REPLICA_PIN_SECONDS`
+  (the middleware sets a short lived cookie after a write), so people always
+  see their own changes even though replicas lag behind, and
+- once the replica has been copied at least once (see `replicas.py`).
+"""
+import os
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = "primary_until"
+
+class RoutingState(object):
+    """Whether the current request may read from replicas, and whether it has written."""
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+# The request being routed in this thread (or task):
+_current = ContextVar("workout_routing_state", default=None)
+
+def start(use_replicas):
+    """Starts routing a request; returns `(state, token)`, pass the token to `finish()`."""
+
+    state = RoutingState(use_replicas)
+    return state, _current.set(state)
+
+def finish(token):
+    _current.reset(token)
+
+_ready = {} # alias -> (ready, checked at)
+
+def replica_ready(alias):
+    """Whether a replica's database file has been copied (checked every few seconds, per process)."""
+
+    now = time.monotonic()
+    ready, checked = _ready.get(alias, (False, None))
+    if checked is None or now - checked > 5:
+        name = str(connections.settings[alias]["NAME"])
+        ready = os.path.isfile(name) and os.path.getsize(name) > 0
+        _ready[alias] = (ready, now)
+    return ready
+
+class PrimaryReplicaRouter(object):
+    """Sends writes to the primary and, where it is safe (see above), reads to a replica."""
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or not state.use_replicas or state.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in getattr(settings, "DATABASE_REPLICAS", []) if replica_ready(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            # Read your own writes for the rest of this request (and, through the cookie, the next few seconds):
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data:
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their tables by being copied from the primary:
+        return db == DEFAULT_DB_ALIAS
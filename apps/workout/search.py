@@ -0,0 +1,95 @@
+"""Workout search.
+
+On SQLite builds with FTS5, workouts are searched through the `workout_search`
+full text index (one row per workout: its name, description and exercise
+names), which triggers keep in sync with `workout_workout` and
+`workout_exercise` no matter how rows are written (manager methods,
+`bulk_create`, the importer, raw SQL). Results are ranked with `bm25()`, name
+matches counting most, and every word is matched as a prefix ("ben pre" finds
+"Bench Press").
+
+Anywhere else (another database, or SQLite without FTS5) the same search runs
+as `LIKE` queries instead: slower on big histories, but the same results
+(ranked more simply).
+
+The index and its triggers are created by migration 0015_workout_search (only
+where FTS5 is available).
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+
+from .models import Workout
+
+TABLE = "workout_search"
+DEFAULT_LIMIT = 20
+MAX_WORDS = 8 # Words of a query that are used (the rest are ignored)
+
+# bm25() column weights: name, description, exercise names.
+WEIGHTS = (10.0, 5.0, 2.0)
+
+_enabled = None
+
+def fts5_enabled():
+    """Whether the `workout_search` index exists on the default database (i.e. the migration could create it)."""
+
+    global _enabled
+    if _enabled is None:
+        # Checked once per process; the table only comes and goes with migrations:
+        _enabled = connection.vendor == "sqlite" and TABLE in connection.introspection.table_names()
+    return _enabled
+
+def words(query):
+    """Splits a search into lowercase words (letters and numbers only)."""
+
+    return re.findall(r"\w+", query.lower())[:MAX_WORDS]
+
+def search_workouts(user_id, query, limit=DEFAULT_LIMIT):
+    """
+    Returns a user's best matching workouts for `query` (a list of `Workout`s, best first).
+
+    Parameters:
+    - `user_id` - Id of the `User` whose workouts are searched.
+    - `query` - What the user typed; every word must match (as a word prefix) the name, description or an exercise.
+    - `limit` - Most workouts to return.
+    """
+
+    terms = words(query)
+    if not terms:
+        return []
+    if fts5_enabled():
+        return _fts5_search(user_id, terms, limit)
+    return _like_search(user_id, terms, limit)
+
+def _fts5_search(user_id, terms, limit):
+    # Quote every word (so nothing in it is read as FTS5 syntax) and match it as a prefix:
+    match = " ".join('"%s"*' % term.replace('"', '""') for term in terms)
+    return list(Workout.objects.raw(
+        "SELECT w.* FROM workout_search s JOIN workout_workout w ON w.id = s.rowid"
+        " WHERE workout_search MATCH %s AND w.user_id = %s AND w.deleted_at IS NULL"
+        " ORDER BY bm25(workout_search, " + ", ".join(str(weight) for weight in WEIGHTS) + "), w.id DESC"
+        " LIMIT %s",
+        [match, user_id, limit],
+    ))
+
+def forget(workout_ids):
+    """Drops workouts from the index ahead of the triggers (the reaper does this before deleting their sets)."""
+
+    if not workout_ids or not fts5_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM " + TABLE + " WHERE rowid IN (" + ", ".join(["%s"] * len(workout_ids)) + ")", list(workout_ids))
+
+def _like_search(user_id, terms, limit):
+    workouts = Workout.objects.filter(user__id=user_id)
+    for term in terms:
+        workouts = workouts.filter(Q(name__icontains=term) | Q(description__icontains=term) | Q(exercise__name__icontains=term))
+    # Rank: name starts with the first word, name contains it, anything else; newest first within each:
+    rank = Case(
+        When(name__istartswith=terms[0], then=0),
+        When(name__icontains=terms[0], then=1),
+        default=2,
+        output_field=IntegerField(),
+    )
+    return list(workouts.annotate(rank=rank).distinct().order_by("rank", "-id")[:limit])
@@ -0,0 +1,214 @@
+"""Database sessions with an in-process cache and write-behind (`SESSION_ENGINE = "apps.workout.sessions"`).
+
+Django's database engine reads the session table on every request and writes
+it whenever a session changes. This engine keeps recently used sessions in a
+per-process LRU (`SESSION_CACHE_SIZE`), so a logged in user's requests
+normally skip the session query, and queues changes to existing sessions for a
+background thread that writes them in one batch every
+`SESSION_WRITE_BEHIND_DELAY` seconds.
+
+New sessions are still written immediately (their key must be unique), and so
+are deletes and any change to who is logged in (`AUTH_KEYS`). Logging in and
+out also change the session key (`cycle_key()` / `flush()` in the views), so
+the browser's next request can't be answered from another process's cached
+copy of the old session. Cached sessions are reloaded after
+`SESSION_CACHE_TTL` seconds, which bounds how long another process can keep
+using a session that was changed or deleted elsewhere.
+
+Expired sessions are cleared in batches (see `SessionStore.clear_expired()`,
+run by `manage.py clearsessions`) rather than with one full table delete.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.sessions.backends import db
+from django.db import DatabaseError, router, transaction
+from django.utils import timezone
+
+from . import logs
+from .database import retry_on_lock
+
+# Session keys that say who is logged in; changing them skips the write-behind queue:
+AUTH_KEYS = ("user_id",)
+
+class SessionCache(object):
+    """Thread safe LRU of `(session_data, expire_date)` by session key; entries are dropped after `ttl` seconds."""
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_key):
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                del self._entries[session_key]
+                return None
+            self._entries.move_to_end(session_key)
+            return entry[0], entry[1]
+
+    def set(self, session_key, session_data, expire_date):
+        with self._lock:
+            self._entries[session_key] = (session_data, expire_date, time.monotonic() + self.ttl)
+            self._entries.move_to_end(session_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, session_key):
+        with self._lock:
+            self._entries.pop(session_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class WriteBehind(object):
+    """Changed sessions waiting to be written, latest copy per key, and the thread that writes them."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def add(self, session):
+        """Queues a `Session` row to be saved; with `SESSION_WRITE_BEHIND_DELAY` 0 (or in a transaction) it is saved right away."""
+
+        # Inside a transaction the write has to be part of it (the background thread can't see it, or roll it back):
+        if _setting("SESSION_WRITE_BEHIND_DELAY", 1.0) <= 0 or transaction.get_connection(router.db_for_write(type(session))).in_atomic_block:
+            self._write([session])
+            return
+        with self._lock:
+            self._pending[session.session_key] = session
+            if self._pid != os.getpid():
+                # Started on first use (and again after a fork: threads don't survive into the child):
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="session-write-behind", daemon=True).start()
+
+    def discard(self, session_key):
+        with self._lock:
+            self._pending.pop(session_key, None)
+
+    def flush(self):
+        """Writes every queued session now."""
+
+        with self._lock:
+            sessions, self._pending = list(self._pending.values()), {}
+        if sessions:
+            self._write(sessions)
+
+    def _write(self, sessions):
+        try:
+            _save_sessions(sessions)
+        except DatabaseError as error:
+            logs.event("sessions.write_failed", level=logging.ERROR, sessions=len(sessions), error=str(error))
+
+    def _run(self):
+        while True:
+            self._wake.wait(_setting("SESSION_WRITE_BEHIND_DELAY", 1.0))
+            self.flush()
+
+@retry_on_lock
+def _save_sessions(sessions):
+    model = db.SessionStore.get_model_class()
+    # Rows deleted in the meantime (logged out, expired) are simply not updated:
+    model.objects.using(router.db_for_write(model)).bulk_update(sessions, ["session_data", "expire_date"], batch_size=500)
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def _auth(data):
+    return tuple(data.get(key) for key in AUTH_KEYS)
+
+session_cache = SessionCache(
+    maxsize=_setting("SESSION_CACHE_SIZE", 10000),
+    ttl=_setting("SESSION_CACHE_TTL", 60),
+)
+pending_writes = WriteBehind()
+# Don't lose queued changes on a clean shutdown:
+atexit.register(pending_writes.flush)
+
+class SessionStore(db.SessionStore):
+    """Django's database `SessionStore`, reading through `session_cache` and writing changes through `pending_writes`."""
+
+    def load(self):
+        data = self._load()
+        # Remembered so `save()` can tell whether who is logged in changed:
+        self._loaded_auth = _auth(data)
+        return data
+
+    def _load(self):
+        if self.session_key is not None:
+            entry = session_cache.get(self.session_key)
+            if entry is not None and entry[1] > timezone.now():
+                return self.decode(entry[0])
+
+        session = self._get_session_from_db()
+        if session is None:
+            return {}
+        session_cache.set(session.session_key, session.session_data, session.expire_date)
+        return self.decode(session.session_data)
+
+    def exists(self, session_key):
+        return session_cache.get(session_key) is not None or super().exists(session_key)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if must_create:
+            # New sessions are written now (`create()` relies on the insert failing for a duplicate key):
+            retry_on_lock(super().save)(must_create=True)
+            session_cache.set(self.session_key, self.encode(self._get_session(no_load=True)), self.get_expiry_date())
+            self._loaded_auth = _auth(self._get_session(no_load=True))
+            return
+
+        data = self._get_session()
+        session = self.create_model_instance(data)
+        session_cache.set(session.session_key, session.session_data, session.expire_date)
+        if _auth(data) != getattr(self, "_loaded_auth", None):
+            # Logging in or out must reach the database now, not in a second:
+            pending_writes.discard(session.session_key)
+            _save_sessions([session])
+            self._loaded_auth = _auth(data)
+            return
+        pending_writes.add(session)
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        if session_key is None:
+            return
+        session_cache.invalidate(session_key)
+        pending_writes.discard(session_key)
+        super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls, batch_size=None, pause=None):
+        """
+        Deletes expired sessions `SESSION_CLEANUP_BATCH_SIZE` rows at a time, sleeping `SESSION_CLEANUP_PAUSE`
+        seconds between batches so other writers get the database in between.
+
+        Returns how many sessions were deleted.
+        """
+
+        model = cls.get_model_class()
+        batch_size = batch_size or _setting("SESSION_CLEANUP_BATCH_SIZE", 1000)
+        pause = _setting("SESSION_CLEANUP_PAUSE", 0.05) if pause is None else pause
+        deleted = 0
+        while True:
+            # Keys first (through the `expire_date` index), then delete by primary key:
+            keys = list(model.objects.filter(expire_date__lt=timezone.now()).values_list("session_key", flat=True)[:batch_size])
+            if keys:
+                with transaction.atomic(using=router.db_for_write(model)):
+                    deleted += model.objects.filter(session_key__in=keys).delete()[0]
+            if len(keys) < batch_size:
+                return deleted
+            time.sleep(pause)
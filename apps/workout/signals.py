@@ -0,0 +1,21 @@
+"""workout app signal receivers (connected in `WorkoutConfig.ready()`)."""
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import database
+from .middleware import user_cache
+from .models import User
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drops a saved or deleted `User` from the per-request user cache."""
+
+    user_cache.invalidate(instance.id)
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    """Tunes each new database connection (see `database.configure_connection()`)."""
+
+    database.configure_connection(connection)
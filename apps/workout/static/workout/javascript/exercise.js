@@ -15,4 +15,19 @@ $( document ).ready(function() {
     return confirm("Are you sure you want to delete this workout? This cannot be undone.");
   });
 
+  // Suggest exercise names already used, most used first (see /api/exercise-names):
+  var suggestTimer = null;
+  $( '#name' ).on('input', function() {
+    var prefix = $( this ).val();
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(function() {
+      $.getJSON('/api/exercise-names', { prefix: prefix }, function(data) {
+        var list = $( '#exercise-names' ).empty();
+        $.each(data.names, function(index, name) {
+          list.append($( '<option>' ).attr('value', name));
+        });
+      });
+    }, 100);
+  });
+
 });
@@ -1,3 +1,967 @@
-from django.test import TestCase
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import benchmark, database, hashing, logs, metrics, progression, reaper, replicas, routers, validation
+from .assets import StaticFilesApplication, compress
+from .autocomplete import NameIndex, name_index
+from .charts import lttb
+from . import search
+from .middleware import ReplicaRoutingMiddleware, user_cache
+from .pagination import keyset_page
+from .sessions import SessionCache, SessionStore, pending_writes, session_cache
+from .importer import import_history
+from .models import User, Workout, Exercise, UserStats, ImportJob
+
+# Keep bcrypt cheap and inline for tests:
+FAST_HASHING = dict(BCRYPT_ROUNDS=4, HASHING_POOL_WORKERS=0, HASHING_MAX_PENDING=4, HASHING_TIMEOUT=5)
+
+def new_user(username="lifter"):
+    """Creates a `User` (without a password) named `username`."""
+
+    return User.objects.create(username=username, email="%s@example.com" % username)
+
+def log_in(client, user):
+    """Logs `user` in on a test `client`, through its session (and forgets any cached `User`s)."""
+
+    user_cache.clear()
+    session = client.session
+    session["user_id"] = user.id
+    session.save()
+
+def registration(username="lifter", email="lifter@example.com", password="password123"):
+    """Builds `register()` kwargs shaped like `request.POST` lists."""
+
+    return {
+        "username": [username],
+        "email": [email],
+        "password": [password],
+        "password_confirmation": [password],
+        "tos_accept": ["on"],
+    }
+
+@override_settings(**FAST_HASHING)
+class HashingTests(TestCase):
+
+    def setUp(self):
+        hashing.shutdown()
+        self.addCleanup(hashing.shutdown)
+
+    def test_hash_and_check(self):
+        hashed = hashing.hash_password("password123")
+        self.assertEqual(hashing.hash_rounds(hashed), 4)
+        self.assertTrue(hashing.check_password("password123", hashed))
+        self.assertFalse(hashing.check_password("wrong", hashed))
+
+    @override_settings(HASHING_POOL_WORKERS=1)
+    def test_process_pool(self):
+        hashed = hashing.hash_password("password123")
+        self.assertTrue(hashing.check_password("password123", hashed))
+
+    def test_busy_when_no_slots(self):
+        _, slots = hashing._pool()
+        for _ in range(FAST_HASHING["HASHING_MAX_PENDING"]):
+            slots.acquire()
+        with self.assertRaises(hashing.HashingBusy):
+            hashing.hash_password("password123")
+
+    def test_login_rehashes_on_cost_change(self):
+        user = User.objects.register(**registration())["logged_in_user"]
+        with self.settings(BCRYPT_ROUNDS=5):
+            validated = User.objects.login(username=["lifter"], password=["password123"])
+        self.assertEqual(validated["logged_in_user"].id, user.id)
+        user.refresh_from_db()
+        self.assertEqual(hashing.hash_rounds(user.password), 5)
+        with self.assertLogs("apps.workout", "WARNING") as logged:
+            self.assertIn("errors", User.objects.login(username=["lifter"], password=["nope"]))
+        self.assertEqual([record.event for record in logged.records], ["login.failed"])
+
+@override_settings(**FAST_HASHING)
+class WorkoutUserMiddlewareTests(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        self.user = User.objects.register(**registration())["logged_in_user"]
+
+    def test_redirects_without_session(self):
+        response = self.client.get("/dashboard")
+        self.assertRedirects(response, "/", fetch_redirect_response=False)
+
+    def test_cached_user_skips_lookup(self):
+        log_in(self.client, self.user)
+        self.client.get("/dashboard")
+        # Stats only; the session, the `User` and the recent workouts fragment come from the caches:
+        with self.assertNumQueries(1):
+            response = self.client.get("/dashboard")
+        self.assertEqual(response.context["user"].id, self.user.id)
+
+    def test_save_invalidates_cache(self):
+        log_in(self.client, self.user)
+        self.client.get("/dashboard")
+        self.user.level_name = "Novice"
+        self.user.save()
+        response = self.client.get("/dashboard")
+        self.assertEqual(response.context["user"].level_name, "Novice")
+
+@override_settings(**FAST_HASHING)
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.clear()
+        self.user = new_user()
+        log_in(self.client, self.user)
+
+    def test_server_timing_header(self):
+        timing = self.client.get("/dashboard")["Server-Timing"]
+        self.assertIn('db;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+        self.assertNotIn('hash;', timing)
+
+        User.objects.register(**registration(username="bencher", email="bencher@example.com"))
+        response = self.client.post("/user/login", {"username": "bencher", "password": "password123"})
+        self.assertIn('hash;dur=', response["Server-Timing"])
+
+    def test_histograms_exposed_per_view(self):
+        self.client.get("/dashboard")
+        self.client.get("/dashboard")
+        self.client.get("/no-such-page")
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('workout_request_duration_seconds_count{view="apps.workout.views.dashboard"} 2', body)
+        self.assertIn('workout_request_duration_seconds_bucket{view="apps.workout.views.dashboard",le="+Inf"} 2', body)
+        self.assertIn('workout_db_queries_count{view="unresolved"} 1', body)
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.9").status_code, 403)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe("a", value)
+        self.assertEqual(histogram.samples(), [("a", [2, 3, 4], 4, 3.65)])
+
+class LogsTests(TestCase):
+
+    def test_events_are_sampled_below_warning(self):
+        with self.assertLogs("apps.workout") as logged, override_settings(LOG_SAMPLING={"test.sampled": 0}):
+            logs.event("test.kept", workout_id=1)
+            logs.event("test.sampled")
+            logs.event("test.sampled", level=logging.WARNING)
+        self.assertEqual([(record.event, record.levelname) for record in logged.records], [("test.kept", "INFO"), ("test.sampled", "WARNING")])
+        self.assertEqual(logged.records[0].fields, {"workout_id": 1})
+
+    def test_full_queue_drops_and_reports(self):
+        stream = StringIO()
+        handler = logs.BackgroundHandler(maxsize=2, stream=stream)
+        handler.setFormatter(logs.JsonFormatter())
+        self.addCleanup(handler.close)
+        handler._pid = os.getpid() # Pretend the writer thread is running (but stalled)
+        record = lambda: logging.makeLogRecord({"name": "apps.workout", "levelno": logging.INFO, "levelname": "INFO", "msg": "test", "event": "test.event", "fields": {"n": 1}})
+        for _ in range(4):
+            handler.handle(record())
+        self.assertEqual(handler.dropped, 2)
+
+        handler.queue.get_nowait()
+        handler.queue.get_nowait()
+        handler._pid = None
+        handler.handle(record())
+        handler.flush()
+        line = json.loads(stream.getvalue())
+        self.assertEqual((line["event"], line["n"], line["dropped"]), ("test.event", 1, 2))
+        self.assertEqual(handler.dropped, 0)
+
+class SessionTests(TestCase):
+
+    def setUp(self):
+        session_cache.clear()
+        self.store = SessionStore()
+        self.store["user_id"] = 1
+        self.store.create()
+
+    def test_cached_session_skips_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(self.store.session_key)["user_id"], 1)
+        session_cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(SessionStore(self.store.session_key)["user_id"], 1)
+
+    def test_delete_is_immediate(self):
+        self.store.delete()
+        self.assertFalse(SessionStore().exists(self.store.session_key))
+        self.assertEqual(SessionStore(self.store.session_key).get("user_id"), None)
+
+    def test_clear_expired_in_batches(self):
+        for key, days in (("a", 0), ("b", 1), ("c", 1)):
+            Session.objects.create(session_key=key * 32, session_data="", expire_date=timezone.now() - datetime.timedelta(days=days))
+        self.assertEqual(SessionStore.clear_expired(batch_size=2, pause=0), 3)
+        self.assertTrue(Session.objects.filter(session_key=self.store.session_key).exists())
+
+@override_settings(SESSION_WRITE_BEHIND_DELAY=60)
+class SessionWriteBehindTests(TransactionTestCase):
+
+    def setUp(self):
+        # Nothing may be left queued for after the test database is gone:
+        self.addCleanup(pending_writes.flush)
+
+    def stored(self, session_key):
+        return SessionStore().decode(Session.objects.get(session_key=session_key).session_data)
+
+    def test_changes_are_written_behind(self):
+        store = SessionStore()
+        store["user_id"] = 1
+        store["theme"] = "light"
+        store.create()
+        store["theme"] = "dark"
+        store.save()
+        # Served from the cache straight away, written when the queue is flushed:
+        self.assertEqual(SessionStore(store.session_key)["theme"], "dark")
+        self.assertEqual(self.stored(store.session_key)["theme"], "light")
+        pending_writes.flush()
+        self.assertEqual(self.stored(store.session_key)["theme"], "dark")
+
+    def test_auth_changes_are_written_now(self):
+        store = SessionStore()
+        store["user_id"] = 1
+        store.create()
+        store = SessionStore(store.session_key)
+        del store["user_id"]
+        store.save()
+        self.assertNotIn("user_id", self.stored(store.session_key))
+
+    @override_settings(**FAST_HASHING)
+    def test_logout_and_login_reach_other_processes(self):
+        user = User.objects.register(**registration())["logged_in_user"]
+        other_process = SessionCache()
+
+        def dashboard_elsewhere():
+            # Another worker process: its own session cache (and user cache):
+            with mock.patch("apps.workout.sessions.session_cache", other_process):
+                user_cache.clear()
+                return self.client.get("/dashboard").status_code
+
+        self.client.post("/user/login", {"username": "lifter", "password": "password123"})
+        self.assertEqual(dashboard_elsewhere(), 200)
+        self.client.get("/user/logout")
+        self.assertEqual(dashboard_elsewhere(), 302)
+        self.client.post("/user/login", {"username": "lifter", "password": "password123"})
+        self.assertEqual(dashboard_elsewhere(), 200)
+        self.assertEqual(user.id, self.client.session["user_id"])
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = new_user()
+        self.workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        session = SessionStore()
+        session["user_id"] = self.user.id
+        session.create()
+        self.async_client = AsyncClient()
+        self.async_client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    async def test_read_views_through_asgi(self):
+        self.assertEqual((await self.async_client.get("/legal/tos")).status_code, 200)
+        for path in ("/dashboard", "/workout/%d" % self.workout.id, "/workouts"):
+            response = await self.async_client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+            # Queries run in `sync_to_async()` threads are still timed:
+            self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertContains(await self.async_client.get("/workouts"), "Push")
+
+    async def test_logged_out_redirects(self):
+        await sync_to_async(SessionStore(self.async_client.cookies[settings.SESSION_COOKIE_NAME].value).delete)()
+        response = await self.async_client.get("/dashboard")
+        self.assertRedirects(response, "/", fetch_redirect_response=False)
+
+class DatabaseTests(TransactionTestCase):
+
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            for pragma, expected in (("synchronous", 1), ("temp_store", 2), ("busy_timeout", 5000)):
+                cursor.execute("PRAGMA %s" % pragma)
+                self.assertEqual(cursor.fetchone()[0], expected, pragma)
+
+    @override_settings(SQLITE_WRITE_RETRIES=2, SQLITE_RETRY_BACKOFF=0)
+    def test_retries_lock_errors_only(self):
+        calls = []
+
+        @database.retry_on_lock
+        def write(failures, message="database is locked"):
+            calls.append(connection.in_atomic_block)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return "written"
+
+        with self.assertLogs("apps.workout", "WARNING") as logged:
+            self.assertEqual(write(2), "written")
+        self.assertEqual(calls, [True, True, True]) # each attempt in its own transaction
+        self.assertEqual([record.event for record in logged.records], ["database.locked"] * 2)
+        calls.clear()
+        with self.assertRaises(OperationalError), self.assertLogs("apps.workout", "WARNING"):
+            write(3)
+        self.assertEqual(len(calls), 3)
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            write(1, "no such table: nope")
+        self.assertEqual(len(calls), 1)
+
+class ReplicaRoutingTests(TestCase):
+
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        routers._ready["replica"] = (True, time.monotonic() + 3600)
+        self.addCleanup(routers._ready.clear)
+
+    def test_reads_use_replica_until_request_writes(self):
+        self.assertEqual(self.router.db_for_read(Workout), "default") # outside a request
+        state, token = routers.start(use_replicas=True)
+        self.addCleanup(routers.finish, token)
+        self.assertEqual(self.router.db_for_read(Workout), "default") # in a transaction (the test's)
+        with mock.patch.object(connection, "in_atomic_block", False):
+            self.assertEqual(self.router.db_for_read(Workout), "replica")
+            self.assertEqual(self.router.db_for_write(Workout), "default")
+            self.assertEqual(self.router.db_for_read(Workout), "default")
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        user = new_user()
+        log_in(self.client, user)
+        self.assertNotIn(routers.PIN_COOKIE, self.client.get("/legal/tos").cookies)
+        response = self.client.post("/workout", {"name": "Push", "description": "Bench"})
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]["max-age"], 10)
+
+        state, token = ReplicaRoutingMiddleware(lambda request: None)._start(self.client.get("/legal/tos").wsgi_request)
+        routers.finish(token)
+        self.assertFalse(state.use_replicas)
+
+    def test_copy_snapshot(self):
+        with tempfile.TemporaryDirectory() as root:
+            primary = os.path.join(root, "primary.sqlite3")
+            with closing(sqlite3.connect(primary)) as db:
+                db.execute("CREATE TABLE t (n INTEGER)")
+                db.executemany("INSERT INTO t VALUES (?)", [(n,) for n in range(1000)])
+                db.commit()
+            replica = os.path.join(root, "replica.sqlite3")
+            replicas.copy(primary, replica, pages=2)
+            with closing(sqlite3.connect(replica)) as db:
+                self.assertEqual(db.execute("SELECT COUNT(*) FROM t").fetchone()[0], 1000)
+
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = new_user()
+        self.workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        log_in(self.client, self.user)
+
+    def test_dashboard_workouts_refresh_after_writes(self):
+        self.client.get("/dashboard")
+        Workout.objects.update(name="Push Day", description="Bench", workout_id=self.workout.id)
+        self.assertContains(self.client.get("/dashboard"), "Push Day")
+        Workout.objects.new(name="Pull", description="Rows", user=self.user)
+        self.assertContains(self.client.get("/dashboard"), "Pull")
+        Workout.objects.remove(workout_id=self.workout.id)
+        self.assertNotContains(self.client.get("/dashboard"), "Push Day")
+
+    def test_exercise_table_refreshes_after_writes(self):
+        url = "/workout/%d" % self.workout.id
+        self.client.get(url)
+        exercise = Exercise.objects.new(name="Bench Press", weight="135", repetitions="10", workout=self.workout)["exercise"]
+        self.assertContains(self.client.get(url), "Bench Press")
+        # A cache hit skips the exercise query:
+        with self.assertNumQueries(1): # workout (the session and user are cached too)
+            self.client.get(url)
+        Workout.objects.complete(workout_id=self.workout.id)
+        self.assertNotContains(self.client.get(url), "delete-exercise-form")
+        Exercise.objects.remove(exercise_id=exercise.id)
+        self.assertNotContains(self.client.get(url), "Bench Press")
+
+class QueryPlanTests(TestCase):
+    """Hot queries must be answered from an index, never a full table scan or a sort."""
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            self.assertNotRegex(line, r"\bSCAN (TABLE )?workout_\w+$", plan)
+            self.assertNotIn("TEMP B-TREE", line, plan)
+
+    def test_hot_queries_use_indexes(self):
+        self.assertUsesIndex(Workout.objects.filter(user__id=1).order_by('-id'))
+        self.assertUsesIndex(Exercise.objects.filter(workout__id=1).order_by('-updated_at'))
+        self.assertUsesIndex(User.objects.filter(username="lifter"))
+        self.assertUsesIndex(User.objects.filter(email="lifter@example.com"))
+
+    def test_detects_full_scan(self):
+        with self.assertRaises(AssertionError):
+            self.assertUsesIndex(Workout.objects.order_by('name'))
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+        Workout.objects.bulk_create([Workout(name="Day %d" % i, description="Legs", user=self.user) for i in range(30)])
+        self.workouts = Workout.objects.filter(user=self.user)
+        self.ids = list(self.workouts.order_by('-id').values_list('id', flat=True))
+
+    def test_walks_forwards_and_back(self):
+        first = keyset_page(self.workouts, per_page=12)
+        self.assertEqual([w.id for w in first], self.ids[:12])
+        self.assertTrue(first.has_next)
+        self.assertFalse(first.has_previous)
+
+        second = keyset_page(self.workouts, before=first.next_cursor, per_page=12)
+        self.assertEqual([w.id for w in second], self.ids[12:24])
+        self.assertTrue(second.has_previous)
+
+        last = keyset_page(self.workouts, before=second.next_cursor, per_page=12)
+        self.assertEqual([w.id for w in last], self.ids[24:])
+        self.assertFalse(last.has_next)
+
+        back = keyset_page(self.workouts, after=last.previous_cursor, per_page=12)
+        self.assertEqual([w.id for w in back], self.ids[12:24])
+        self.assertTrue(back.has_next)
+        self.assertTrue(back.has_previous)
+
+    def test_no_count_query(self):
+        with self.assertNumQueries(2) as queries:
+            keyset_page(self.workouts, before=self.ids[11], per_page=12)
+        self.assertFalse(any("COUNT" in q["sql"] for q in queries.captured_queries))
+
+    def test_invalid_cursor_loads_first_page(self):
+        page = keyset_page(self.workouts, before="nope", per_page=12)
+        self.assertEqual([w.id for w in page], self.ids[:12])
+
+class UserStatsTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+
+    def new_workout(self):
+        return Workout.objects.new(name="Leg Day", description="Squats", user=self.user)["workout"]
+
+    def new_set(self, workout, weight="100", repetitions="5"):
+        return Exercise.objects.new(name="Squat", weight=weight, repetitions=repetitions, workout=workout)["exercise"]
+
+    def stats(self):
+        return UserStats.objects.get(user=self.user)
+
+    def test_write_paths_apply_deltas(self):
+        workout = self.new_workout()
+        self.new_set(workout)
+        extra = self.new_set(workout, weight="102.5", repetitions="3")
+        Workout.objects.complete(workout_id=workout.id)
+        Workout.objects.complete(workout_id=workout.id)
+        stats = self.stats()
+        self.assertEqual((stats.total_workouts, stats.total_completed, stats.total_sets), (1, 1, 2))
+        self.assertEqual(stats.total_volume, Decimal("807.50"))
+
+        Exercise.objects.remove(exercise_id=extra.id)
+        self.assertEqual(self.stats().total_volume, Decimal("500.00"))
+        self.assertEqual(UserStats.objects.verify(), [])
+
+        Workout.objects.remove(workout_id=workout.id)
+        stats = self.stats()
+        self.assertEqual((stats.total_workouts, stats.total_completed, stats.total_sets, stats.total_volume), (0, 0, 0, 0))
+
+    def test_rebuild_repairs_drift(self):
+        self.new_set(self.new_workout())
+        UserStats.objects.filter(user=self.user).update(total_sets=99)
+        self.assertEqual(len(UserStats.objects.verify()), 1)
+        call_command("rebuild_stats", stdout=StringIO())
+        self.assertEqual(self.stats().total_sets, 1)
+
+class ProgressionTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+
+    def test_completing_a_workout_levels_up(self):
+        workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        Workout.objects.complete(workout_id=workout.id)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.level, self.user.level_name), (2, "Novice"))
+        self.assertEqual(UserStats.objects.get(user=self.user).current_streak, 1)
+
+    def test_streaks(self):
+        day = datetime.date(2026, 1, 1)
+        self.assertEqual(progression.next_streak(0, None, day), 1)
+        self.assertEqual(progression.next_streak(3, day, day), 3)
+        self.assertEqual(progression.next_streak(3, day, day + datetime.timedelta(days=2)), 4)
+        self.assertEqual(progression.next_streak(3, day, day + datetime.timedelta(days=3)), 1)
+        dates = [day + datetime.timedelta(days=offset) for offset in (0, 1, 2, 10, 11)]
+        self.assertEqual(progression.streaks(dates), (2, 3, dates[-1]))
+
+    def test_backfill(self):
+        Workout.objects.new(name="Push", description="Bench", user=self.user)
+        Workout.objects.all().update(completed=True)
+        UserStats.objects.rebuild()
+        call_command("backfill_levels", stdout=StringIO())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.level_name, "Novice")
+        self.assertEqual(UserStats.objects.get(user=self.user).best_streak, 1)
+
+    def test_every_page_shows_the_users_badge(self):
+        workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        User.objects.filter(id=self.user.id).update(level=3, level_name="Beginner")
+        log_in(self.client, self.user)
+        for url in ("/dashboard", "/workouts", "/workout", "/workout/%d" % workout.id, "/workout/%d/edit" % workout.id):
+            response = self.client.get(url)
+            self.assertContains(response, "badges/badge_3.png", msg_prefix=url)
+            self.assertNotContains(response, "badges/badge_1.png", msg_prefix=url)
+            self.assertContains(response, "<p>Beginner</p>", msg_prefix=url)
+            self.assertNotContains(response, "Newbie", msg_prefix=url)
+
+class AutocompleteTests(TestCase):
+
+    def setUp(self):
+        name_index.clear()
+        self.user = new_user()
+        self.workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        for name in ("Bench Press", "Bench Press", "bench press", "Bent Over Row", "Squat"):
+            Exercise.objects.new(name=name, weight="100", repetitions="5", workout=self.workout)
+        log_in(self.client, self.user)
+
+    def test_index(self):
+        index = NameIndex([("Bench Press", 2), ("bench  press", 1), ("Bent Over Row", 1), ("Squat", 4)])
+        self.assertEqual(index.search("be"), ["Bench Press", "Bent Over Row"])
+        index.add("Bent Over Row", 5)
+        self.assertEqual(index.search("BE", limit=1), ["Bent Over Row"])
+        index.add("Squat", -4)
+        self.assertEqual(index.search("s"), [])
+
+    def test_endpoint_answers_from_memory(self):
+        self.client.get("/api/exercise-names?prefix=b")
+        with self.assertNumQueries(0): # the session is cached too
+            response = self.client.get("/api/exercise-names?prefix=BEN")
+        self.assertEqual(response.json()["names"], ["Bench Press", "Bent Over Row"])
+
+    def test_new_sets_update_loaded_index(self):
+        name_index.search(self.user.id, "")
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                Exercise.objects.new(name="Bent Over Row", weight="100", repetitions="5", workout=self.workout)
+        self.assertEqual(name_index.search(self.user.id, "ben", limit=1), ["Bent Over Row"])
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+        self.push = Workout.objects.new(name="Push Day", description="Chest and shoulders", user=self.user)["workout"]
+        self.legs = Workout.objects.new(name="Legs", description="Heavy day", user=self.user)["workout"]
+        Exercise.objects.new(name="Bench Press", weight="135", repetitions="10", workout=self.push)
+        Exercise.objects.new(name="Squat", weight="225", repetitions="5", workout=self.legs)
+        other = new_user("other")
+        Workout.objects.new(name="Push", description="Someone else's", user=other)
+
+    def search(self, query):
+        return [workout.id for workout in search.search_workouts(self.user.id, query)]
+
+    def test_fts5_index_is_used(self):
+        self.assertTrue(search.fts5_enabled())
+
+    def test_prefix_and_exercise_matches(self):
+        self.assertEqual(self.search("ben pre"), [self.push.id])
+        self.assertEqual(self.search("squ"), [self.legs.id])
+        # Name matches rank above description matches:
+        self.assertEqual(self.search("day"), [self.push.id, self.legs.id])
+        self.assertEqual(self.search('"'), [])
+
+    def test_index_follows_writes(self):
+        Workout.objects.update(name="Pull Day", description="Back", workout_id=self.push.id)
+        Exercise.objects.remove(exercise_id=Exercise.objects.get(name="Bench Press").id)
+        self.assertEqual(self.search("bench"), [])
+        self.assertEqual(self.search("pull"), [self.push.id])
+        Workout.objects.remove(workout_id=self.legs.id)
+        self.assertEqual(self.search("squat"), [])
+
+    def test_like_fallback_matches_the_same_workouts(self):
+        for query in ("ben pre", "squ", "day"):
+            self.assertEqual([workout.id for workout in search._like_search(self.user.id, search.words(query), 20)], self.search(query))
+
+    def test_search_page(self):
+        log_in(self.client, self.user)
+        response = self.client.get("/workouts/search?search=bench")
+        self.assertContains(response, "Push Day")
+        self.assertNotContains(response, "Legs")
+
+@override_settings(**FAST_HASHING)
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        call_command("generate_data", users=1, workouts=6, exercises=3, stdout=StringIO())
+        self.user = User.objects.get(username="bench_0")
+
+    def test_generated_history(self):
+        self.assertEqual(Workout.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(Exercise.objects.filter(workout__user=self.user).count(), 18)
+        self.assertEqual(UserStats.objects.get(user=self.user).total_sets, 18)
+
+    def test_every_view_runs_and_is_cleaned_up(self):
+        scenarios = benchmark.scenarios()
+        self.assertEqual(benchmark.uncovered_views(scenarios), [])
+        def state():
+            workout = Workout.objects.filter(user=self.user).order_by("-id").values("name", "description").first()
+            stats = UserStats.objects.filter(user=self.user).values(*UserStats.COUNTERS + UserStats.STREAK).get()
+            return (User.all_objects.count(), Workout.all_objects.count(), Exercise.all_objects.count(), ImportJob.objects.count(), Session.objects.count(), workout, stats)
+        before = state()
+
+        results = benchmark.BenchmarkRun(self.user, "password123", iterations=2, warmup=0).run(scenarios)
+        self.assertEqual(set(results), {scenario.name for scenario in scenarios})
+        for name, result in results.items():
+            self.assertTrue(all(status < 400 for status in result["status"]), name)
+        self.assertEqual(state(), before)
+        self.assertEqual(User.objects.get(id=self.user.id).level, self.user.level)
+
+        slower = {name: dict(result, p95_ms=result["p95_ms"] * 2 + 1) for name, result in results.items()}
+        self.assertEqual(benchmark.compare(results, results), [])
+        self.assertEqual(len(benchmark.compare(slower, results)), len(results))
+
+class ValidationTests(TestCase):
+
+    def test_validate_converts_numbers_without_touching_the_record(self):
+        record = {"name": "Squat", "weight": "225.04", "repetitions": "5"}
+        errors, cleaned = validation.validate(validation.EXERCISE, record)
+        self.assertEqual(errors, [])
+        self.assertEqual((cleaned["weight"], cleaned["repetitions"]), (225.0, 5.0))
+        self.assertEqual(record["weight"], "225.04")
+
+    def test_failed_conversion_leaves_values_alone(self):
+        errors, cleaned = validation.validate(validation.EXERCISE, {"name": "Squat", "weight": "-1", "repetitions": "inf"})
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(cleaned["weight"], "-1")
+
+    def test_validate_many(self):
+        result = validation.validate_many(validation.WORKOUT, [
+            {"name": "Push", "description": "Chest day"},
+            {"name": "", "description": "Chest day"},
+        ])
+        self.assertEqual([index for index, _ in result.valid], [0])
+        self.assertEqual(list(result.errors), [1])
+
+@override_settings(**FAST_HASHING)
+class BatchExerciseTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+        self.workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        log_in(self.client, self.user)
+
+    def test_valid_rows_saved_and_bad_rows_reported(self):
+        sets = [
+            {"name": "Bench Press", "weight": 135, "repetitions": 10},
+            {"name": "Bench Press", "weight": "heavy", "repetitions": 8},
+            {"name": "Bench Press", "weight": "155", "repetitions": "6"},
+        ]
+        with self.assertNumQueries(8): # user, workout, savepoint, insert, workout version, stats update, stats read, release
+            response = self.client.post("/workout/%d/exercises" % self.workout.id, json.dumps({"sets": sets}), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body["created"], [0, 2])
+        self.assertEqual([row["index"] for row in body["errors"]], [1])
+        self.assertEqual(Exercise.objects.filter(workout=self.workout).count(), 2)
+        self.assertEqual(UserStats.objects.get(user=self.user).total_sets, 2)
+
+    def test_form_rows(self):
+        response = self.client.post("/workout/%d/exercises" % self.workout.id, {"name": ["Dip", "Dip"], "weight": ["0", "10"], "repetitions": ["12", "8"]})
+        self.assertEqual(response.json()["created"], [0, 1])
+
+    def test_other_users_workout(self):
+        other = new_user("other")
+        workout = Workout.objects.new(name="Pull", description="Rows", user=other)["workout"]
+        response = self.client.post("/workout/%d/exercises" % workout.id, {"name": ["Row"], "weight": ["50"], "repetitions": ["10"]})
+        self.assertEqual(response.status_code, 404)
+
+class RepeatWorkoutTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+        self.workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        Exercise.objects.new_many(workout=self.workout, sets=[
+            {"name": "Bench Press", "weight": 135, "repetitions": 5},
+            {"name": "Dips", "weight": 25, "repetitions": 12},
+            {"name": "Curl", "weight": "47.5", "repetitions": 10},
+        ])
+        log_in(self.client, self.user)
+
+    def test_copies_sets_with_overload(self):
+        response = self.client.post("/workout/%d/repeat" % self.workout.id, {"overload": "5"})
+        copy = Workout.objects.exclude(id=self.workout.id).get()
+        self.assertRedirects(response, "/workout/%d" % copy.id, fetch_redirect_response=False)
+        self.assertEqual((copy.name, copy.completed), ("Push", False))
+        self.assertEqual(
+            list(Exercise.objects.filter(workout=copy).order_by("id").values_list("name", "weight", "repetitions")),
+            [("Bench Press", Decimal("142.5"), Decimal(5)), ("Dips", Decimal("27.5"), Decimal(12)), ("Curl", Decimal(50), Decimal(10))],
+        )
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.total_workouts, stats.total_sets, stats.total_volume), (2, 6, Decimal("1450") + Decimal("1542.5")))
+
+    def test_overload_never_lowers_a_weight(self):
+        odd = Workout.objects.new(name="Arms", description="Odd plates", user=self.user)["workout"]
+        Exercise.objects.new_many(workout=odd, sets=[
+            {"name": "Curl", "weight": 11, "repetitions": 10},
+            {"name": "Curl", "weight": 23, "repetitions": 10},
+            {"name": "Raise", "weight": 8, "repetitions": 10},
+        ])
+        small = Workout.objects.repeat(workout_id=odd.id, user=self.user, overload=1)["workout"]
+        self.assertEqual(list(Exercise.objects.filter(workout=small).order_by("id").values_list("weight", flat=True)), [Decimal("12.5"), Decimal(25), Decimal(10)])
+        bigger = Workout.objects.repeat(workout_id=odd.id, user=self.user, overload=10)["workout"]
+        self.assertEqual(list(Exercise.objects.filter(workout=bigger).order_by("id").values_list("weight", flat=True)), [Decimal("12.5"), Decimal(27.5), Decimal(10)])
+
+    def test_query_count_does_not_grow_with_sets(self):
+        with CaptureQueriesContext(connection) as few:
+            Workout.objects.repeat(workout_id=self.workout.id, user=self.user)
+        Exercise.objects.new_many(workout=self.workout, sets=[{"name": "Row", "weight": 95, "repetitions": 8}] * 30)
+        with self.assertNumQueries(len(few)):
+            Workout.objects.repeat(workout_id=self.workout.id, user=self.user, overload=2.5)
+
+    def test_rejects_others_workouts_and_bad_overload(self):
+        other = new_user("other")
+        self.assertEqual(Workout.objects.repeat(workout_id=self.workout.id, user=other)["errors"], ["Workout not found."])
+        self.assertEqual(len(Workout.objects.repeat(workout_id=self.workout.id, user=self.user, overload="lots")["errors"]), 1)
+        self.assertEqual(len(Workout.objects.repeat(workout_id=self.workout.id, user=self.user, overload="90")["errors"]), 1)
+        self.assertEqual(Workout.objects.count(), 1)
+
+class SoftDeleteTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+        self.workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        Exercise.objects.new_many(workout=self.workout, sets=[{"name": "Bench Press", "weight": 135, "repetitions": 5}] * 3)
+        self.kept = Workout.objects.new(name="Legs", description="Squats", user=self.user)["workout"]
+        Exercise.objects.new(name="Squat", weight="225", repetitions="5", workout=self.kept)
+
+    def test_delete_only_hides_the_workout(self):
+        log_in(self.client, self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertRedirects(self.client.get("/workout/%d/delete" % self.workout.id), "/dashboard", fetch_redirect_response=False)
+        self.assertEqual(callbacks, [reaper.wake])
+        self.assertFalse(Workout.objects.filter(id=self.workout.id).exists())
+        self.assertFalse(Exercise.objects.filter(workout__id=self.workout.id).exists())
+        self.assertEqual(search.search_workouts(self.user.id, "bench"), [])
+        # Nothing is deleted yet:
+        self.assertEqual(Exercise.all_objects.filter(workout__id=self.workout.id).count(), 3)
+        self.assertEqual(UserStats.objects.verify(), [])
+
+    def test_reap_deletes_in_small_batches(self):
+        Workout.objects.remove(workout_id=self.workout.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reaper.reap(batch_size=2, pause=0), {"users": 0, "workouts": 1, "exercises": 3})
+        # Two batches of sets (then the workout's own, now empty, cascade):
+        self.assertEqual(len([query for query in queries if query["sql"].startswith('DELETE FROM "workout_exercise" WHERE "workout_exercise"."id" IN')]), 2)
+        self.assertFalse(Workout.all_objects.filter(id=self.workout.id).exists())
+        self.assertEqual(Exercise.all_objects.count(), 1)
+        self.assertEqual(reaper.reap(), {"users": 0, "workouts": 0, "exercises": 0})
+
+    @override_settings(**FAST_HASHING)
+    def test_deleted_account_is_hidden_then_reaped(self):
+        User.objects.remove(user_id=self.user.id)
+        self.assertIsNone(user_cache.get(self.user.id))
+        self.assertFalse(Workout.objects.filter(user__id=self.user.id).exists())
+        self.assertFalse(Exercise.objects.exists())
+        self.assertIn("errors", User.objects.login(username=["lifter"], password=["password123"]))
+        # The username stays taken until the account is really gone:
+        self.assertIn("errors", User.objects.register(**registration()))
+
+        out = StringIO()
+        call_command("reap_deleted", "--pause", "0", stdout=out)
+        self.assertIn("Deleted 1 users, 2 workouts and 4 exercises.", out.getvalue())
+        self.assertFalse(User.all_objects.filter(id=self.user.id).exists())
+        self.assertFalse(UserStats.objects.exists())
+        self.assertIn("logged_in_user", User.objects.register(**registration()))
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+        self.workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        Exercise.objects.new(name="Bench Press", weight="135", repetitions="10", workout=self.workout)
+        log_in(self.client, self.user)
+
+    def assertConditional(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        return etag
+
+    def test_workout_list(self):
+        etag = self.assertConditional("/api/workouts")
+        self.assertEqual(self.client.get("/api/workouts").json()["workouts"][0]["name"], "Push")
+        Workout.objects.update(name="Push Day", description="Bench", workout_id=self.workout.id)
+        self.assertEqual(self.client.get("/api/workouts", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_workout_detail_changes_with_exercises(self):
+        url = "/api/workouts/%d" % self.workout.id
+        etag = self.assertConditional(url)
+        self.assertEqual(len(self.client.get(url).json()["workout"]["exercises"]), 1)
+        Exercise.objects.remove(exercise_id=Exercise.objects.get().id)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_profile(self):
+        self.assertConditional("/api/user")
+        self.assertEqual(self.client.get("/api/user").json()["user"]["stats"]["total_sets"], 1)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/workouts").status_code, 401)
+
+    def test_progress(self):
+        Exercise.objects.new(name="bench press", weight="145", repetitions="5", workout=self.workout)
+        pull = Workout.objects.new(name="Pull", description="Rows", user=self.user)["workout"]
+        Exercise.objects.new(name="Bench Press", weight="150", repetitions="3", workout=pull)
+        etag = self.assertConditional("/api/progress?exercise=Bench%20Press")
+
+        progress = self.client.get("/api/progress?exercise=Bench%20Press").json()["progress"]
+        self.assertEqual(progress["workout_id"], [self.workout.id, pull.id])
+        self.assertEqual(progress["top_weight"], [145.0, 150.0])
+        self.assertEqual(progress["volume"], [2075.0, 450.0])
+        self.assertEqual(progress["estimated_1rm"], [180.0, 165.0])
+
+        Exercise.objects.new(name="Bench Press", weight="155", repetitions="1", workout=pull)
+        self.assertEqual(self.client.get("/api/progress?exercise=Bench%20Press", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_lttb_keeps_ends_and_peaks(self):
+        xs = list(range(1000))
+        ys = [0.0] * 1000
+        ys[500] = 100.0
+        kept = lttb(xs, ys, 20)
+        self.assertEqual(len(kept), 20)
+        self.assertEqual((kept[0], kept[-1]), (0, 999))
+        self.assertIn(500, kept)
+        self.assertEqual(kept, sorted(kept))
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+        workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        Exercise.objects.new(name="Bench Press", weight="135", repetitions="10", workout=workout)
+        Exercise.objects.new(name="Dip", weight="0", repetitions="12", workout=workout)
+        Workout.objects.new(name="Rest", description="Nothing yet", user=self.user)
+        log_in(self.client, self.user)
+
+    def test_csv_download(self):
+        response = self.client.get("/workouts/export")
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["username", "workout_id", "workout_name"])
+        self.assertEqual(len(lines), 4) # header, two sets, one empty workout
+
+    def test_jsonl_command(self):
+        out = StringIO()
+        call_command("export_history", user="lifter", format="jsonl", chunk_size=1, stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row["exercise_name"] for row in rows], ["Bench Press", "Dip", None])
+
+class ImportTests(TestCase):
+
+    def setUp(self):
+        self.user = new_user()
+
+    def history(self, workouts=3, sets=4):
+        lines = ["workout_id,workout_name,workout_description,workout_completed,workout_created_at,exercise_name,exercise_weight,exercise_repetitions"]
+        for w in range(workouts):
+            for e in range(sets):
+                lines.append("%d,Day %d,Squats,True,2019-01-0%d 10:00:00,Squat,%d,5" % (w, w, w + 1, 100 + e))
+        return lines
+
+    def test_imports_and_rejects_rows(self):
+        lines = self.history()
+        lines.append("9,Day 9,Squats,False,,Squat,heavy,5")
+        lines.append("10,x,Squats,False,,Squat,100,5")
+        rejects = []
+        job = import_history(self.user, BytesIO("\n".join(lines).encode()), "csv", chunk_size=5, on_reject=lambda line, errors: rejects.append(line))
+        self.assertEqual((job.workouts_created, job.exercises_created, job.rows_rejected), (4, 12, 2))
+        self.assertEqual(rejects, [14, 15])
+        self.assertEqual(Workout.objects.filter(user=self.user, created_at__year=2019).count(), 3)
+        self.assertEqual(UserStats.objects.verify(), [])
+        # Completed history levels the user up:
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.level_name, "Novice")
+
+    def test_resumes_after_last_committed_chunk(self):
+        source = BytesIO("\n".join(self.history()).encode())
+
+        def crash(job):
+            raise RuntimeError("worker killed")
+
+        with self.assertRaises(RuntimeError):
+            import_history(self.user, source, "csv", chunk_size=4, on_progress=crash)
+        self.assertEqual(Workout.objects.count(), 1)
+
+        source.seek(0)
+        job = import_history(self.user, source, "csv", chunk_size=4)
+        self.assertTrue(job.finished)
+        self.assertEqual(Workout.objects.count(), 3)
+        self.assertEqual(Exercise.objects.count(), 12)
+
+    def test_round_trip_jsonl(self):
+        workout = Workout.objects.new(name="Push", description="Bench", user=self.user)["workout"]
+        Exercise.objects.new(name="Bench Press", weight="135", repetitions="10", workout=workout)
+        out = StringIO()
+        call_command("export_history", user="lifter", format="jsonl", stdout=out)
+        other = new_user("other")
+        job = import_history(other, BytesIO(out.getvalue().encode()), "jsonl")
+        self.assertEqual((job.workouts_created, job.exercises_created), (1, 1))
+        self.assertEqual(Exercise.objects.get(workout__user=other).weight, Decimal("135.0"))
+
+class StaticFilesApplicationTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.root.name, "css"))
+        for name in ("site.css", "site.0123456789ab.css"):
+            path = os.path.join(self.root.name, "css", name)
+            with open(path, "w") as css:
+                css.write("body { color: red; }\n" * 200)
+            compress(path)
+        with open(os.path.join(self.root.name, "staticfiles.json"), "w") as manifest:
+            json.dump({"version": "1.0", "paths": {"css/site.css": "css/site.0123456789ab.css"}}, manifest)
+        self.app = StaticFilesApplication(lambda environ, start_response: [b"django"], root=self.root.name, prefix="/static/")
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def get(self, path, **environ):
+        response = {}
+
+        def start_response(status, headers):
+            response["status"] = status
+            response["headers"] = dict(headers)
+
+        body = b"".join(self.app(dict(PATH_INFO=path, REQUEST_METHOD="GET", **environ), start_response))
+        return response.get("status"), response.get("headers"), body
+
+    def test_serves_precompressed_hashed_file_as_immutable(self):
+        status, headers, body = self.get("/static/css/site.0123456789ab.css", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertIn("immutable", headers["Cache-Control"])
+        self.assertEqual(len(body), int(headers["Content-Length"]))
+
+    def test_unhashed_file_revalidates(self):
+        status, headers, _ = self.get("/static/css/site.css")
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertNotIn("immutable", headers["Cache-Control"])
+        status, _, _ = self.get("/static/css/site.css", HTTP_IF_NONE_MATCH=headers["ETag"])
+        self.assertEqual(status, "304 Not Modified")
+
+    def test_other_paths_reach_django(self):
+        self.assertEqual(self.get("/dashboard")[2], b"django")
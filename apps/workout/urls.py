@@ -3,7 +3,7 @@
 Our workout application URLs.
 """
 from django.conf.urls import url
-from . import views
+from . import api, views
 
 urlpatterns = [
     url(r'^$', views.login), # index / login page
@@ -14,9 +14,21 @@ urlpatterns = [
     url(r'^workout$', views.new_workout), # get workout page / add workout
     url(r'^workout/(?P<id>\d*)$', views.workout), # get workout / update workout
     url(r'^workout/(?P<id>\d*)/exercise$', views.exercise), # add exercise
+    url(r'^workout/(?P<id>\d*)/exercises$', views.exercises), # add many exercises (JSON)
     url(r'^workout/(?P<id>\d*)/complete$', views.complete_workout), # complete workout
     url(r'^workout/(?P<id>\d*)/edit$', views.edit_workout), # edit workout
     url(r'^workout/(?P<id>\d*)/delete$', views.delete_workout), # delete workout
+    url(r'^workout/(?P<id>\d*)/repeat$', views.repeat_workout), # copy workout and its exercises
     url(r'^workouts$', views.all_workouts), # get all workouts
+    url(r'^workouts/export$', views.export_history), # download training history
+    url(r'^workouts/import$', views.import_history), # upload training history
+    url(r'^workouts/search$', views.search_workouts), # search workouts
     url(r'^legal/tos$', views.tos), # get terms of service
+    url(r'^metrics$', views.metrics_endpoint), # Prometheus metrics
+    url(r'^api/workouts$', api.workouts), # JSON: list workouts
+    url(r'^api/workouts/(?P<id>\d+)$', api.workout), # JSON: workout with exercises
+    url(r'^api/user$', api.profile), # JSON: logged in user's profile
+    url(r'^api/progress$', api.progress), # JSON: progress chart data for one exercise
+    url(r'^api/exercise-names$', api.exercise_names), # JSON: exercise name autocomplete
+    url(r'^api/search$', api.search_workouts), # JSON: search workouts
 ]
@@ -0,0 +1,173 @@
+"""Validation rules for our models' form values.
+
+Every pattern is compiled once, when this module is imported, and each entity's
+checks are one straight function (no per-rule objects or bookkeeping per call),
+wrapped in a `RuleSet`. Managers validate through `validate()`;
+bulk paths (batch set logging, imports) use `validate_many()`, which checks any
+number of records in one call and returns structured errors.
+"""
+import math
+import re
+from collections import namedtuple
+
+#---------------#
+#-- PATTERNS: --#
+#---------------#
+'''
+Note: TEXT_PATTERN matches for strings which start or do not start with spaces, whom contain letters, numbers and some basic character sequences, followed by either more spaces or more characters. This prevents empty string submissions.
+'''
+TEXT_PATTERN = re.compile(r'^\s*[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+(?:\s+[A-Za-z0-9!@#$%^&*\"\':;\/?,<.>()-_=+\]\[~`]+)*\s*$')
+USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9!@#$%^&*()?]*$')
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9\.\+_-]+@[a-zA-Z0-9\._-]+\.[a-zA-Z]*$')
+
+#---------------#
+#-- MESSAGES: --#
+#---------------#
+
+NAME_LENGTH = 'Name is required and must be at least 2 characters long.'
+NAME_FORMAT = 'Name must contain letters, numbers and basic characters only.'
+DESCRIPTION_LENGTH = 'Description is required and must be at least 2 characters long.'
+DESCRIPTION_FORMAT = 'Description must contain letters, numbers and basic characters only.'
+ALL_REQUIRED = 'All fields are required.'
+NUMBERS_FORMAT = 'Weight and repetitions must be a positive number only, containing at most one decimal place.'
+NUMBERS_NEGATIVE = 'Weight and repetitions must be a positive number.'
+USERNAME_LENGTH = 'Username is required and must be at least 2 characters long.'
+USERNAME_FORMAT = 'Username must contain letters, numbers and basic characters only.'
+EMAIL_LENGTH = 'Email field must be at least 5 characters.'
+EMAIL_FORMAT = 'Email field is not a valid email format.'
+PASSWORD_LENGTH = 'Password fields are required and must be at least 8 characters.'
+PASSWORD_MATCH = 'Password and confirmation must match.'
+TOS_REQUIRED = "Terms of service must be accepted."
+
+#----------------#
+#-- RULE SETS: --#
+#----------------#
+# Each entity's checks are one straight function: `check(record)` returns `(errors, cleaned)`, where `cleaned` is
+# the record itself unless a value had to be converted (then a copy with the converted values).
+
+class RuleSet(object):
+    """
+    The fields an entity has, and the function that checks its values.
+
+    Parameters:
+    - `fields` - Field names (e.g. what `UserManager.register()` picks out of `request.POST`).
+    - `check` - Function of a record (dictionary) returning `(errors, cleaned)`; it must not modify the record.
+    """
+
+    def __init__(self, fields, check):
+        self.fields = tuple(fields)
+        self.check = check
+
+# Bound once (these run for every record):
+_text = TEXT_PATTERN.match
+_username = USERNAME_PATTERN.match
+_email = EMAIL_PATTERN.match
+_isfinite = math.isfinite
+
+def _check_workout(record):
+    errors = []
+    name = record["name"]
+    description = record["description"]
+    if len(name) < 2:
+        errors.append(NAME_LENGTH)
+    if _text(name) is None:
+        errors.append(NAME_FORMAT)
+    if len(description) < 2:
+        errors.append(DESCRIPTION_LENGTH)
+    if _text(description) is None:
+        errors.append(DESCRIPTION_FORMAT)
+    return errors, record
+
+def _check_exercise(record):
+    errors = []
+    name = record["name"]
+    weight = record["weight"]
+    repetitions = record["repetitions"]
+    if not (name and weight and repetitions):
+        errors.append(ALL_REQUIRED)
+    if len(name) < 2:
+        errors.append(NAME_LENGTH)
+    if _text(name) is None:
+        errors.append(NAME_FORMAT)
+    # Weight and repetitions become floats (rounded to one place), but only if both are finite numbers:
+    try:
+        weight = round(float(weight), 1)
+        repetitions = round(float(repetitions), 1)
+        numbers = _isfinite(weight) and _isfinite(repetitions)
+    except (TypeError, ValueError):
+        numbers = False
+    if not numbers:
+        errors.append(NUMBERS_FORMAT)
+        return errors, record
+    if weight < 0 or repetitions < 0:
+        errors.append(NUMBERS_NEGATIVE)
+    return errors, {**record, "weight": weight, "repetitions": repetitions}
+
+def _check_registration(record):
+    errors = []
+    username = record["username"]
+    email = record["email"]
+    password = record["password"]
+    if len(username) < 2:
+        errors.append(USERNAME_LENGTH)
+    if _username(username) is None:
+        errors.append(USERNAME_FORMAT)
+    # (Only one error per field: the format isn't checked if the value is too short.)
+    if len(email) < 5:
+        errors.append(EMAIL_LENGTH)
+    elif _email(email) is None:
+        errors.append(EMAIL_FORMAT)
+    if len(password) < 8 or len(record["password_confirmation"]) < 8:
+        errors.append(PASSWORD_LENGTH)
+    elif password != record["password_confirmation"]:
+        errors.append(PASSWORD_MATCH)
+    if record["tos_accept"] != "on":
+        errors.append(TOS_REQUIRED)
+    return errors, record
+
+WORKOUT = RuleSet(("name", "description"), _check_workout)
+EXERCISE = RuleSet(("name", "weight", "repetitions"), _check_exercise)
+REGISTRATION = RuleSet(("username", "email", "password", "password_confirmation", "tos_accept"), _check_registration)
+
+#---------------#
+#-- VALIDATE: --#
+#---------------#
+
+BatchResult = namedtuple("BatchResult", ["valid", "errors"])
+BatchResult.__doc__ = """Result of `validate_many()`: `valid` is a list of `(index, cleaned record)`, `errors` a dictionary of index to error messages."""
+
+def validate(rules, record):
+    """
+    Checks one record against a `RuleSet`.
+
+    Parameters:
+    - `rules` - `RuleSet` to apply (e.g. `WORKOUT`).
+    - `record` - Dictionary of values; it is not modified.
+
+    Returns a tuple of `(errors, cleaned)`: a list of error messages (empty if valid) and the record with any
+    conversions (e.g. numbers) applied (a copy if anything was converted).
+    """
+
+    return rules.check(record)
+
+def validate_many(rules, records):
+    """
+    Checks any number of records against a `RuleSet` in one call.
+
+    Parameters:
+    - `rules` - `RuleSet` to apply.
+    - `records` - Iterable of dictionaries of values; they are not modified.
+
+    Returns a `BatchResult`.
+    """
+
+    valid = []
+    errors = {}
+    check = rules.check
+    for index, record in enumerate(records):
+        record_errors, cleaned = check(record)
+        if record_errors:
+            errors[index] = record_errors
+        else:
+            valid.append((index, cleaned))
+    return BatchResult(valid, errors)
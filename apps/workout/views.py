@@ -1,7 +1,19 @@
-from django.shortcuts import render, redirect
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages # access django's `messages` module.
-from .models import User, Workout, Exercise
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse, HttpResponseBadRequest
+from .models import User, Workout, Exercise, UserStats
+from .decorators import login_required
+from .pagination import keyset_page
+from . import export, importer, logs, metrics, search
+
+# Read only pages are async views: under ASGI (see asgi.py) a request waiting on the database doesn't hold a worker
+# thread. Django's ORM is synchronous, so queries (and rendering, which runs lazy querysets and reads the session)
+# go through `sync_to_async()`; under WSGI Django runs these views with `async_to_sync()`.
+async_render = sync_to_async(render)
 
 def login(request):
     """If GET, load login page, if POST, login user."""
@@ -15,7 +27,7 @@ def login(request):
         try:
             # If errors, reload login page with errors:
             if len(validated["errors"]) > 0:
-                print("User could not be logged in.")
+                logs.event("user.login_rejected", errors=len(validated["errors"]))
                 # Loop through errors and Generate Django Message for each with custom level and tag:
                 for error in validated["errors"]:
                     messages.error(request, error, extra_tags='login')
@@ -23,10 +35,11 @@ def login(request):
                 return redirect("/")
         except KeyError:
             # If validation successful, set session, and load dashboard based on user level:
-            print("User passed validation and is logged in.")
+            logs.event("user.logged_in", user_id=validated["logged_in_user"].id)
 
-            # Set session to validated User:
+            # Set session to validated User, under a new session key (written now; the old key is deleted):
             request.session["user_id"] = validated["logged_in_user"].id
+            request.session.cycle_key()
 
             # Fetch dashboard data and load appropriate dashboard page:
             return redirect("/dashboard")
@@ -43,7 +56,7 @@ def register(request):
         # If errors, reload register page with errors:
         try:
             if len(validated["errors"]) > 0:
-                print("User could not be registered.")
+                logs.event("user.register_rejected", errors=len(validated["errors"]))
                 # Loop through errors and Generate Django Message for each with custom level and tag:
                 for error in validated["errors"]:
                     messages.error(request, error, extra_tags='registration')
@@ -51,306 +64,397 @@ def register(request):
                 return redirect("/user/register")
         except KeyError:
             # If validation successful, set session and load dashboard based on user level:
-            print("User passed validation and has been created.")
-            # Set session to validated User:
+            logs.event("user.registered", user_id=validated["logged_in_user"].id)
+            # Set session to validated User, under a new session key (written now; the old key is deleted):
             request.session["user_id"] = validated["logged_in_user"].id
+            request.session.cycle_key()
             # Load Dashboard:
             return redirect('/dashboard')
 
 def logout(request):
     """Logs out current user."""
 
-    try:
-        # Deletes session:
-        del request.session['user_id']
+    if "user_id" in request.session:
+        # Deletes session, key and all (see `sessions.py`: a new key can't be served from any process's cached copy):
+        request.session.flush()
         # Adds success message:
         messages.success(request, "You have been logged out.", extra_tags='logout')
 
-    except KeyError:
-        pass
-
     # Return to index page:
     return redirect("/")
 
-def dashboard(request):
+@login_required
+async def dashboard(request):
     """Loads dashboard."""
 
-    try:
-        # Check for valid session:
-        user = User.objects.get(id=request.session["user_id"])
-
-        # Get recent workouts for logged in user:
-        recent_workouts = Workout.objects.filter(user__id=user.id).order_by('-id')[:4]
+    user = request.workout_user
 
-        # Gather any page data:
-        data = {
-            'user': user,
-            'recent_workouts': recent_workouts,
-        }
+    # Get recent workouts for logged in user (lazy, so it only runs if the template's cached fragment is missing):
+    recent_workouts = Workout.objects.filter(user__id=user.id).order_by('-id')[:4]
 
-        # Load dashboard with data:
-        return render(request, "workout/dashboard.html", data)
+    # Gather any page data:
+    data = {
+        'user': user,
+        'recent_workouts': recent_workouts,
+        # Note: Stats (and their `version`, the fragment cache key) are read before the fragment's queries run, so a
+        # write landing in between can only make the cached fragment newer than its key, never older:
+        'stats': await sync_to_async(UserStats.objects.for_user)(user),
+    }
 
-    except (KeyError, User.DoesNotExist) as err:
-        # If existing session not found:
-        messages.info(request, "You must be logged in to view this page.", extra_tags="invalid_session")
-        return redirect("/")
+    # Load dashboard with data:
+    return await async_render(request, "workout/dashboard.html", data)
 
+@login_required
 def new_workout(request):
     """If GET, load new workout; if POST, submit new workout."""
 
-    try:
-        # Check for valid session:
-        user = User.objects.get(id=request.session["user_id"])
+    user = request.workout_user
+
+    # Gather any page data:
+    data = {
+        'user': user,
+    }
+
+    if request.method == "GET":
+        # If get request, load `add workout` page with data:
+        return render(request, "workout/add_workout.html", data)
 
-        # Gather any page data:
-        data = {
-            'user': user,
+    if request.method == "POST":
+        # Unpack request.POST for validation as we must add a field and cannot modify the request.POST object itself as it's a tuple:
+        workout = {
+            "name": request.POST["name"],
+            "description": request.POST["description"],
+            "user": user
         }
 
-        if request.method == "GET":
-            # If get request, load `add workout` page with data:
-            return render(request, "workout/add_workout.html", data)
-
-        if request.method == "POST":
-            # Unpack request.POST for validation as we must add a field and cannot modify the request.POST object itself as it's a tuple:
-            workout = {
-                "name": request.POST["name"],
-                "description": request.POST["description"],
-                "user": user
-            }
-
-            # Begin validation of a new workout:
-            validated = Workout.objects.new(**workout)
-
-            # If errors, reload register page with errors:
-            try:
-                if len(validated["errors"]) > 0:
-                    print("Workout could not be created.")
-                    # Loop through errors and Generate Django Message for each with custom level and tag:
-                    for error in validated["errors"]:
-                        messages.error(request, error, extra_tags='workout')
-                    # Reload workout page:
-                    return redirect("/workout")
-            except KeyError:
-                # If validation successful, load newly created workout page:
-                print("Workout passed validation and has been created.")
-
-                id = str(validated['workout'].id)
-                # Load workout:
-                return redirect('/workout/' + id)
-
-    except (KeyError, User.DoesNotExist) as err:
-        # If existing session not found:
-        messages.info(request, "You must be logged in to view this page.", extra_tags="invalid_session")
-        return redirect("/")
-
-def workout(request, id):
+        # Begin validation of a new workout:
+        validated = Workout.objects.new(**workout)
+
+        # If errors, reload register page with errors:
+        try:
+            if len(validated["errors"]) > 0:
+                logs.event("workout.create_rejected", errors=len(validated["errors"]))
+                # Loop through errors and Generate Django Message for each with custom level and tag:
+                for error in validated["errors"]:
+                    messages.error(request, error, extra_tags='workout')
+                # Reload workout page:
+                return redirect("/workout")
+        except KeyError:
+            # If validation successful, load newly created workout page:
+            logs.event("workout.created", workout_id=validated["workout"].id)
+
+            id = str(validated['workout'].id)
+            # Load workout:
+            return redirect('/workout/' + id)
+
+@login_required
+async def workout(request, id):
     """View workout."""
 
-    try:
-        # Check for valid session:
-        user = User.objects.get(id=request.session["user_id"])
-
-        # Gather any page data:
-        data = {
-            'user': user,
-            'workout': Workout.objects.get(id=id),
-            'exercises': Exercise.objects.filter(workout__id=id).order_by('-updated_at'),
-        }
+    user = request.workout_user
 
-        # If get request, load workout page with data:
-        return render(request, "workout/workout.html", data)
+    # Gather any page data:
+    data = {
+        'user': user,
+        'workout': await sync_to_async(Workout.objects.get)(id=id),
+        # Lazy; only runs if the cached exercise table (keyed by the workout's `version`, read above) is missing:
+        'exercises': Exercise.objects.filter(workout__id=id).order_by('-updated_at'),
+    }
 
-    except (KeyError, User.DoesNotExist) as err:
-        # If existing session not found:
-        messages.info(request, "You must be logged in to view this page.", extra_tags="invalid_session")
-        return redirect("/")
+    # If get request, load workout page with data:
+    return await async_render(request, "workout/workout.html", data)
 
-def all_workouts(request):
+@login_required
+async def all_workouts(request):
     """Loads `View All` Workouts page."""
 
-    try:
-        # Check for valid session:
-        user = User.objects.get(id=request.session["user_id"])
+    user = request.workout_user
 
-        workout_list = Workout.objects.filter(user__id=user.id).order_by('-id')
+    workout_list = Workout.objects.filter(user__id=user.id)
 
-        page = request.GET.get('page', 1)
+    # Page by cursor (`?before=<id>` / `?after=<id>`) rather than page number, so deep pages cost the same as the first:
+    workouts = await sync_to_async(keyset_page)(workout_list, before=request.GET.get('before'), after=request.GET.get('after'), per_page=12)
 
-        paginator = Paginator(workout_list, 12)
-        try:
-            workouts = paginator.page(page)
-        except PageNotAnInteger:
-            workouts = paginator.page(1)
-        except EmptyPage:
-            workouts = paginator.page(paginator.num_pages)
-
-        # Gather any page data:
-        data = {
-            'user': user,
-            'workouts': workouts,
-        }
+    # Gather any page data:
+    data = {
+        'user': user,
+        'workouts': workouts,
+    }
+
+    # Load dashboard with data:
+    return await async_render(request, "workout/all_workouts.html", data)
 
-        # Load dashboard with data:
-        return render(request, "workout/all_workouts.html", data)
+@login_required
+def search_workouts(request):
+    """Loads the `View All` Workouts page with the workouts matching `?search=` (the header search box), best match first."""
 
-    except (KeyError, User.DoesNotExist) as err:
-        # If existing session not found:
-        messages.info(request, "You must be logged in to view this page.", extra_tags="invalid_session")
-        return redirect("/")
+    user = request.workout_user
+    query = request.GET.get('search', '').strip()
 
+    # Gather any page data:
+    data = {
+        'user': user,
+        'workouts': search.search_workouts(user.id, query, limit=50),
+        'search': query,
+    }
+
+    # Load results with data:
+    return render(request, "workout/all_workouts.html", data)
+
+@login_required
 def exercise(request, id):
     """If POST, submit new exercise, if GET delete exercise."""
 
-    try:
-        # Check for valid session:
-        user = User.objects.get(id=request.session["user_id"])
+    if request.method == "GET":
+
+        # Delete exercise by exercise id (from hidden field):
+        Exercise.objects.remove(exercise_id=request.GET["exercise_id"])
+
+        return redirect("/workout/" + id)
+
+    if request.method == "POST":
+
+        # Unpack request.POST for validation as we must add a field and cannot modify the request.POST object itself as it's a tuple:
+        exercise = {
+            "name": request.POST["name"],
+            "weight": request.POST["weight"],
+            "repetitions": request.POST["repetitions"],
+            "workout": Workout.objects.get(id=id),
+        }
+
+        logs.event("exercise.submitted", level=logging.DEBUG, workout_id=id, exercise=exercise["name"])
+        # Begin validation of a new exercise:
+        validated = Exercise.objects.new(**exercise)
+
+        # If errors, reload register page with errors:
+        try:
+            if len(validated["errors"]) > 0:
+                logs.event("exercise.create_rejected", workout_id=id, errors=len(validated["errors"]))
 
-        if request.method == "GET":
+                # Loop through errors and Generate Django Message for each with custom level and tag:
+                for error in validated["errors"]:
+                    messages.error(request, error, extra_tags='exercise')
+
+                # Reload workout page:
+                return redirect("/workout/" + id)
+        except KeyError:
+            # If validation successful, load newly created workout page:
+            logs.event("exercise.created", workout_id=id)
 
-            # Delete exercise by exercise id (from hidden field):
-            Exercise.objects.get(id=request.GET["exercise_id"]).delete()
+            # Reload workout:
+            return redirect('/workout/' + id)
 
-            return redirect("/workout/" + id)
+MAX_BATCH_SETS = 100 # Most sets accepted by one `exercises` request
 
-        if request.method == "POST":
+def _batch_sets(request):
+    """
+    Reads a list of sets from either a JSON body (`{"sets": [{"name": ..., "weight": ..., "repetitions": ...}, ...]}`)
+    or a form with repeated `name`, `weight` and `repetitions` fields.
 
-            # Unpack request.POST for validation as we must add a field and cannot modify the request.POST object itself as it's a tuple:
-            exercise = {
-                "name": request.POST["name"],
-                "weight": request.POST["weight"],
-                "repetitions": request.POST["repetitions"],
-                "workout": Workout.objects.get(id=id),
-            }
+    Raises `ValueError` if the body can't be read.
+    """
 
-            print(exercise)
-            # Begin validation of a new exercise:
-            validated = Exercise.objects.new(**exercise)
+    fields = ("name", "weight", "repetitions")
 
-            # If errors, reload register page with errors:
-            try:
-                if len(validated["errors"]) > 0:
-                    print("Exercise could not be created.")
+    if request.content_type == "application/json":
+        body = json.loads(request.body.decode() or "{}")
+        sets = body.get("sets") if isinstance(body, dict) else None
+        if not isinstance(sets, list) or not all(isinstance(row, dict) for row in sets):
+            raise ValueError("`sets` must be a list of objects.")
+    else:
+        columns = [request.POST.getlist(field) for field in fields]
+        sets = [dict(zip(fields, row)) for row in zip(*columns)]
 
-                    # Loop through errors and Generate Django Message for each with custom level and tag:
-                    for error in validated["errors"]:
-                        messages.error(request, error, extra_tags='exercise')
+    # Validation expects strings for every field, just like a single form post:
+    return [{field: "" if row.get(field) is None else str(row.get(field)) for field in fields} for row in sets]
 
-                    # Reload workout page:
-                    return redirect("/workout/" + id)
-            except KeyError:
-                # If validation successful, load newly created workout page:
-                print("Exercise passed validation and has been created.")
+@login_required
+def exercises(request, id):
+    """If POST, submit a batch of new exercises (sets) and return JSON with per-set errors."""
 
-                # Reload workout:
-                return redirect('/workout/' + id)
+    if request.method != "POST":
+        return JsonResponse({"errors": ["POST a list of sets."]}, status=405)
 
-    except (KeyError, User.DoesNotExist) as err:
-        # If existing session not found:
-        messages.info(request, "You must be logged in to view this page.", extra_tags="invalid_session")
-        return redirect("/")
+    user = request.workout_user
+    workout = get_object_or_404(Workout, id=id, user__id=user.id)
 
+    try:
+        sets = _batch_sets(request)
+    except ValueError as err:
+        return JsonResponse({"errors": [str(err)]}, status=400)
+
+    if len(sets) == 0 or len(sets) > MAX_BATCH_SETS:
+        return JsonResponse({"errors": ["Between 1 and %d sets may be logged at once." % MAX_BATCH_SETS]}, status=400)
+
+    # Validate and insert all valid sets at once:
+    result = Exercise.objects.new_many(workout=workout, sets=sets)
+
+    logs.event("exercises.created", workout_id=workout.id, created=len(result["created"]), submitted=len(sets))
+
+    return JsonResponse({
+        "created": result["created"],
+        "errors": [{"index": index, "errors": errors} for index, errors in sorted(result["errors"].items())],
+    }, status=201 if result["created"] else 400)
+
+@login_required
 def edit_workout(request, id):
     """If GET, load edit workout; if POST, update workout."""
 
-    try:
-        # Check for valid session:
-        user = User.objects.get(id=request.session["user_id"])
-
-        # Gather any page data:
-        data = {
-            'user': user,
-            'workout': Workout.objects.get(id=id),
-            'exercises': Exercise.objects.filter(workout__id=id),
+    user = request.workout_user
+
+    # Gather any page data:
+    data = {
+        'user': user,
+        'workout': Workout.objects.get(id=id),
+        'exercises': Exercise.objects.filter(workout__id=id),
+    }
+
+    if request.method == "GET":
+        # If get request, load edit workout page with data:
+        return render(request, "workout/edit_workout.html", data)
+
+    if request.method == "POST":
+        # If post request, validate update workout data:
+        # Unpack request object and build our custom tuple:
+        workout = {
+            'name': request.POST['name'],
+            'description': request.POST['description'],
+            'workout_id': data['workout'].id,
         }
 
-        if request.method == "GET":
-            # If get request, load edit workout page with data:
-            return render(request, "workout/edit_workout.html", data)
-
-        if request.method == "POST":
-            # If post request, validate update workout data:
-            # Unpack request object and build our custom tuple:
-            workout = {
-                'name': request.POST['name'],
-                'description': request.POST['description'],
-                'workout_id': data['workout'].id,
-            }
-
-            # Begin validation of updated workout:
-            validated = Workout.objects.update(**workout)
-
-            # If errors, reload register page with errors:
-            try:
-                if len(validated["errors"]) > 0:
-                    print("Workout could not be edited.")
-                    # Loop through errors and Generate Django Message for each with custom level and tag:
-                    for error in validated["errors"]:
-                        messages.error(request, error, extra_tags='edit')
-                    # Reload workout page:
-                    return redirect("/workout/" + str(data['workout'].id) + "/edit")
-            except KeyError:
-                # If validation successful, load newly created workout page:
-                print("Edited workout passed validation and has been updated.")
-
-                # Load workout:
-                return redirect("/workout/" + str(data['workout'].id))
-
-    except (KeyError, User.DoesNotExist) as err:
-        # If existing session not found:
-        messages.info(request, "You must be logged in to view this page.", extra_tags="invalid_session")
-        return redirect("/")
+        # Begin validation of updated workout:
+        validated = Workout.objects.update(**workout)
+
+        # If errors, reload register page with errors:
+        try:
+            if len(validated["errors"]) > 0:
+                logs.event("workout.edit_rejected", workout_id=data["workout"].id, errors=len(validated["errors"]))
+                # Loop through errors and Generate Django Message for each with custom level and tag:
+                for error in validated["errors"]:
+                    messages.error(request, error, extra_tags='edit')
+                # Reload workout page:
+                return redirect("/workout/" + str(data['workout'].id) + "/edit")
+        except KeyError:
+            # If validation successful, load newly created workout page:
+            logs.event("workout.edited", workout_id=data["workout"].id)
 
+            # Load workout:
+            return redirect("/workout/" + str(data['workout'].id))
+
+@login_required
 def delete_workout(request, id):
     """Delete a workout."""
 
-    try:
-        # Check for valid session:
-        user = User.objects.get(id=request.session["user_id"])
+    # Delete workout:
+    Workout.objects.remove(workout_id=id)
+
+    # Load dashboard:
+    return redirect('/dashboard')
+
+@login_required
+def complete_workout(request, id):
+    """If POST, complete a workout."""
 
-        # Delete workout:
-        Workout.objects.get(id=id).delete()
+    if request.method == "GET":
+        # If get request, bring back to workout page.
+        # Note, for now, GET request for this method not being utilized:
+        return redirect("/workout/" + id)
 
-        # Load dashboard:
-        return redirect('/dashboard')
+    if request.method == "POST":
 
+        # Update Workout.completed field for this instance:
+        Workout.objects.complete(workout_id=id)
 
-    except (KeyError, User.DoesNotExist) as err:
-        # If existing session not found:
-        messages.info(request, "You must be logged in to view this page.", extra_tags="invalid_session")
-        return redirect("/")
+        logs.event("workout.completed", workout_id=id)
 
-def complete_workout(request, id):
-    """If POST, complete a workout."""
+        # Return to workout:
+        return redirect('/workout/' + id)
 
-    try:
-        # Check for valid session:
-        user = User.objects.get(id=request.session["user_id"])
+@login_required
+def repeat_workout(request, id):
+    """If POST, start a new workout copying this one's sets (with optional `overload`, percent added to every weight)."""
 
-        if request.method == "GET":
-            # If get request, bring back to workout page.
-            # Note, for now, GET request for this method not being utilized:
-            return redirect("/workout/" + id)
+    if request.method == "GET":
+        # If get request, bring back to workout page:
+        return redirect("/workout/" + id)
 
-        if request.method == "POST":
+    if request.method == "POST":
+        # Copy workout and exercises in one go:
+        validated = Workout.objects.repeat(workout_id=id, user=request.workout_user, overload=request.POST.get("overload"))
 
-            # Update Workout.completed field for this instance:
-            workout = Workout.objects.get(id=id)
-            workout.completed = True
-            workout.save()
+        try:
+            # If errors, reload workout page with errors:
+            if len(validated["errors"]) > 0:
+                logs.event("workout.repeat_rejected", workout_id=id, errors=len(validated["errors"]))
+                for error in validated["errors"]:
+                    messages.error(request, error, extra_tags='repeat')
+                return redirect("/workout/" + id)
+        except KeyError:
+            # If successful, load the new workout:
+            logs.event("workout.repeated", workout_id=id, new_workout_id=validated["workout"].id)
+            return redirect("/workout/%d" % validated["workout"].id)
 
-            print("Workout completed.")
+@login_required
+def export_history(request):
+    """GET the logged in user's full training history as a CSV (default) or JSON lines (`?format=jsonl`) download."""
 
-            # Return to workout:
-            return redirect('/workout/' + id)
+    format = request.GET.get("format", "csv")
+    if format not in export.FORMATS:
+        return HttpResponseBadRequest("Format must be one of: " + ", ".join(export.FORMATS))
 
-    except (KeyError, User.DoesNotExist) as err:
-        # If existing session not found:
-        messages.info(request, "You must be logged in to view this page.", extra_tags="invalid_session")
-        return redirect("/")
+    # Stream rows straight from the database cursor rather than building the file in memory:
+    response = StreamingHttpResponse(
+        export.stream_history(format, user_id=request.workout_user.id),
+        content_type="text/csv" if format == "csv" else "application/x-ndjson",
+    )
+    response["Content-Disposition"] = 'attachment; filename="workouts.%s"' % format
+    return response
 
-def tos(request):
+MAX_REPORTED_REJECTS = 100 # Rejected rows listed in an import response
+
+@login_required
+def import_history(request):
+    """If POST, import an uploaded CSV or JSON lines history file (`file`) and return a JSON report."""
+
+    if request.method != "POST":
+        return JsonResponse({"errors": ["POST a file to import."]}, status=405)
+
+    upload = request.FILES.get("file")
+    if upload is None:
+        return JsonResponse({"errors": ["Choose a file to import."]}, status=400)
+
+    format = request.POST.get("format") or upload.name.rsplit(".", 1)[-1].lower()
+    if format not in export.FORMATS:
+        return JsonResponse({"errors": ["Format must be one of: " + ", ".join(export.FORMATS)]}, status=400)
+
+    rejects = []
+
+    def on_reject(line_number, errors):
+        # Only keep the first few, so a bad file can't balloon the response:
+        if len(rejects) < MAX_REPORTED_REJECTS:
+            rejects.append({"line": line_number, "errors": errors})
+
+    # Note: Large uploads are spooled to a temporary file by Django, and the importer streams from it:
+    job = importer.import_history(request.workout_user, upload.file, format, on_reject=on_reject)
+
+    logs.event("history.imported", user_id=request.workout_user.id, workouts=job.workouts_created, exercises=job.exercises_created)
+
+    return JsonResponse({
+        "rows": job.rows_committed,
+        "workouts_created": job.workouts_created,
+        "exercises_created": job.exercises_created,
+        "rows_rejected": job.rows_rejected,
+        "rejects": rejects,
+    })
+
+async def tos(request):
     """GET terms of service / user agreement."""
 
-    return render(request, "workout/legal/tos.html")
+    return await async_render(request, "workout/legal/tos.html")
+
+def metrics_endpoint(request):
+    """GET request metrics in Prometheus' text format (for this process)."""
+
+    if not metrics.allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
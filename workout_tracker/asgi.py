@@ -0,0 +1,20 @@
+"""
+ASGI config for workout_tracker project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with an ASGI server, e.g. ``uvicorn workout_tracker.asgi:application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "workout_tracker.settings")
+
+application = get_asgi_application()
+
+# Note: Unlike wsgi.py, static files aren't served here (`assets.StaticFilesApplication` is WSGI only); serve
+# STATIC_ROOT from the proxy in front of the ASGI server.
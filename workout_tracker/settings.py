@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -41,12 +42,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.workout.middleware.ServerTimingMiddleware',
+    'apps.workout.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'apps.workout.middleware.WorkoutUserMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -70,6 +74,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'workout_tracker.wsgi.application'
 
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
 
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
@@ -78,6 +84,55 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600, # Keep connections open between requests (seconds) so pragmas and caches aren't set up every time.
+    },
+    # Local read replica: a copy of db.sqlite3 refreshed by `python manage.py sync_replicas --interval 2`
+    # (see apps/workout/replicas.py). Until it has been synced once, reads stay on the primary.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# Writes go to `default`; GET requests read from DATABASE_REPLICAS (see apps/workout/routers.py).
+DATABASE_ROUTERS = ['apps.workout.routers.PrimaryReplicaRouter']
+
+DATABASE_REPLICAS = ['replica']
+
+REPLICA_PIN_SECONDS = 10 # After writing, a user reads from the primary this long (keep it above the sync interval).
+
+# Set on every new SQLite connection, in this order (see apps/workout/database.py):
+# WAL lets readers carry on while a write commits; NORMAL sync is safe with WAL (a power cut can
+# lose the last commits, not corrupt the file).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000, # Milliseconds a connection waits for the write lock before "database is locked".
+    'cache_size': -65536, # Page cache per connection, in KiB (64 MB).
+    'mmap_size': 268435456, # Read through a 256 MB memory map.
+    'temp_store': 'memory',
+}
+
+SQLITE_WRITE_RETRIES = 4 # Times a write transaction is rerun after "database is locked".
+
+SQLITE_RETRY_BACKOFF = 0.05 # Seconds before the first rerun (doubling each time, with jitter).
+
+
+# Cache
+# Holds rendered template fragments (see the `{% cache %}` blocks in dashboard.html
+# and workout.html). Fragments are keyed by version counters stored in the database,
+# so a per-process cache is safe; point this at memcached/redis to share fragments
+# between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'workout-fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
@@ -101,6 +156,114 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# bcrypt runs in a small process pool (see apps/workout/hashing.py) so it never
+# blocks a request worker for longer than HASHING_TIMEOUT seconds.
+
+BCRYPT_ROUNDS = 14 # Work factor; stored hashes at another cost are rehashed on login.
+
+HASHING_POOL_WORKERS = 2 # Processes hashing at once (0 hashes inline).
+
+HASHING_MAX_PENDING = 16 # Hashes queued or running before new logins are refused.
+
+HASHING_TIMEOUT = 10.0 # Seconds a request will wait for a hash.
+
+
+# Logged in user cache
+# WorkoutUserMiddleware keeps recently seen `User` rows in memory (per process).
+
+WORKOUT_USER_CACHE_SIZE = 1024 # Users kept before the least recently used is dropped.
+
+WORKOUT_USER_CACHE_TTL = 60 # Seconds before a cached user is reloaded.
+
+
+# Request metrics
+# Query, template and hashing time per request (see apps/workout/metrics.py).
+
+SERVER_TIMING = True # Send a `Server-Timing` header with every response.
+
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1') # Who may read /metrics (None lets anyone).
+
+
+# Logging
+# App events are JSON lines written to stdout from a background thread (see apps/workout/logs.py).
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'apps.workout.logs.JsonFormatter'},
+    },
+    'handlers': {
+        'background': {
+            'class': 'apps.workout.logs.BackgroundHandler',
+            'formatter': 'json',
+            'maxsize': 10000, # Records queued before new ones are dropped (rather than blocking requests).
+        },
+    },
+    'loggers': {
+        'apps.workout': {'handlers': ['background'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# `manage.py test`: keep routine events off stdout; only warnings and errors are written (tests that expect one
+# capture it with `assertLogs()`, which also sees INFO events):
+if sys.argv[1:2] == ['test']:
+    LOGGING['loggers']['apps.workout']['level'] = 'WARNING'
+
+# Fraction of each (below WARNING) event type that is logged; unlisted events are all logged.
+LOG_SAMPLING = {
+    'exercise.created': 0.1,
+    'exercises.created': 0.1,
+    'validation.failed': 0.1,
+}
+
+
+# Sessions
+# Database sessions read through a per process cache, with changes written in the
+# background (see apps/workout/sessions.py). We only keep `user_id` in the session,
+# so 'django.contrib.sessions.backends.signed_cookies' also works (no session table
+# at all, but logging out can't invalidate a copied cookie).
+
+SESSION_ENGINE = 'apps.workout.sessions'
+
+SESSION_CACHE_SIZE = 10000 # Sessions kept before the least recently used is dropped.
+
+SESSION_CACHE_TTL = 60 # Seconds before a cached session is reloaded (bounds staleness between processes).
+
+SESSION_WRITE_BEHIND_DELAY = 1.0 # Seconds changed sessions wait to be written together (0 writes them right away).
+
+SESSION_CLEANUP_BATCH_SIZE = 1000 # Expired sessions deleted per batch by `manage.py clearsessions`.
+
+SESSION_CLEANUP_PAUSE = 0.05 # Seconds between cleanup batches.
+
+
+# Deleting workouts and accounts
+# Deletes only hide rows; a background reaper deletes them later, a small batch per
+# transaction, so the write lock is never held for long (see apps/workout/reaper.py).
+
+REAPER_DELAY = 1.0 # Seconds after a delete before the reaper runs (None: no background thread, run `manage.py reap_deleted --interval` instead).
+
+REAPER_BATCH_SIZE = 500 # Rows deleted per transaction.
+
+REAPER_PAUSE = 0.05 # Seconds between batches.
+
+
+# Level progression
+# Level thresholds default to `progression.DEFAULT_LEVELS`; set PROGRESSION_LEVELS
+# to a list of (name, completed workouts, lifetime volume, best streak) to change them.
+
+PROGRESSION_STREAK_GAP_DAYS = 2 # Most days between completed workouts that still continue a streak.
+
+
+# Exercise name autocomplete
+# Per user name indexes are kept in memory (per process), see apps/workout/autocomplete.py.
+
+AUTOCOMPLETE_CACHE_SIZE = 512 # Users whose names are kept before the least recently used is dropped.
+
+AUTOCOMPLETE_CACHE_TTL = 300 # Seconds before a user's names are reloaded.
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.11/topics/i18n/
 
@@ -119,3 +282,10 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.11/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# Where `collectstatic` puts files, served by `assets.StaticFilesApplication` (see wsgi.py).
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Content hashed names + manifest for `{% static %}`, plus precompressed .gz/.br copies (see apps/workout/assets.py).
+# Note: Hashed names are only used with DEBUG off; run `python manage.py collectstatic` when static files change.
+STATICFILES_STORAGE = 'apps.workout.assets.CompressedManifestStorage'
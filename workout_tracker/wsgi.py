@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "workout_tracker.settings")
 
 application = get_wsgi_application()
+
+# Serve collected (hashed, precompressed) static files before requests reach Django:
+from apps.workout.assets import StaticFilesApplication
+
+application = StaticFilesApplication(application)